@@ -3,88 +3,381 @@ SSTV Web Server - Flask Application
 Run SSTV encoder/decoder through web interface
 """
 
-from flask import Flask, render_template, request, send_file, jsonify
+from flask import Flask, Request, Response, render_template, request, send_file, jsonify
 import os
+import io
+import json
+import threading
+import uuid
 import base64
 from werkzeug.utils import secure_filename
-from data_encoder import DataEncoder
+from data_encoder import DataEncoder, MAX_LANES, wav_header
 from data_decoder import DataDecoder
-from crypto_handler import CryptoHandler
-from Crypto.Random import get_random_bytes
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import pad, unpad
+from decode_cache import DecodeCache, DEFAULT_CACHE, DEFAULT_MAX_BYTES, audio_digest
+from crypto_handler import CryptoHandler, MODE_CBC, MODE_GCM, key_cache
+from modem_profiles import PROFILES, DEFAULT_PROFILE
+from fec_codec import fec_encode, fec_decode, is_fec
+from compression import CODEC_IDS, CODEC_NONE, COMPRESS_AUTO
+from transport import (ChunkStore, DEFAULT_STORE, DEFAULT_OUTBOX, frame_transfer,
+                       format_ranges, parse_ranges, is_framed)
+from stage_timer import StageTimer, profiled
+from jobs import JobQueue, QueueFull, report_progress, DONE, FAILED
+
+class InMemoryRequest(Request):
+    """Request that keeps uploads in memory (MAX_CONTENT_LENGTH caps them)"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        return io.BytesIO()
 
 app = Flask(__name__)
+app.request_class = InMemoryRequest
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'outputs'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
+app.config['CHUNK_STORE'] = DEFAULT_STORE
+app.config['OUTBOX'] = DEFAULT_OUTBOX
+app.config['DECODE_CACHE'] = DEFAULT_CACHE  # demodulated payloads by audio hash (None: off)
+app.config['DECODE_CACHE_BYTES'] = DEFAULT_MAX_BYTES
+app.config['JOB_WORKERS'] = None  # worker processes for async jobs (default: CPU count)
+app.config['JOB_LIMIT'] = None  # jobs admitted at once (default: 2 per worker)
+
+# Seconds a client is told to wait when the job queue is full
+RETRY_AFTER = 5
+
+# Seconds between keep-alive comments on an idle event stream
+SSE_KEEPALIVE = 15
+
+_jobs = None
+_jobs_lock = threading.Lock()
 
 # Create folders if they don't exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 
+def _modem_options(form):
+    """
+    Read and validate the profile, lanes and fec form fields
+
+    Returns:
+        Tuple of (profile, lanes, fec, error message or None)
+    """
+    profile = form.get('profile', DEFAULT_PROFILE)
+    lanes = form.get('lanes', '1')
+    fec = form.get('fec', '0')
+    
+    if profile not in PROFILES:
+        return None, None, None, f'Unknown modem profile: {profile}'
+    if not lanes.isdigit() or not 1 <= int(lanes) <= MAX_LANES:
+        return None, None, None, f'Lanes must be between 1 and {MAX_LANES}'
+    if not fec.isdigit() or int(fec) > 254:
+        return None, None, None, 'FEC parity must be between 0 (off) and 254'
+    return profile, int(lanes), int(fec), None
+
 @app.route('/')
 def index():
     """Serve main page"""
     return render_template('index.html')
 
+class UploadError(Exception):
+    """Problem with a request that is reported to the client"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def _flag(name):
+    """True if a form field or query parameter is set to 1"""
+    return (request.form.get(name) or request.args.get(name, '0')) == '1'
+
+def _wants_async():
+    """True if the client asked for a background job (async=1)"""
+    return _flag('async')
+
+def _wants_stream():
+    """True if the client asked for the result in the response (stream=1)"""
+    return _flag('stream')
+
+def _job_queue():
+    """The job queue, started on first use"""
+    global _jobs
+    with _jobs_lock:
+        if _jobs is None:
+            _jobs = JobQueue(app.config['JOB_WORKERS'], app.config['JOB_LIMIT'])
+        return _jobs
+
+def _save_upload(file, filename):
+    """
+    Save an uploaded file under a name no other request uses
+
+    Returns:
+        Tuple of (saved path, unique token for naming the output)
+    """
+    token = uuid.uuid4().hex[:12]
+    input_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{token}_{filename}")
+    file.save(input_path)
+    return input_path, token
+
+def _attachment(filename):
+    """Content-Disposition header value for a download"""
+    return f'attachment; filename="{filename}"'
+
+def _busy(error):
+    """503 response telling the client to come back later"""
+    response = jsonify({'error': str(error)})
+    response.headers['Retry-After'] = str(RETRY_AFTER)
+    return response, 503
+
+def _run(kind, func, input_path, output_filename, options):
+    """
+    Run func now, or as a job when the client asked for async=1
+
+    Either way the work takes a slot of the job queue, so synchronous
+    requests are refused with 503 as well once it is full.
+
+    Returns:
+        Flask response: the result (200, or 202 for an incomplete
+        transfer), or 202 with the job's status URLs
+    """
+    output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+    jobs = _job_queue()
+    try:
+        if not _wants_async():
+            jobs.acquire()
+        else:
+            job = jobs.submit(kind, func, input_path, output_path, options)
+    except QueueFull as e:
+        os.remove(input_path)
+        return _busy(e)
+    except Exception:
+        os.remove(input_path)
+        raise
+    
+    if not _wants_async():
+        try:
+            body = func(input_path, output_path, options)
+        finally:
+            jobs.release()
+        return jsonify(body), 202 if body.get('complete') is False else 200
+    
+    response = jsonify({
+        'job_id': job.id,
+        'state': job.state,
+        'status_url': f'/jobs/{job.id}',
+        'events_url': f'/jobs/{job.id}/events',
+    })
+    response.headers['Location'] = f'/jobs/{job.id}'
+    return response, 202
+
 @app.route('/encode', methods=['POST'])
 def encode():
-    """Encode file to audio"""
+    """Encode file to audio (as a background job with async=1, or straight
+    into the response with stream=1)"""
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No file uploaded'}), 400
         
         file = request.files['file']
         encryption_key = request.form.get('key', None)
+        cipher_mode = request.form.get('cipher', MODE_CBC)
+        compression = request.form.get('compress', COMPRESS_AUTO)
+        chunked = request.form.get('chunked', '0') == '1'
+        profile, lanes, fec, error = _modem_options(request.form)
         
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Save uploaded file
-        filename = secure_filename(file.filename)
-        input_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(input_path)
-        
-        # Read file data
-        with open(input_path, 'rb') as f:
-            file_data = f.read()
-        
-        # Encrypt if key provided
-        if encryption_key and encryption_key.strip():
-            crypto = CryptoHandler(encryption_key)
-            iv = get_random_bytes(16)
-            cipher = AES.new(crypto.key, AES.MODE_CBC, iv)
-            padded_data = pad(file_data, AES.block_size)
-            encrypted_data = cipher.encrypt(padded_data)
-            final_data = iv + encrypted_data
-            encrypted = True
-        else:
-            final_data = file_data
-            encrypted = False
+        if cipher_mode not in (MODE_CBC, MODE_GCM):
+            return jsonify({'error': f'Unknown cipher mode: {cipher_mode}'}), 400
         
-        # Generate audio
-        encoder = DataEncoder()
-        output_filename = f"{os.path.splitext(filename)[0]}.wav"
-        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-        encoder.encode(final_data, output_path=output_path)
+        if error:
+            return jsonify({'error': error}), 400
         
-        # Clean up input file
-        os.remove(input_path)
+        if compression != COMPRESS_AUTO and compression not in CODEC_IDS:
+            return jsonify({'error': f'Unknown compression codec: {compression}'}), 400
         
-        return jsonify({
-            'success': True,
-            'filename': output_filename,
-            'encrypted': encrypted,
-            'download_url': f'/download/{output_filename}'
-        })
+        # Compression happens inside the encryption layer, so it needs a key
+        if ('compress' in request.form and compression != CODEC_NONE
+                and not (encryption_key and encryption_key.strip())):
+            return jsonify({'error': 'Compression needs an encryption key'}), 400
+        
+        if _wants_async() and _wants_stream():
+            return jsonify({'error': 'Choose either async=1 or stream=1'}), 400
+        
+        filename = secure_filename(file.filename) or 'upload'
+        options = {
+            'key': encryption_key if encryption_key and encryption_key.strip() else None,
+            'cipher': cipher_mode,
+            'compression': compression,
+            'chunked': chunked,
+            'profile': profile,
+            'lanes': lanes,
+            'fec': fec,
+            'outbox': app.config['OUTBOX'],
+        }
+        if _wants_stream():
+            # The request closes its uploads as soon as this view returns,
+            # before the response has been sent, so the stream gets a copy
+            jobs = _job_queue()
+            jobs.acquire()
+            try:
+                response = _stream_encode(io.BytesIO(file.stream.getvalue()), filename, options)
+            except BaseException:
+                jobs.release()
+                raise
+            # Modulation goes on while the response is sent
+            response.call_on_close(jobs.release)
+            return response
+        
+        # Save uploaded file
+        input_path, token = _save_upload(file, filename)
+        output_filename = f"{os.path.splitext(filename)[0]}_{token}.wav"
+        return _run('encode', encode_upload, input_path, output_filename, options)
     
+    except QueueFull as e:
+        return _busy(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def encode_upload(input_path, output_path, options):
+    """
+    Encrypt, chunk, add FEC to and modulate a saved upload into a WAV file
+
+    Runs in the request thread or in a job worker. The upload is removed
+    afterwards.
+
+    Args:
+        input_path: Saved upload
+        output_path: WAV file to write
+        options: Form options checked by the encode route
+
+    Returns:
+        Response body
+    """
+    try:
+        encoder = DataEncoder(options['profile'], lanes=options['lanes'])
+        compression_info = None
+        transfer = None
+        timer = StageTimer()
+        
+        with open(input_path, 'rb') as f, profiled('encode'):
+            if options['key']:
+                # Encrypt file data
+                report_progress('encrypt')
+                crypto = CryptoHandler(options['key'], mode=options['cipher'],
+                                       compression=options['compression'])
+                final_data = io.BytesIO()
+                reader = timer.reader(f)
+                with timer.stage('encrypt') as stage:
+                    stage.bytes = crypto.encrypt_stream(reader, final_data)
+                final_data.seek(0)
+                
+                stats = crypto.compression_stats
+                compression_info = {
+                    'codec': stats.codec,
+                    'bytes_in': stats.bytes_in,
+                    'bytes_saved': stats.bytes_saved,
+                    'audio_seconds_saved': round(stats.airtime_saved(encoder.bytes_per_second), 2),
+                }
+            else:
+                final_data = f
+            
+            if options['chunked']:
+                report_progress('chunk')
+                with timer.stage('chunk') as stage:
+                    payload = final_data.read()
+                    outbox = ChunkStore(options['outbox'])
+                    transfer_id = outbox.save_outgoing(payload)
+                    final_data = io.BytesIO(frame_transfer(payload, transfer_id=transfer_id)[1])
+                    stage.bytes = len(final_data.getbuffer())
+                transfer = outbox.status(transfer_id)
+                del transfer['missing']
+            
+            if options['fec']:
+                report_progress('fec')
+                with timer.stage('fec') as stage:
+                    final_data = io.BytesIO(fec_encode(final_data.read(), nsym=options['fec']))
+                    stage.bytes = len(final_data.getbuffer())
+            
+            # Generate audio
+            report_progress('modulate')
+            encoder.encode(final_data, output_path=output_path, timer=timer)
+    finally:
+        # Clean up input file
+        os.remove(input_path)
+    
+    output_filename = os.path.basename(output_path)
+    encrypted = options['key'] is not None
+    return {
+        'success': True,
+        'filename': output_filename,
+        'encrypted': encrypted,
+        'cipher': options['cipher'] if encrypted else None,
+        'profile': options['profile'],
+        'lanes': options['lanes'],
+        'fec': options['fec'],
+        'compression': compression_info,
+        'transfer': transfer,
+        'timings': timer.as_dict(),
+        'download_url': f'/download/{output_filename}'
+    }
+
+def _stream_encode(src, filename, options):
+    """
+    Encrypt, chunk, add FEC to and modulate an in-memory upload straight
+    into the response
+
+    Nothing is written to disk: the modulator pulls ciphertext from the
+    upload as the WAV is sent, with a streaming header of unknown length.
+    Chunking, FEC and several lanes need the whole payload, so they hold
+    it in memory first.
+
+    Args:
+        src: Uploaded file as io.BytesIO, outliving the request
+        filename: Sanitized upload name
+        options: Form options checked by the encode route
+
+    Returns:
+        Streamed audio/wav response
+    """
+    src.seek(0)
+    encoder = DataEncoder(options['profile'], lanes=options['lanes'])
+    headers = {'Content-Disposition': _attachment(f"{os.path.splitext(filename)[0]}.wav")}
+    
+    data = src
+    if options['key']:
+        crypto = CryptoHandler(options['key'], mode=options['cipher'],
+                               compression=options['compression'])
+        data = crypto.encrypt_reader(src)
+    
+    if options['chunked']:
+        payload = data.read()
+        outbox = ChunkStore(options['outbox'])
+        transfer_id = outbox.save_outgoing(payload)
+        data = io.BytesIO(frame_transfer(payload, transfer_id=transfer_id)[1])
+        headers['X-Transfer-Id'] = outbox.status(transfer_id)['transfer_id']
+    
+    if options['fec']:
+        data = io.BytesIO(fec_encode(data.read(), nsym=options['fec']))
+    
+    # Start modulating before answering, so a failure is still a JSON error
+    blocks = encoder.iter_blocks(data)
+    first = next(blocks, b'')
+    
+    def generate():
+        yield wav_header(encoder.config, encoder.lanes, metadata=encoder.metadata)
+        yield first
+        yield from blocks
+    
+    response = Response(generate(), mimetype='audio/wav', headers=headers)
+    # Also stops the modulator if the client goes away before the first block
+    response.call_on_close(blocks.close)
+    return response
+
 @app.route('/decode', methods=['POST'])
 def decode():
-    """Decode audio to file"""
+    """Decode audio to file (as a background job with async=1, or straight
+    into the response with stream=1)"""
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No audio file uploaded'}), 400
@@ -96,47 +389,283 @@ def decode():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Save uploaded audio
-        filename = secure_filename(file.filename)
-        input_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(input_path)
-        
-        # Decode audio
-        decoder = DataDecoder()
-        decoded_data = decoder.decode(input_path)
-        
-        # Decrypt if key provided
-        if decryption_key and decryption_key.strip():
-            crypto = CryptoHandler(decryption_key)
-            iv = decoded_data[:16]
-            encrypted_data = decoded_data[16:]
-            cipher = AES.new(crypto.key, AES.MODE_CBC, iv)
-            decrypted_padded = cipher.decrypt(encrypted_data)
-            final_data = unpad(decrypted_padded, AES.block_size)
-            decrypted = True
-        else:
-            final_data = decoded_data
-            decrypted = False
+        if _wants_async() and _wants_stream():
+            return jsonify({'error': 'Choose either async=1 or stream=1'}), 400
         
-        # Save decoded file
-        output_filename = f"decoded_{os.path.splitext(filename)[0]}.{output_format}"
-        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-        with open(output_path, 'wb') as f:
-            f.write(final_data)
+        filename = secure_filename(file.filename) or 'upload'
+        stem = os.path.splitext(filename)[0]
+        options = {
+            'key': decryption_key if decryption_key and decryption_key.strip() else None,
+            'store': app.config['CHUNK_STORE'],
+            'cache': app.config['DECODE_CACHE'],
+            'cache_bytes': app.config['DECODE_CACHE_BYTES'],
+        }
+        if _wants_stream():
+            with _job_queue().slot():
+                return _stream_decode(file.stream, secure_filename(f"decoded_{stem}.{output_format}"),
+                                      options)
         
+        # Save uploaded audio
+        input_path, token = _save_upload(file, filename)
+        output_filename = secure_filename(f"decoded_{stem}_{token}.{output_format}")
+        return _run('decode', decode_upload, input_path, output_filename, options)
+    
+    except QueueFull as e:
+        return _busy(e)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def decode_upload(input_path, output_path, options):
+    """
+    Demodulate a saved upload, correct, reassemble and decrypt it
+
+    Runs in the request thread or in a job worker. The upload is removed
+    afterwards.
+
+    Args:
+        input_path: Saved upload
+        output_path: File to write the payload to
+        options: Key, chunk store and decode cache settings
+
+    Returns:
+        Response body; 'complete' is False while a chunked transfer is
+        still missing chunks
+
+    Raises:
+        UploadError: If the audio holds no intact chunks
+    """
+    timer = StageTimer()
+    try:
+        payload, body = _demodulate(input_path, options, timer)
+    finally:
         # Clean up input file
         os.remove(input_path)
+    if payload is None:
+        return body
+    
+    with open(output_path, 'wb') as f:
+        _decrypt(payload, timer.writer(f), options, timer)
+    
+    output_filename = os.path.basename(output_path)
+    body.update({
+        'filename': output_filename,
+        'timings': timer.as_dict(),
+        'download_url': f'/download/{output_filename}'
+    })
+    return body
+
+def _demodulate(audio, options, timer):
+    """
+    Demodulate audio and undo FEC and chunking
+
+    A recording seen before (same SHA-256) takes its demodulated payload
+    from the decode cache instead of running the demodulator again.
+
+    Args:
+        audio: WAV path or io.BytesIO
+        options: Key, chunk store and decode cache settings
+        timer: StageTimer for the stages
+
+    Returns:
+        Tuple of (payload as io.BytesIO, response body). The payload is
+        None while a chunked transfer is still missing chunks; the body
+        then says so.
+
+    Raises:
+        UploadError: If the audio holds no intact chunks
+    """
+    cache = hit = None
+    if options['cache']:
+        cache = DecodeCache(options['cache'], options['cache_bytes'])
+        with timer.stage('cache'):
+            digest = audio_digest(audio)
+            hit = cache.get(digest)
+    
+    if hit:
+        payload, result = hit
+        decoded = io.BytesIO(payload)
+    else:
+        report_progress('demodulate')
+        decoder = DataDecoder()
+        decoded = io.BytesIO()
+        with profiled('decode'), timer.stage('demodulate') as stage:
+            result = decoder.decode_to(audio, decoded)
+            stage.bytes = result.bytes_out
+        if cache is not None:
+            with timer.stage('cache'):
+                cache.put(digest, decoded.getbuffer(), result)
+    
+    fec_used = is_fec(decoded.getbuffer())
+    if fec_used:
+        report_progress('fec')
+        with timer.stage('fec') as stage:
+            decoded = io.BytesIO(fec_decode(decoded.getbuffer()))
+            stage.bytes = len(decoded.getbuffer())
+    decoded.seek(0)
+    
+    # Chunked transfers are collected until every chunk has arrived
+    transfer = None
+    if is_framed(decoded.getbuffer()):
+        report_progress('chunk')
+        store = ChunkStore(options['store'])
+        with timer.stage('chunk'):
+            added = store.add(decoded.getvalue())
+        if not added:
+            raise UploadError('No intact chunks found in the audio', 422)
+        statuses = [store.status(transfer_id) for transfer_id in added]
+        complete = [status for status in statuses if not status['missing']]
+        if not complete:
+            for status in statuses:
+                status['missing'] = format_ranges(status['missing'])
+            return None, {
+                'success': False,
+                'complete': False,
+                'transfers': statuses,
+                'signal_complete': result.success,
+                'cache_hit': bool(hit),
+                'timings': timer.as_dict(),
+            }
+        transfer = complete[0]
+        decoded = io.BytesIO()
+        with timer.stage('chunk') as stage:
+            stage.bytes = store.assemble(int(transfer['transfer_id'], 16), decoded)
+        decoded.seek(0)
+    
+    return decoded, {
+        'success': True,
+        'decrypted': options['key'] is not None,
+        'bytes_decoded': result.bytes_out,
+        'audio_seconds': round(result.audio_seconds, 3),
+        'decode_seconds': round(result.elapsed, 3),
+        'profile': result.profile,
+        'lanes': result.lanes,
+        'fec': fec_used,
+        'signal_complete': result.success,
+        'cache_hit': bool(hit),
+        'transfer': transfer,
+    }
+
+def _decrypt(payload, dst, options, timer):
+    """Write the payload to dst, decrypting it if a key was given"""
+    if options['key']:
+        report_progress('decrypt')
+        crypto = CryptoHandler(options['key'])
+        with timer.stage('decrypt') as stage:
+            stage.bytes = crypto.decrypt_stream(payload, dst)
+    else:
+        dst.write(payload.getbuffer())
+
+def _stream_decode(audio, filename, options):
+    """
+    Decode an in-memory upload and send the payload back in the response
+
+    Nothing is written to disk apart from chunks of an incomplete
+    transfer, which are kept in the chunk store as usual.
+
+    Args:
+        audio: Uploaded WAV as io.BytesIO
+        filename: Download name for the payload
+        options: Key, chunk store and decode cache settings
+
+    Returns:
+        Flask response: the payload as an attachment, or 202 with the
+        transfer status while chunks are missing
+    """
+    timer = StageTimer()
+    payload, body = _demodulate(audio, options, timer)
+    if payload is None:
+        return jsonify(body), 202
+    
+    output = io.BytesIO()
+    _decrypt(payload, output, options, timer)
+    output.seek(0)
+    response = send_file(output, mimetype='application/octet-stream',
+                         as_attachment=True, download_name=filename)
+    response.headers['X-Signal-Complete'] = '1' if body['signal_complete'] else '0'
+    response.headers['X-Cache-Hit'] = '1' if body['cache_hit'] else '0'
+    return response
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Report the state of a job (and its result once done)"""
+    job = _job_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Stream a job's state changes as server-sent events until it finishes"""
+    queue = _job_queue()
+    if queue.get(job_id) is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    def stream():
+        version = None
+        while True:
+            status, new_version = queue.wait(job_id, version, timeout=SSE_KEEPALIVE)
+            if status is None:
+                return
+            if new_version == version and status['state'] not in (DONE, FAILED):
+                yield ": keep-alive\n\n"
+                continue
+            version = new_version
+            yield f"event: {status['state']}\ndata: {json.dumps(status)}\n\n"
+            if status['state'] in (DONE, FAILED):
+                return
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/resend', methods=['POST'])
+def resend():
+    """Encode selected chunks of an earlier chunked transfer again"""
+    try:
+        transfer = request.form.get('transfer_id', '')
+        chunks = request.form.get('chunks', '')
+        profile, lanes, fec, error = _modem_options(request.form)
+        if error:
+            return jsonify({'error': error}), 400
+        try:
+            transfer_id = int(transfer, 16)
+            indices = parse_ranges(chunks) if chunks.strip() else None
+        except ValueError:
+            return jsonify({'error': 'Give transfer_id in hex and chunks like 0,5-7'}), 400
+        
+        data = ChunkStore(app.config['OUTBOX']).frame_resend(transfer_id, indices)
+        if fec:
+            data = fec_encode(data, nsym=fec)
+        
+        output_filename = f"resend_{transfer_id:08x}.wav"
+        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+        DataEncoder(profile, lanes=lanes).encode(data, output_path=output_path)
         
         return jsonify({
             'success': True,
             'filename': output_filename,
-            'decrypted': decrypted,
+            'transfer_id': f"{transfer_id:08x}",
+            'chunks': format_ranges(indices) if indices else 'all',
             'download_url': f'/download/{output_filename}'
         })
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/stats')
+def stats():
+    """Report cache counters"""
+    stats = {'key_cache': key_cache.stats()}
+    if _jobs is not None:
+        stats['jobs'] = _jobs.stats()
+    if app.config['DECODE_CACHE']:
+        stats['decode_cache'] = DecodeCache(app.config['DECODE_CACHE'],
+                                            app.config['DECODE_CACHE_BYTES']).usage()
+    return jsonify(stats)
+
 @app.route('/download/<filename>')
 def download(filename):
     """Download generated file"""
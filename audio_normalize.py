@@ -0,0 +1,211 @@
+"""
+Audio Normalization Module
+Converts recordings into the sample format the modem expects
+
+Field recordings come at 44.1 kHz, in stereo or with 24-bit or float
+samples. NormalizingReader converts any PCM or IEEE-float WAV, block by
+block, to 16-bit samples at the modem's rate: samples are scaled to
+floats, channels are mixed down (or kept, for multi-lane files) and a
+polyphase FIR resampler changes the rate. Large files stream through
+without being loaded whole.
+"""
+
+from math import ceil, gcd
+
+import numpy as np
+from scipy.signal import firwin
+
+# WAVE format tags
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+
+# Input frames converted per step
+BLOCK_FRAMES = 16384
+
+# Half the resampling filter length, in units of the larger of the up and
+# down factors, and its Kaiser window (as scipy.signal.resample_poly)
+FILTER_HALF_LEN = 10
+KAISER_BETA = 5.0
+
+
+def needs_normalization(info, config, nchannels=1):
+    """Return True unless info already matches the modem's sample format"""
+    return (info.format_tag != WAVE_FORMAT_PCM
+            or info.framerate != int(config.Fs)
+            or info.sampwidth != config.sample_size
+            or info.nchannels != nchannels)
+
+
+def check_format(format_tag, sampwidth):
+    """Raise ValueError unless to_float can convert this sample format"""
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        if sampwidth not in (4, 8):
+            raise ValueError(f"Unsupported float sample width: {8 * sampwidth} bits")
+    elif format_tag != WAVE_FORMAT_PCM:
+        raise ValueError(f"Unsupported WAV encoding (format tag {format_tag:#06x}), "
+                         f"expected PCM or IEEE float")
+    elif sampwidth not in (1, 2, 3, 4):
+        raise ValueError(f"Unsupported PCM sample width: {8 * sampwidth} bits")
+
+
+def to_float(raw, format_tag, sampwidth):
+    """
+    Convert interleaved sample bytes to floats in [-1, 1)
+
+    Args:
+        raw: Sample bytes (whole samples)
+        format_tag: WAVE_FORMAT_PCM or WAVE_FORMAT_IEEE_FLOAT
+        sampwidth: Bytes per sample
+
+    Returns:
+        1-D float64 array
+    """
+    check_format(format_tag, sampwidth)
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        return np.frombuffer(raw, dtype=f'<f{sampwidth}').astype(np.float64)
+    if sampwidth == 1:  # 8-bit PCM is unsigned
+        return (np.frombuffer(raw, dtype=np.uint8).astype(np.float64) - 128) / 128
+    if sampwidth in (2, 4):
+        samples = np.frombuffer(raw, dtype=f'<i{sampwidth}')
+        return samples.astype(np.float64) / float(1 << (8 * sampwidth - 1))
+    # 24-bit PCM
+    b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+    samples = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+    samples -= (samples & 0x800000) << 1  # sign-extend
+    return samples.astype(np.float64) / float(1 << 23)
+
+
+def to_pcm16(samples):
+    """Convert floats in [-1, 1) to little-endian 16-bit PCM bytes, clipping"""
+    return np.clip(np.round(samples * 32768), -32768, 32767).astype('<i2').tobytes()
+
+
+class PolyphaseResampler:
+    """Streaming rational-rate resampler (Kaiser-windowed FIR, polyphase)"""
+
+    def __init__(self, rate_in, rate_out, channels=1):
+        """
+        Args:
+            rate_in: Input sample rate in Hz
+            rate_out: Output sample rate in Hz
+            channels: Channels per frame
+        """
+        rate_in, rate_out = int(rate_in), int(rate_out)
+        g = gcd(rate_in, rate_out)
+        self.up = rate_out // g
+        self.down = rate_in // g
+        self.channels = channels
+
+        half_len = FILTER_HALF_LEN * max(self.up, self.down)
+        h = firwin(2 * half_len + 1, 1 / max(self.up, self.down),
+                   window=('kaiser', KAISER_BETA)) * self.up
+        self._taps = ceil(len(h) / self.up)
+        padded = np.zeros(self._taps * self.up)
+        padded[:len(h)] = h
+        # _phases[p, j] = h[p + j * up]: the taps applied to x[i - j]
+        self._phases = padded.reshape(self._taps, self.up).T
+        self._delay = half_len  # filter delay in upsampled samples, compensated
+
+        self._history = np.zeros((self._taps, channels))
+        self._consumed = 0  # input frames seen
+        self._produced = 0  # output frames emitted
+
+    def process(self, frames):
+        """
+        Resample a block of input frames
+
+        Args:
+            frames: Array of shape (n,) or (n, channels)
+
+        Returns:
+            Array of shape (m, channels) with every output frame that the
+            input so far fully determines
+        """
+        frames = np.asarray(frames, dtype=np.float64).reshape(-1, self.channels)
+        start = self._consumed
+        self._consumed += len(frames)
+        return self._run(frames, start, self._last_ready())
+
+    def flush(self):
+        """Return the remaining output frames, padding the input with silence"""
+        total = -(-self._consumed * self.up // self.down)
+        pad = np.zeros((self._taps + self._delay // self.up + 1, self.channels))
+        return self._run(pad, self._consumed, total)
+
+    def _last_ready(self):
+        """Output frames computable from the input seen so far"""
+        return max(self._produced, (self._consumed * self.up - 1 - self._delay) // self.down + 1)
+
+    def _run(self, frames, start, end):
+        """Compute output frames up to `end` after appending frames (input index `start`)"""
+        buf = np.concatenate([self._history, frames])
+        base = start - self._taps  # input index of buf[0]
+        self._history = buf[-self._taps:]
+
+        m = np.arange(self._produced, end)
+        self._produced = max(self._produced, end)
+        if not len(m):
+            return np.zeros((0, self.channels))
+
+        t = m * self.down + self._delay
+        phase = t % self.up
+        newest = t // self.up - base
+        index = newest[:, None] - np.arange(self._taps)[None, :]
+        return np.einsum('mk,mkc->mc', self._phases[phase], buf[index])
+
+
+class NormalizingReader:
+    """File-like reader yielding a WAV's samples in the modem's format"""
+
+    def __init__(self, f, info, config, nchannels=1, block_frames=BLOCK_FRAMES):
+        """
+        Args:
+            f: Binary file object positioned at the first sample
+            info: WavInfo of the file
+            config: amodem Configuration (target rate and sample width)
+            nchannels: Channels to output: 1 mixes all input channels
+                down, otherwise it must match the input
+            block_frames: Input frames converted per step
+        """
+        check_format(info.format_tag, info.sampwidth)
+        if config.sample_size != 2:
+            raise ValueError("Only 16-bit modem output is supported")
+        if nchannels not in (1, info.nchannels):
+            raise ValueError(f"WAV has {info.nchannels} channels, expected {nchannels}")
+        self._f = f
+        self._info = info
+        self._nchannels = nchannels
+        self._frame_size = info.nchannels * info.sampwidth
+        self._block_size = block_frames * self._frame_size
+        self._left = info.nframes * self._frame_size
+        self._resampler = None
+        if info.framerate != int(config.Fs):
+            self._resampler = PolyphaseResampler(info.framerate, config.Fs, nchannels)
+        self._buf = bytearray()
+        self._done = False
+
+    def read(self, size=-1):
+        while not self._done and (size is None or size < 0 or len(self._buf) < size):
+            self._buf += self._convert_block()
+
+        if size is None or size < 0:
+            size = len(self._buf)
+        data = bytes(self._buf[:size])
+        del self._buf[:size]
+        return data
+
+    def _convert_block(self):
+        raw = self._f.read(min(self._block_size, self._left))
+        raw = raw[:len(raw) // self._frame_size * self._frame_size]
+        self._left -= len(raw)
+        if not raw:
+            self._done = True
+            return to_pcm16(self._resampler.flush()) if self._resampler else b''
+
+        frames = to_float(raw, self._info.format_tag, self._info.sampwidth)
+        frames = frames.reshape(-1, self._info.nchannels)
+        if self._nchannels == 1 and self._info.nchannels > 1:
+            frames = frames.mean(axis=1, keepdims=True)
+        if self._resampler:
+            frames = self._resampler.process(frames)
+        return to_pcm16(frames)
@@ -0,0 +1,508 @@
+"""
+Batch Command-Line Interface
+Encrypt and encode (or decode and decrypt) many files without the GUI
+
+Usage:
+    python batch_cli.py encode -k KEY -o out/ 'docs/*.pdf' images/
+    python batch_cli.py decode -k KEY -o decoded/ --format png out/
+    python batch_cli.py decode --offset 3600 --length 60 overnight.wav
+    python batch_cli.py scan -k KEY -o bursts/ overnight.wav
+    python batch_cli.py resend 1a2b3c4d --chunks 2,5-7 -o resend.wav
+"""
+
+import argparse
+import getpass
+import glob
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from crypto_handler import CryptoHandler, MODE_CBC, MODE_GCM
+from compression import CODEC_IDS, CODEC_NONE, COMPRESS_AUTO
+from data_encoder import DataEncoder, MAX_LANES
+from data_decoder import DataDecoder
+from burst_scanner import scan_recording
+from carrier_detect import DEFAULT_THRESHOLD
+from modem_profiles import PROFILES, DEFAULT_PROFILE
+from fec_codec import fec_encode, fec_decode, is_fec
+from transport import (ChunkStore, DEFAULT_STORE, DEFAULT_OUTBOX, frame_transfer,
+                       format_ranges, parse_ranges, is_framed)
+from stage_timer import StageTimer, format_timings, profiled
+
+
+def expand_inputs(patterns, suffix=None):
+    """
+    Expand globs and directories into a sorted list of unique files
+
+    Args:
+        patterns: Paths, glob patterns or directories (searched recursively)
+        suffix: Only keep files with this suffix when walking directories
+
+    Returns:
+        List of file paths
+    """
+    files = []
+    seen = set()
+
+    def add(path):
+        key = os.path.realpath(path)
+        if key not in seen:
+            seen.add(key)
+            files.append(path)
+
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) or [pattern]
+        for match in matches:
+            if os.path.isdir(match):
+                for root, dirs, names in os.walk(match):
+                    dirs.sort()
+                    for name in sorted(names):
+                        if suffix is None or name.lower().endswith(suffix):
+                            add(os.path.join(root, name))
+            elif os.path.isfile(match):
+                add(match)
+            else:
+                raise FileNotFoundError(f"No such file or directory: {match}")
+    return files
+
+
+def plan_outputs(inputs, output_dir, name_for):
+    """
+    Pick an unused output path for every input
+
+    Names are reserved up front so two inputs with the same base name
+    (or an existing file) never overwrite each other.
+
+    Args:
+        inputs: Input file paths
+        output_dir: Directory the outputs go to
+        name_for: Callable input path -> preferred output file name
+
+    Returns:
+        List of output paths, in input order
+    """
+    taken = set()
+    outputs = []
+    for path in inputs:
+        stem, ext = os.path.splitext(name_for(path))
+        candidate = os.path.join(output_dir, stem + ext)
+        n = 1
+        while candidate in taken or os.path.exists(candidate):
+            candidate = os.path.join(output_dir, f"{stem}_{n}{ext}")
+            n += 1
+        taken.add(candidate)
+        outputs.append(candidate)
+    return outputs
+
+
+def encode_file(input_path, output_path, key=None, cipher=MODE_CBC,
+                profile=DEFAULT_PROFILE, lanes=1, fec=0, compression=COMPRESS_AUTO,
+                chunked=False, outbox=DEFAULT_OUTBOX):
+    """
+    Compress and encrypt (if a key is given), split into chunks (if
+    chunked), add FEC (if fec > 0) and modulate one file into a WAV file
+
+    Chunked payloads are kept in the outbox so missing chunks can be
+    re-sent later with the resend command.
+
+    Returns:
+        Dictionary with the payload bytes modulated, per-stage timings,
+        the transfer ID when chunked and, when encrypting, the bytes and
+        seconds of audio saved by compression
+    """
+    encoder = DataEncoder(profile, lanes=lanes)
+    info = {}
+    timer = StageTimer()
+    with open(input_path, 'rb') as f, profiled('encode'):
+        if key:
+            crypto = CryptoHandler(key, mode=cipher, compression=compression)
+            data = io.BytesIO()
+            reader = timer.reader(f)
+            with timer.stage('encrypt') as stage:
+                size = stage.bytes = crypto.encrypt_stream(reader, data)
+            data.seek(0)
+            stats = crypto.compression_stats
+            info['codec'] = stats.codec
+            info['bytes_saved'] = stats.bytes_saved
+            info['audio_saved'] = stats.airtime_saved(encoder.bytes_per_second)
+        else:
+            data = f
+            size = os.fstat(f.fileno()).st_size
+        if chunked:
+            with timer.stage('chunk') as stage:
+                payload = data.read()
+                transfer_id = ChunkStore(outbox).save_outgoing(payload)
+                data = io.BytesIO(frame_transfer(payload, transfer_id=transfer_id)[1])
+                stage.bytes = len(data.getbuffer())
+            info['transfer'] = f"{transfer_id:08x}"
+        if fec:
+            with timer.stage('fec') as stage:
+                data = io.BytesIO(fec_encode(data.read(), nsym=fec))
+                size = stage.bytes = len(data.getbuffer())
+        encoder.encode(data, output_path=output_path, timer=timer)
+    info['bytes'] = size
+    info['timings'] = timer.as_dict()
+    return info
+
+
+def decode_file(input_path, output_path, key=None, profile=None, store=DEFAULT_STORE,
+                offset=0.0, length=None):
+    """
+    Demodulate one WAV file (or the window of it starting `offset`
+    seconds in and lasting `length` seconds), correcting errors if it
+    carries FEC and decrypting it if a key is given
+
+    Chunks of a chunked transfer are added to the store; the file is only
+    written once every chunk of the transfer has arrived.
+
+    Returns:
+        Dictionary with the number of bytes written to output_path and
+        per-stage timings
+    """
+    decoded = io.BytesIO()
+    timer = StageTimer()
+    with profiled('decode'):
+        with timer.stage('demodulate') as stage:
+            result = DataDecoder(profile).decode_to(input_path, decoded, offset, length)
+            stage.bytes = result.bytes_out
+        info = save_payload(decoded.getvalue(), result.success, output_path, key, store, timer)
+    info['timings'] = timer.as_dict()
+    return info
+
+
+def save_payload(data, success, output_path, key=None, store=DEFAULT_STORE, timer=None):
+    """
+    Correct, reassemble and decrypt demodulated bytes into output_path
+
+    Args:
+        data: Bytes from the demodulator
+        success: Whether demodulation reached the end of the signal
+        output_path: File to write
+        key: Decryption key (None writes the payload as is)
+        store: Chunk store directory for chunked transfers
+        timer: StageTimer for the fec, chunk, decrypt and write stages
+
+    Returns:
+        Dictionary with the number of bytes written to output_path
+    """
+    timer = timer or StageTimer()
+    if is_fec(data):
+        with timer.stage('fec') as stage:
+            data = fec_decode(data)  # restores a lost tail
+            stage.bytes = len(data)
+
+    if is_framed(data):
+        with timer.stage('chunk'):
+            data = _collect_transfer(ChunkStore(store), data)
+    elif not success:
+        raise ValueError("demodulation failed (signal not found or corrupted)")
+
+    try:
+        with open(output_path, 'wb') as f:
+            f = timer.writer(f)
+            if key:
+                with timer.stage('decrypt') as stage:
+                    stage.bytes = CryptoHandler(key).decrypt_stream(io.BytesIO(data), f)
+                return {'bytes': stage.bytes}
+            f.write(data)
+            return {'bytes': len(data)}
+    except Exception:
+        os.remove(output_path)
+        raise
+
+
+def resend_file(transfer_id, output_path, chunks=None, profile=DEFAULT_PROFILE,
+                lanes=1, fec=0, outbox=DEFAULT_OUTBOX):
+    """
+    Modulate chunks of an earlier chunked transfer again
+
+    Args:
+        transfer_id: Transfer ID
+        output_path: WAV file to write
+        chunks: Chunk indices to re-send (default: all)
+
+    Returns:
+        Dictionary with the payload bytes modulated
+    """
+    data = ChunkStore(outbox).frame_resend(transfer_id, chunks)
+    if fec:
+        data = fec_encode(data, nsym=fec)
+    DataEncoder(profile, lanes=lanes).encode(data, output_path=output_path)
+    return {'bytes': len(data)}
+
+
+def scan_file(input_path, output_dir, key=None, profile=None, store=DEFAULT_STORE,
+              workers=None, threshold=DEFAULT_THRESHOLD, extension='bin', report=print):
+    """
+    Decode every transmission found in one recording
+
+    Bursts are demodulated in parallel and written in recording order as
+    <name>_burst<N>_<offset>s.<extension>.
+
+    Returns:
+        Tuple of (succeeded, failed)
+    """
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    bursts = scan_recording(input_path, profile, workers, threshold=threshold)
+    if not bursts:
+        report(f"✗ {input_path}: no transmissions found")
+        return 0, 1
+
+    succeeded = failed = 0
+    names = [f"{stem}_burst{n:02d}_{burst.offset:.1f}s.{extension}"
+             for n, burst in enumerate(bursts, 1)]
+    outputs = plan_outputs(names, output_dir, lambda name: name)
+    for burst, output_path in zip(bursts, outputs):
+        where = f"{input_path} @ {burst.offset:.1f} s"
+        try:
+            if burst.error:
+                raise ValueError(burst.error)
+            info = save_payload(burst.payload, burst.success, output_path, key, store)
+            succeeded += 1
+            report(f"✓ {where} -> {output_path} ({info['bytes']} bytes, {burst.duration:.1f} s of audio)")
+        except Exception as e:
+            failed += 1
+            report(f"✗ {where}: {str(e) or type(e).__name__}")
+    return succeeded, failed
+
+
+def _collect_transfer(store, data):
+    """Store received chunks; return the payload of a completed transfer"""
+    added = store.add(data)
+    if not added:
+        raise ValueError("no intact chunks found")
+    incomplete = []
+    for transfer_id in added:
+        missing = store.missing(transfer_id)
+        if not missing:
+            payload = io.BytesIO()
+            store.assemble(transfer_id, payload)
+            return payload.getvalue()
+        incomplete.append(f"{transfer_id:08x}:{format_ranges(missing)}")
+    raise ValueError(f"transfer incomplete, re-send {' '.join(incomplete)}")
+
+
+def _run_job(func, input_path, output_path, options):
+    """Run one job in a worker, returning (info dict, seconds, error message)"""
+    start = time.perf_counter()
+    try:
+        info = func(input_path, output_path, **options)
+        return info, time.perf_counter() - start, None
+    except Exception as e:
+        return {}, time.perf_counter() - start, str(e) or type(e).__name__
+
+
+def run_batch(func, jobs, options, workers=None, report=print, timings=False):
+    """
+    Run func over (input, output) pairs in a bounded process pool
+
+    At most two jobs per worker are queued at a time, so huge batches do
+    not pile up pending futures.
+
+    Args:
+        func: encode_file or decode_file
+        jobs: List of (input path, output path)
+        options: Keyword arguments passed to func
+        workers: Worker processes (defaults to the CPU count)
+        report: Callable receiving one progress line per file
+        timings: Also report the time each stage took, per file
+
+    Returns:
+        Tuple of (succeeded, failed, elapsed seconds)
+    """
+    workers = workers or os.cpu_count() or 1
+    succeeded = failed = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        jobs = iter(jobs)
+        while True:
+            for input_path, output_path in jobs:
+                future = pool.submit(_run_job, func, input_path, output_path, options)
+                pending[future] = (input_path, output_path)
+                if len(pending) >= 2 * workers:
+                    break
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                input_path, output_path = pending.pop(future)
+                info, seconds, error = future.result()
+                if error is None:
+                    succeeded += 1
+                    saved = ""
+                    if info.get('bytes_saved'):
+                        saved = (f", {info['codec']} saved {info['bytes_saved']} bytes / "
+                                 f"{info['audio_saved']:.1f} s of audio")
+                    if info.get('transfer'):
+                        saved += f", transfer {info['transfer']}"
+                    report(f"✓ {input_path} -> {output_path} ({info['bytes']} bytes{saved}, {seconds:.2f} s)")
+                    if timings and info.get('timings'):
+                        report(f"    ⏱ {format_timings(info['timings'])}")
+                else:
+                    failed += 1
+                    report(f"✗ {input_path}: {error} ({seconds:.2f} s)")
+
+    return succeeded, failed, time.perf_counter() - start
+
+
+def build_parser():
+    """Build the argument parser"""
+    parser = argparse.ArgumentParser(
+        description="Encode or decode many files through the audio modem")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('inputs', nargs='+', help="Files, glob patterns or directories")
+    common.add_argument('-o', '--output-dir', default='outputs', help="Output directory (default: outputs)")
+    common.add_argument('-k', '--key', help="Encryption key (omit for no encryption)")
+    common.add_argument('--ask-key', action='store_true', help="Prompt for the key instead of passing it")
+    common.add_argument('-j', '--workers', type=int, default=None,
+                        help="Worker processes (default: CPU count)")
+
+    enc = sub.add_parser('encode', parents=[common], help="Encrypt and modulate files into WAV audio")
+    enc.add_argument('--cipher', choices=(MODE_CBC, MODE_GCM), default=MODE_CBC)
+    enc.add_argument('--profile', choices=list(PROFILES), default=DEFAULT_PROFILE)
+    enc.add_argument('--compress', choices=[COMPRESS_AUTO] + list(CODEC_IDS), default=None,
+                     help="Compression before encryption, needs a key (default: auto when encrypting)")
+    enc.add_argument('--fec', type=int, default=0, metavar='NSYM',
+                     help="Reed-Solomon parity bytes per 255-byte codeword (0 = off, e.g. 32)")
+    enc.add_argument('--lanes', type=int, default=1, choices=range(1, MAX_LANES + 1), metavar='N',
+                     help=f"Audio channels to spread each file over (1-{MAX_LANES})")
+    enc.add_argument('--chunked', action='store_true',
+                     help="Send as CRC-checked chunks so lost parts can be re-sent")
+    enc.add_argument('--outbox', default=DEFAULT_OUTBOX,
+                     help=f"Where chunked payloads are kept for re-sends (default: {DEFAULT_OUTBOX})")
+
+    dec = sub.add_parser('decode', parents=[common], help="Demodulate and decrypt WAV audio")
+    dec.add_argument('--format', default='bin', help="Extension of the decoded files (default: bin)")
+    dec.add_argument('--profile', choices=list(PROFILES), default=None,
+                     help="Force a modem profile (default: read it from each file)")
+    dec.add_argument('--store', default=DEFAULT_STORE,
+                     help=f"Where received chunks are collected (default: {DEFAULT_STORE})")
+    dec.add_argument('--offset', type=float, default=0.0, metavar='SECONDS',
+                     help="Start decoding this far into each recording")
+    dec.add_argument('--length', type=float, default=None, metavar='SECONDS',
+                     help="Only decode this much audio (default: to the end)")
+    for command in (enc, dec):
+        command.add_argument('-t', '--timings', action='store_true',
+                             help="Show how long each stage (encrypt, modulate, ...) took per file")
+
+    scan = sub.add_parser('scan', parents=[common],
+                          help="Find and decode every transmission in long recordings")
+    scan.add_argument('--format', default='bin', help="Extension of the decoded files (default: bin)")
+    scan.add_argument('--profile', choices=list(PROFILES), default=None,
+                      help="Force a modem profile (default: read it from each file)")
+    scan.add_argument('--store', default=DEFAULT_STORE,
+                      help=f"Where received chunks are collected (default: {DEFAULT_STORE})")
+    scan.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                      help=f"Carrier detection threshold, 0-1 (default: {DEFAULT_THRESHOLD})")
+
+    res = sub.add_parser('resend', help="Modulate chunks of a chunked transfer again")
+    res.add_argument('transfer', help="Transfer ID (hex, as reported by the receiver)")
+    res.add_argument('--chunks', default='', help="Chunk indices to re-send, e.g. 2,5-7 (default: all)")
+    res.add_argument('-o', '--output', default=None, help="Output WAV file (default: resend_<ID>.wav)")
+    res.add_argument('--profile', choices=list(PROFILES), default=DEFAULT_PROFILE)
+    res.add_argument('--fec', type=int, default=0, metavar='NSYM',
+                     help="Reed-Solomon parity bytes per 255-byte codeword (0 = off)")
+    res.add_argument('--lanes', type=int, default=1, choices=range(1, MAX_LANES + 1), metavar='N',
+                     help=f"Audio channels to spread the chunks over (1-{MAX_LANES})")
+    res.add_argument('--outbox', default=DEFAULT_OUTBOX,
+                     help=f"Where chunked payloads were kept (default: {DEFAULT_OUTBOX})")
+
+    return parser
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    args = build_parser().parse_args(argv)
+    if args.command == 'resend':
+        return _resend(args)
+
+    key = getpass.getpass("Key: ") if args.ask_key else args.key
+    if args.command == 'encode' and args.compress not in (None, CODEC_NONE) and not key:
+        print("✗ --compress needs a key: payloads are only compressed ahead of encryption",
+              file=sys.stderr)
+        return 2
+    if args.workers is not None and args.workers < 1:
+        print("✗ --workers must be at least 1", file=sys.stderr)
+        return 2
+
+    try:
+        if args.command == 'encode':
+            inputs = expand_inputs(args.inputs)
+        else:
+            inputs = expand_inputs(args.inputs, suffix='.wav')
+    except FileNotFoundError as e:
+        print(f"✗ {e}", file=sys.stderr)
+        return 2
+    if not inputs:
+        print("✗ No input files", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.command == 'scan':
+        return _scan(args, inputs, key)
+    if args.command == 'encode':
+        func = encode_file
+        name_for = lambda path: os.path.splitext(os.path.basename(path))[0] + '.wav'
+        options = {'key': key, 'cipher': args.cipher, 'profile': args.profile,
+                   'lanes': args.lanes, 'fec': args.fec, 'compression': args.compress or COMPRESS_AUTO,
+                   'chunked': args.chunked, 'outbox': args.outbox}
+    else:
+        func = decode_file
+        name_for = lambda path: f"decoded_{os.path.splitext(os.path.basename(path))[0]}.{args.format}"
+        options = {'key': key, 'profile': args.profile, 'store': args.store,
+                   'offset': args.offset, 'length': args.length}
+
+    outputs = plan_outputs(inputs, args.output_dir, name_for)
+    succeeded, failed, elapsed = run_batch(func, list(zip(inputs, outputs)), options, args.workers,
+                                           timings=args.timings)
+
+    total = succeeded + failed
+    print(f"\n{succeeded}/{total} files {args.command}d in {elapsed:.2f} s "
+          f"({total / elapsed:.2f} files/s)")
+    return 0 if failed == 0 else 1
+
+
+def _scan(args, inputs, key):
+    """Run the scan command"""
+    start = time.perf_counter()
+    succeeded = failed = 0
+    for input_path in inputs:
+        ok, bad = scan_file(input_path, args.output_dir, key, args.profile, args.store,
+                            args.workers, args.threshold, args.format)
+        succeeded += ok
+        failed += bad
+    elapsed = time.perf_counter() - start
+    print(f"\n{succeeded}/{succeeded + failed} transmissions decoded from "
+          f"{len(inputs)} recording(s) in {elapsed:.2f} s")
+    return 0 if failed == 0 else 1
+
+
+def _resend(args):
+    """Run the resend command"""
+    try:
+        transfer_id = int(args.transfer, 16)
+        chunks = parse_ranges(args.chunks) if args.chunks.strip() else None
+    except ValueError:
+        print("✗ Give the transfer ID in hex and chunks like 2,5-7", file=sys.stderr)
+        return 2
+
+    output_path = args.output or f"resend_{transfer_id:08x}.wav"
+    try:
+        info = resend_file(transfer_id, output_path, chunks, args.profile,
+                           args.lanes, args.fec, args.outbox)
+    except (ValueError, OSError) as e:
+        print(f"✗ {e}", file=sys.stderr)
+        return 1
+    print(f"✓ {args.transfer} -> {output_path} ({info['bytes']} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""
+Pipeline Benchmark Suite
+Times encrypt -> modulate -> demodulate -> decrypt end to end
+
+Every case (payload size x cipher mode x modem profile) runs in a fresh
+process, so peak RSS belongs to that case alone. Audio goes through real
+WAV files in a temporary directory, as it does in offline use. Results
+are printed as a table and can be written as JSON and compared against
+an earlier run to flag slowdowns.
+
+Usage:
+    python bench_pipeline.py                          # quick sweep
+    python bench_pipeline.py --preset full -o bench.json
+    python bench_pipeline.py --baseline bench.json    # exit 1 on regressions
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from crypto_handler import CryptoHandler, MODE_CBC, MODE_GCM
+from compression import CODEC_NONE
+from data_encoder import DataEncoder
+from data_decoder import DataDecoder
+from modem_profiles import PROFILES, DEFAULT_PROFILE
+
+PRESETS = {
+    'quick': {'sizes': ['1K', '64K'], 'modes': [MODE_CBC, MODE_GCM], 'profiles': [DEFAULT_PROFILE]},
+    'full': {'sizes': ['1K', '64K', '1M', '10M', '50M'], 'modes': [MODE_CBC, MODE_GCM],
+             'profiles': ['medium', DEFAULT_PROFILE, 'fast']},
+}
+
+STAGES = ('read', 'encrypt', 'modulate', 'demodulate', 'decrypt')
+
+# A stage this much slower than the baseline is a regression
+DEFAULT_TOLERANCE = 0.25
+
+# Stages faster than this are too noisy to compare
+MIN_COMPARED_SECONDS = 0.05
+
+
+def parse_size(text):
+    """Parse '64K', '10M', '1G' or a plain byte count"""
+    text = text.strip().upper()
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def run_case(size, mode, profile, key="benchmark"):
+    """
+    Run one round trip in this process and measure every stage
+
+    Args:
+        size: Payload bytes
+        mode: Cipher mode
+        profile: Modem profile
+
+    Returns:
+        Dictionary with the case, per-stage seconds and bytes, audio
+        length, peak RSS (None where it cannot be measured) and whether
+        the payload came back intact
+    """
+    stages = {}
+
+    def timed(name, nbytes, func, *args):
+        start = time.perf_counter()
+        value = func(*args)
+        stages[name] = {'seconds': time.perf_counter() - start, 'bytes': nbytes}
+        return value
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, 'payload.bin')
+        audio_path = os.path.join(tmp, 'payload.wav')
+        with open(input_path, 'wb') as f:
+            f.write(os.urandom(size))
+
+        def read():
+            with open(input_path, 'rb') as f:
+                return f.read()
+
+        data = timed('read', size, read)
+
+        crypto = CryptoHandler(key, mode=mode, compression=CODEC_NONE)
+        ciphertext = io.BytesIO()
+        timed('encrypt', size, crypto.encrypt_stream, io.BytesIO(data), ciphertext)
+        ciphertext = ciphertext.getvalue()
+
+        encoder = DataEncoder(profile)
+        timed('modulate', len(ciphertext), encoder.encode, ciphertext, audio_path)
+        audio_bytes = os.path.getsize(audio_path)
+
+        decoded = io.BytesIO()
+        result = timed('demodulate', audio_bytes, DataDecoder(profile).decode_to, audio_path, decoded)
+
+        plaintext = io.BytesIO()
+        decoded.seek(0)
+        timed('decrypt', len(decoded.getbuffer()), CryptoHandler(key).decrypt_stream, decoded, plaintext)
+
+    total = sum(stage['seconds'] for stage in stages.values())
+    return {
+        'size': size,
+        'mode': mode,
+        'profile': profile,
+        'ok': result.success and plaintext.getvalue() == data,
+        'stages': stages,
+        'total_seconds': total,
+        'bytes_per_second': size / total if total else 0.0,
+        'audio_seconds': result.audio_seconds,
+        'audio_seconds_per_byte': result.audio_seconds / size,
+        'realtime_factor': result.realtime_factor,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def run_suite(sizes, modes, profiles, report=print):
+    """
+    Run every case in its own fresh process
+
+    Returns:
+        List of case result dictionaries
+    """
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for profile in profiles:
+        for mode in modes:
+            for size in sizes:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    try:
+                        case = pool.submit(run_case, size, mode, profile).result()
+                    except Exception as e:
+                        case = {'size': size, 'mode': mode, 'profile': profile,
+                                'ok': False, 'error': str(e) or type(e).__name__}
+                results.append(case)
+                report(format_case(case))
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Find stages that got slower than in a baseline run
+
+    Args:
+        results: Case results of this run
+        baseline: Case results of the earlier run
+        tolerance: Allowed slowdown as a fraction (0.25 = 25 %)
+
+    Returns:
+        List of (case key, stage, baseline seconds, seconds) regressions
+    """
+    previous = {_case_key(case): case for case in baseline if case.get('ok')}
+    regressions = []
+    for case in results:
+        before = previous.get(_case_key(case))
+        if not before or not case.get('ok'):
+            continue
+        for stage in STAGES + ('total',):
+            old = _stage_seconds(before, stage)
+            new = _stage_seconds(case, stage)
+            if old is None or new is None or max(old, new) < MIN_COMPARED_SECONDS:
+                continue
+            if new > old * (1 + tolerance):
+                regressions.append((_case_key(case), stage, old, new))
+    return regressions
+
+
+def format_case(case):
+    """One table line for a case result"""
+    label = f"{case['profile']:<8} {case['mode']:<4} {_format_size(case['size']):>6}"
+    if 'error' in case:
+        return f"  ✗ {label}  {case['error']}"
+    stages = "  ".join(f"{name} {case['stages'][name]['seconds']:7.3f}s" for name in STAGES)
+    return (f"  {'✓' if case['ok'] else '✗'} {label}  {stages}  "
+            f"{case['bytes_per_second'] / 1e3:8.1f} kB/s  "
+            f"{case['audio_seconds_per_byte'] * 1e3:6.3f} ms audio/B  "
+            f"{_format_rss(case['peak_rss_mb'])}")
+
+
+def environment():
+    """Machine description stored with the results"""
+    import numpy
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': numpy.__version__,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark the full audio modem pipeline")
+    parser.add_argument('--preset', choices=list(PRESETS), default='quick')
+    parser.add_argument('--sizes', help="Comma-separated payload sizes, e.g. 1K,1M,50M")
+    parser.add_argument('--modes', help=f"Comma-separated cipher modes ({MODE_CBC},{MODE_GCM})")
+    parser.add_argument('--profiles', help=f"Comma-separated modem profiles ({','.join(PROFILES)})")
+    parser.add_argument('-o', '--output', help="Write the results as JSON to this file")
+    parser.add_argument('--baseline', help="JSON from an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f"Allowed slowdown before flagging (default: {DEFAULT_TOLERANCE})")
+    args = parser.parse_args(argv)
+
+    preset = PRESETS[args.preset]
+    try:
+        sizes = [parse_size(size) for size in (args.sizes.split(',') if args.sizes else preset['sizes'])]
+    except ValueError:
+        parser.error("sizes must look like 1024, 64K or 10M")
+    modes = args.modes.split(',') if args.modes else preset['modes']
+    profiles = args.profiles.split(',') if args.profiles else preset['profiles']
+    for profile in profiles:
+        if profile not in PROFILES:
+            parser.error(f"unknown profile: {profile}")
+    for mode in modes:
+        if mode not in (MODE_CBC, MODE_GCM):
+            parser.error(f"unknown cipher mode: {mode}")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['cases']
+
+    print(f"Pipeline benchmark: {len(sizes) * len(modes) * len(profiles)} cases")
+    results = run_suite(sizes, modes, profiles)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'cases': results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    failed = [case for case in results if not case.get('ok')]
+    if failed:
+        print(f"\n✗ {len(failed)} case(s) failed the round trip")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n✗ {len(regressions)} slowdown(s) beyond {args.tolerance:.0%}:")
+            for key, stage, old, new in regressions:
+                print(f"  {key} {stage}: {old:.3f}s -> {new:.3f}s ({new / old - 1:+.0%})")
+        else:
+            print(f"\n✓ No slowdowns beyond {args.tolerance:.0%} against {args.baseline}")
+        return 1 if regressions or failed else 0
+    return 1 if failed else 0
+
+
+def _case_key(case):
+    return f"{case['profile']}/{case['mode']}/{_format_size(case['size'])}"
+
+
+def _stage_seconds(case, stage):
+    if stage == 'total':
+        return case.get('total_seconds')
+    return case.get('stages', {}).get(stage, {}).get('seconds')
+
+
+def _format_size(size):
+    for unit, factor in (('G', 1024 ** 3), ('M', 1024 ** 2), ('K', 1024)):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{unit}"
+    return str(size)
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB, or None (Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _format_rss(peak):
+    return "    n/a" if peak is None else f"{peak:7.1f} MB"
+
+
+if __name__ == "__main__":
+    sys.exit(main())
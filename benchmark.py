@@ -0,0 +1,200 @@
+"""
+Benchmark Script for Data-over-Audio Transceiver
+Run this to measure the throughput of individual pipeline stages
+"""
+
+import time
+
+from PIL import Image
+
+
+def _legacy_data_to_image_binary(data):
+    """Per-pixel reference implementation, kept for before/after numbers"""
+    bits = ''.join(format(byte, '08b') for byte in data)
+
+    width, height = 320, 256
+    image = Image.new('1', (width, height))
+    pixels = image.load()
+
+    for i in range(width * height):
+        if i < len(bits) and bits[i] == '1':
+            pixels[i % width, i // width] = 255
+        else:
+            pixels[i % width, i // width] = 0
+
+    return image.convert('RGB')
+
+
+def _legacy_image_to_data_binary(image):
+    """Per-pixel reference implementation, kept for before/after numbers"""
+    image = image.convert('1', dither=Image.NONE)
+    pixels = image.load()
+    width, height = image.size
+
+    bits = ""
+    for y in range(height):
+        for x in range(width):
+            bits += '1' if pixels[x, y] > 0 else '0'
+
+    data = bytearray()
+    for i in range(0, len(bits) - 7, 8):
+        data.append(int(bits[i:i+8], 2))
+
+    return bytes(data)
+
+
+def _frames_per_second(func, arg, min_time=1.0):
+    """Call func(arg) repeatedly for at least min_time seconds"""
+    count = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        func(arg)
+        count += 1
+        elapsed = time.perf_counter() - start
+    return count / elapsed
+
+
+def bench_binary_image():
+    """Compare the legacy and packed-bit binary image conversions"""
+    from crypto_handler import CryptoHandler
+    from Crypto.Random import get_random_bytes
+
+    print("Binary image conversion (320x256, 1 bit/pixel)...")
+
+    crypto = CryptoHandler("benchmark")
+    data = get_random_bytes(320 * 256 // 8)
+    image = crypto._data_to_image_binary(data)
+
+    rows = [
+        ("to image", _legacy_data_to_image_binary, crypto._data_to_image_binary, data),
+        ("to data", _legacy_image_to_data_binary, crypto._image_to_data_binary, image),
+    ]
+    for name, before, after, arg in rows:
+        before_fps = _frames_per_second(before, arg)
+        after_fps = _frames_per_second(after, arg)
+        print(f"  {name:<10} before: {before_fps:10.1f} frames/s   "
+              f"after: {after_fps:10.1f} frames/s   "
+              f"speedup: {after_fps / before_fps:6.1f}x")
+
+
+def bench_image_density(size=1024 * 1024):
+    """Compare frame counts and render speed of the image carrier densities"""
+    import os
+    import tempfile
+    from crypto_handler import CryptoHandler, DENSITY_BINARY, DENSITY_LEVELS
+
+    print(f"Image carrier density ({size // 1024} KiB payload)...")
+
+    crypto = CryptoHandler("benchmark")
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, 'input.bin')
+        with open(input_path, 'wb') as f:
+            f.write(os.urandom(size))
+
+        for density in (DENSITY_BINARY,) + DENSITY_LEVELS:
+            start = time.perf_counter()
+            frames = sum(1 for _ in crypto.encrypt_image_frames(input_path, density=density))
+            elapsed = time.perf_counter() - start
+            label = "binary" if density == DENSITY_BINARY else f"{density} bit/ch"
+            print(f"  {label:<10} {frames:5d} frames   {frames / elapsed:8.1f} frames/s")
+
+
+def bench_cipher_scaling(size=64 * 1024 * 1024):
+    """Measure CBC vs parallel GCM encryption throughput by worker count"""
+    import io
+    import os
+    from crypto_handler import CryptoHandler, MODE_CBC, MODE_GCM
+
+    print(f"Stream encryption throughput ({size // (1024 * 1024)} MiB, "
+          f"{os.cpu_count()} CPUs)...")
+
+    class NullSink:
+        def write(self, data):
+            pass
+
+    data = os.urandom(size)
+    cases = [(MODE_CBC, 1)]
+    workers = 1
+    while workers <= max(os.cpu_count() or 1, 8):
+        cases.append((MODE_GCM, workers))
+        workers *= 2
+
+    for mode, workers in cases:
+        crypto = CryptoHandler("benchmark", mode=mode, workers=workers)
+        start = time.perf_counter()
+        crypto.encrypt_stream(io.BytesIO(data), NullSink())
+        elapsed = time.perf_counter() - start
+        print(f"  {mode} workers={workers:<3} {size / elapsed / 1e6:10.1f} MB/s")
+
+
+def bench_fec_goodput(size=16 * 1024, frame_loss=(0.0, 0.005, 0.01, 0.02), trials=20):
+    """
+    Compare goodput with and without FEC when modem frames get lost
+
+    amodem stops at the first frame that fails its CRC, so a transfer
+    either arrives whole or loses everything after that frame. Without
+    FEC the whole transfer is resent until it arrives intact; with FEC
+    it succeeds if the lost tail is within what the parity can restore.
+    Goodput is payload bytes per byte of airtime.
+    """
+    import os
+    import random
+    from fec_codec import fec_encode, fec_decode, FEC_LEVELS
+
+    print(f"FEC goodput ({size // 1024} KiB payload, 250-byte modem frames)...")
+
+    data = os.urandom(size)
+    rng = random.Random(1)
+
+    def airtime_until_received(payload, decode):
+        """Bytes sent until one attempt decodes, retrying whole transfers"""
+        sent = 0
+        for _ in range(1000):
+            sent += len(payload)
+            received = payload
+            for offset in range(0, len(payload), 250):
+                if rng.random() < loss:
+                    received = payload[:offset]
+                    break
+            try:
+                if decode(received) == data:
+                    return sent
+            except ValueError:
+                pass
+        return float('inf')
+
+    variants = [("no FEC", data, lambda received: received)]
+    for nsym in FEC_LEVELS:
+        variants.append((f"RS nsym={nsym}", fec_encode(data, nsym), fec_decode))
+
+    for loss in frame_loss:
+        row = []
+        for name, payload, decode in variants:
+            airtime = sum(airtime_until_received(payload, decode) for _ in range(trials))
+            row.append(f"{name}: {size * trials / airtime:5.2f}")
+        print(f"  frame loss {loss:.2%}   " + "   ".join(row))
+
+
+def main():
+    """Run all benchmarks"""
+    print("="*60)
+    print("DATA-OVER-AUDIO TRANSCEIVER - BENCHMARKS")
+    print("="*60)
+    print()
+
+    benchmarks = [
+        bench_binary_image,
+        bench_image_density,
+        bench_cipher_scaling,
+        bench_fec_goodput,
+    ]
+
+    for bench in benchmarks:
+        bench()
+        print()
+
+    print("="*60)
+
+if __name__ == "__main__":
+    main()
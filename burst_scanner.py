@@ -0,0 +1,121 @@
+"""
+Burst Scanner Module
+Finds every transmission in a long recording and decodes them in parallel
+
+The recording is memory-mapped and swept once with the vectorized carrier
+detector, a few seconds of audio per step, to find where each burst
+starts and ends. Each burst is then demodulated on its own in a process
+pool; the workers map just their window of the file, so nothing but the
+file path and offsets is sent to them.
+"""
+
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+from audio_normalize import to_float
+from carrier_detect import (block_levels, burst_spans, DEFAULT_THRESHOLD, DEFAULT_MIN_LEVEL,
+                            DEFAULT_PREROLL, DEFAULT_HANGOVER)
+from data_decoder import DataDecoder, map_samples
+from modem_profiles import get_config
+
+# Detector block, in samples at the modem's rate (as the live recorder)
+BLOCK_FRAMES = 1024
+
+# Frames of the recording converted and measured per step
+SCAN_FRAMES = 1 << 20
+
+
+@dataclass
+class Burst:
+    """One transmission found in a recording"""
+    offset: float  # seconds from the start of the recording
+    duration: float
+    success: bool = False
+    payload: bytes = b''
+    error: str = None
+
+
+def find_bursts(audio_path, profile=None, threshold=DEFAULT_THRESHOLD,
+                min_level=DEFAULT_MIN_LEVEL, preroll=DEFAULT_PREROLL,
+                hangover=DEFAULT_HANGOVER):
+    """
+    Locate the transmissions in a recording
+
+    Args:
+        audio_path: Path to the WAV (or raw PCM) file
+        profile: Modem profile, or None to use the one in the file
+        threshold: Carrier energy share that counts as signal
+        min_level: RMS level below which audio counts as silence
+        preroll: Seconds added before each burst
+        hangover: Seconds without carrier that end a burst (also added
+            after it)
+
+    Returns:
+        List of (offset, duration) pairs in seconds, in recording order
+    """
+    info, profile, _ = DataDecoder(profile).probe(audio_path)
+    config = get_config(profile)
+    _, samples = map_samples(audio_path, info)
+
+    block = max(1, round(BLOCK_FRAMES * info.framerate / config.Fs))
+    step = SCAN_FRAMES // block * block * info.nchannels * info.sampwidth
+    levels = []
+    for start in range(0, len(samples), step):
+        x = to_float(samples[start:start + step], info.format_tag, info.sampwidth)
+        if info.nchannels > 1:
+            x = x.reshape(-1, info.nchannels).mean(axis=1)
+        levels.append(block_levels(x, config, block, info.framerate))
+    if not levels:
+        return []
+    main, band, rms = (np.concatenate(parts) for parts in zip(*levels))
+
+    block_seconds = block / info.framerate
+    hangover_blocks = max(1, int(np.ceil(hangover / block_seconds)))
+    total = info.nframes / info.framerate
+    bursts = []
+    for first, end in burst_spans(main, band, rms, threshold, min_level, hangover_blocks):
+        offset = max(0.0, first * block_seconds - preroll)
+        stop = min(total, end * block_seconds + hangover)
+        bursts.append((offset, stop - offset))
+    return bursts
+
+
+def scan_recording(audio_path, profile=None, workers=None, **detector_options):
+    """
+    Find and decode every transmission in a recording
+
+    Args:
+        audio_path: Path to the WAV (or raw PCM) file
+        profile: Modem profile, or None to use the one in the file
+        workers: Worker processes (defaults to the CPU count)
+        **detector_options: Passed on to find_bursts
+
+    Returns:
+        List of Burst, in recording order
+    """
+    spans = find_bursts(audio_path, profile, **detector_options)
+    if not spans:
+        return []
+
+    workers = min(len(spans), workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_decode_burst, audio_path, profile, offset, duration)
+                   for offset, duration in spans]
+        return [future.result() for future in futures]
+
+
+def _decode_burst(audio_path, profile, offset, duration):
+    """Demodulate one burst (runs in a worker process)"""
+    burst = Burst(offset, duration)
+    decoded = io.BytesIO()
+    try:
+        result = DataDecoder(profile).decode_to(audio_path, decoded, offset, duration)
+        burst.success = result.success
+    except Exception as e:
+        burst.error = str(e) or type(e).__name__
+    burst.payload = decoded.getvalue()
+    return burst
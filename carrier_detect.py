@@ -0,0 +1,223 @@
+"""
+Carrier Detection Module
+Decides from incoming audio blocks when a modem transmission starts and ends
+
+Every amodem transmission opens with a pure tone on the main carrier,
+then fills the carrier frequencies with symbols. Each block is cut into
+symbol-length windows and correlated against all carriers at once (one
+matrix product), giving the share of the window's energy that sits on
+the main carrier and on the whole carrier set:
+
+    idle:      both shares low (noise spreads over every DFT bin)
+    preamble:  main-carrier share close to 1 -> start recording
+    data:      carrier-set share close to 1 -> keep recording
+    carrier drops for `hangover` seconds     -> stop
+"""
+
+from collections import deque
+
+import numpy as np
+
+# Share of a block's energy that must sit on the carriers
+DEFAULT_THRESHOLD = 0.8
+
+# Blocks quieter than this RMS level (full scale = 1.0) count as silence
+DEFAULT_MIN_LEVEL = 0.002
+
+# Seconds kept from before the carrier appeared, so the demodulator sees
+# the whole preamble
+DEFAULT_PREROLL = 0.5
+
+# Seconds the carrier must be gone before the transmission counts as over
+# (amodem leaves a 0.1 s gap after the preamble)
+DEFAULT_HANGOVER = 0.3
+
+# States
+IDLE = 'idle'
+ACTIVE = 'active'
+FINISHED = 'finished'
+
+
+def carrier_levels(samples, config, nchannels=1):
+    """
+    Measure carrier energy shares of a block of samples
+
+    Args:
+        samples: Little-endian 16-bit PCM bytes or an int16 array
+        config: amodem Configuration (sample rate, carriers, symbol length)
+        nchannels: Interleaved channels, mixed down before measuring
+
+    Returns:
+        Tuple of (main carrier share, carrier set share, RMS level), the
+        shares being fractions of the block's energy between 0 and 1
+    """
+    x = np.frombuffer(samples, dtype='<i2') if isinstance(samples, (bytes, bytearray, memoryview)) else samples
+    x = x.astype(np.float64) / 32768
+    if nchannels > 1:
+        x = x[:len(x) // nchannels * nchannels].reshape(-1, nchannels).mean(axis=1)
+
+    main, band, rms = block_levels(x, config, len(x))
+    if not len(main):
+        return 0.0, 0.0, 0.0
+    return float(main[0]), float(band[0]), float(rms[0])
+
+
+def block_levels(x, config, block_frames, rate=None):
+    """
+    Measure carrier energy shares of consecutive blocks at once
+
+    Args:
+        x: Mono float samples (full scale = 1.0)
+        config: amodem Configuration of the transmission
+        block_frames: Samples per block; a partial last block is ignored
+        rate: Sample rate of x (default: the modem's)
+
+    Returns:
+        Tuple of arrays (main carrier share, carrier set share, RMS
+        level), one value per block
+    """
+    rate = rate or config.Fs
+    nsym = max(1, round(config.Nsym * rate / config.Fs))  # one symbol
+    per_block = block_frames // nsym
+    nblocks = len(x) // (per_block * nsym) if per_block else 0
+    if not nblocks:
+        return np.zeros(0), np.zeros(0), np.zeros(0)
+
+    windows = x[:nblocks * per_block * nsym].reshape(nblocks, per_block, nsym)
+    energy = np.einsum('bwn,bwn->b', windows, windows)
+    rms = np.sqrt(energy / (per_block * nsym))
+
+    # One-sided power on each carrier; sums to the energy for pure tones
+    power = np.abs(windows @ _carrier_basis(config, nsym, rate)) ** 2 * (2 / nsym)
+    per_carrier = power.sum(axis=1) / np.maximum(energy, 1e-30)[:, None]
+    main = np.minimum(per_carrier[:, _main_carrier(config)], 1.0)
+    band = np.minimum(per_carrier.sum(axis=1), 1.0)
+    return main, band, rms
+
+
+def burst_spans(main, band, rms, threshold=DEFAULT_THRESHOLD,
+                min_level=DEFAULT_MIN_LEVEL, hangover_blocks=1):
+    """
+    Find transmissions in per-block levels from block_levels
+
+    A burst starts at a block where the main carrier share reaches the
+    threshold (the preamble) and ends where the carrier set share stays
+    below it for hangover_blocks blocks, as in CarrierDetector.
+
+    Returns:
+        List of (first block, end block) pairs, end exclusive
+    """
+    loud = rms >= min_level
+    arm = np.flatnonzero(loud & (main >= threshold))
+    quiet = ~(loud & (band >= threshold))
+
+    # Start blocks of quiet runs long enough to end a burst
+    edges = np.diff(np.concatenate([[0], quiet.astype(np.int8), [0]]))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    stops = starts[ends - starts >= hangover_blocks]
+
+    spans = []
+    pos = 0
+    while True:
+        k = np.searchsorted(arm, pos)
+        if k == len(arm):
+            return spans
+        first = int(arm[k])
+        j = np.searchsorted(stops, first, side='right')
+        end = int(stops[j]) if j < len(stops) else len(quiet)
+        spans.append((first, end))
+        pos = end
+
+
+class CarrierDetector:
+    """Gate for recorded audio: keeps the transmission, drops the silence"""
+
+    def __init__(self, config, nchannels=1, threshold=DEFAULT_THRESHOLD,
+                 min_level=DEFAULT_MIN_LEVEL, preroll=DEFAULT_PREROLL,
+                 hangover=DEFAULT_HANGOVER):
+        """
+        Args:
+            config: amodem Configuration of the expected transmission
+            nchannels: Interleaved channels in each block
+            threshold: Carrier energy share (0-1) that counts as signal;
+                lower it for noisy links, raise it if noise triggers
+            min_level: RMS level below which a block is silence
+            preroll: Seconds of audio kept from before the carrier
+            hangover: Seconds without carrier before stopping
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError("Detection threshold must be between 0 and 1")
+        self.config = config
+        self.nchannels = nchannels
+        self.threshold = threshold
+        self.min_level = min_level
+        self.state = IDLE
+
+        self._frame_size = nchannels * config.sample_size
+        self._preroll_bytes = int(preroll * config.Fs) * self._frame_size
+        self._hangover_frames = int(hangover * config.Fs)
+        self._preroll = deque()
+        self._preroll_size = 0
+        self._quiet_frames = 0
+
+    @property
+    def active(self):
+        return self.state == ACTIVE
+
+    @property
+    def finished(self):
+        return self.state == FINISHED
+
+    def feed(self, block):
+        """
+        Process one block of recorded samples
+
+        Args:
+            block: PCM bytes (whole frames)
+
+        Returns:
+            Bytes to keep: nothing while idle, the pre-roll plus the block
+            when the carrier appears, the block itself while active
+        """
+        if self.state == FINISHED:
+            return b''
+
+        main, band, rms = carrier_levels(block, self.config, self.nchannels)
+        loud = rms >= self.min_level
+
+        if self.state == IDLE:
+            if loud and main >= self.threshold:
+                self.state = ACTIVE
+                kept = b''.join(self._preroll) + bytes(block)
+                self._preroll.clear()
+                self._preroll_size = 0
+                return kept
+            self._remember(block)
+            return b''
+
+        if loud and band >= self.threshold:
+            self._quiet_frames = 0
+        else:
+            self._quiet_frames += len(block) // self._frame_size
+            if self._quiet_frames >= self._hangover_frames:
+                self.state = FINISHED
+        return bytes(block)
+
+    def _remember(self, block):
+        """Keep the most recent `preroll` seconds of idle audio"""
+        self._preroll.append(bytes(block))
+        self._preroll_size += len(block)
+        while self._preroll and self._preroll_size - len(self._preroll[0]) >= self._preroll_bytes:
+            self._preroll_size -= len(self._preroll.popleft())
+
+
+def _carrier_basis(config, nsym, rate):
+    """Complex exponentials (nsym x carriers) for correlating windows"""
+    n = np.arange(nsym)
+    frequencies = np.asarray(list(config.frequencies), dtype=np.float64)
+    return np.exp(-2j * np.pi * np.outer(n, frequencies) / rate)
+
+
+def _main_carrier(config):
+    """Index of the carrier the preamble tone is sent on"""
+    return int(np.argmin(np.abs(np.asarray(list(config.frequencies)) - config.Fc)))
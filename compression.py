@@ -0,0 +1,212 @@
+"""
+Compression Module
+Picks and applies a compression codec ahead of encryption
+
+Ciphertext does not compress, so anything that shortens the transmission
+has to happen before AES. The codec is chosen by trial-compressing a
+sample of the input; formats that are already compressed are skipped.
+"""
+
+import bz2
+import lzma
+import time
+import zlib
+from dataclasses import dataclass
+
+# Codecs
+CODEC_NONE = 'none'
+CODEC_ZLIB = 'zlib'
+CODEC_BZ2 = 'bz2'
+CODEC_LZMA = 'lzma'
+COMPRESS_AUTO = 'auto'
+
+CODEC_IDS = {CODEC_NONE: 0, CODEC_ZLIB: 1, CODEC_BZ2: 2, CODEC_LZMA: 3}
+
+# Bytes of input trial-compressed by choose_codec
+SAMPLE_SIZE = 256 * 1024
+
+# Airtime of the default modem profile (48 kbps), used to weigh CPU time
+# against transmission time when choosing a codec
+AIRTIME_BYTES_PER_SECOND = 6000
+
+# A codec must save at least this fraction of the sample to be used
+MIN_SAVING = 0.02
+
+# Leading bytes of formats that are compressed already
+_COMPRESSED_SIGNATURES = (
+    b'\x89PNG', b'\xff\xd8\xff', b'GIF8', b'PK\x03\x04', b'\x1f\x8b', b'BZh',
+    b'\xfd7zXZ', b"7z\xbc\xaf\x27\x1c", b'OggS', b'fLaC', b'ID3', b'\xff\xfb',
+    b'SXC2',
+)
+
+
+@dataclass
+class CompressionStats:
+    """What the compression stage did to one message"""
+    codec: str = CODEC_NONE
+    bytes_in: int = 0
+    bytes_out: int = 0
+
+    @property
+    def bytes_saved(self):
+        return self.bytes_in - self.bytes_out
+
+    def airtime_saved(self, bytes_per_second=AIRTIME_BYTES_PER_SECOND):
+        """Seconds of audio saved at the given modem rate"""
+        return self.bytes_saved / bytes_per_second
+
+
+def is_compressed_format(sample):
+    """Return True if sample starts like an already-compressed file"""
+    sample = bytes(sample[:16])
+    if sample.startswith(_COMPRESSED_SIGNATURES):
+        return True
+    # RIFF WEBP, ISO media (MP4, HEIC, ...)
+    return (sample[:4] == b'RIFF' and sample[8:12] == b'WEBP') or sample[4:8] == b'ftyp'
+
+
+def choose_codec(sample, bytes_per_second=AIRTIME_BYTES_PER_SECOND):
+    """
+    Pick the codec that minimises compression time plus airtime
+
+    Args:
+        sample: Leading bytes of the input (up to SAMPLE_SIZE are used)
+        bytes_per_second: Payload rate of the modem
+
+    Returns:
+        Codec name (CODEC_NONE if nothing is worth it)
+    """
+    sample = bytes(sample[:SAMPLE_SIZE])
+    if not sample or is_compressed_format(sample):
+        return CODEC_NONE
+
+    best, best_cost = CODEC_NONE, len(sample) / bytes_per_second
+    for codec in (CODEC_ZLIB, CODEC_BZ2, CODEC_LZMA):
+        start = time.perf_counter()
+        compressor = new_compressor(codec)
+        size = len(compressor.compress(sample)) + len(compressor.flush())
+        elapsed = time.perf_counter() - start
+
+        if size > len(sample) * (1 - MIN_SAVING):
+            continue
+        cost = elapsed + size / bytes_per_second
+        if cost < best_cost:
+            best, best_cost = codec, cost
+    return best
+
+
+def new_compressor(codec):
+    """Create a streaming compressor (compress() / flush()) for codec"""
+    if codec == CODEC_NONE:
+        return _NullCompressor()
+    if codec == CODEC_ZLIB:
+        return zlib.compressobj(9)
+    if codec == CODEC_BZ2:
+        return bz2.BZ2Compressor(9)
+    if codec == CODEC_LZMA:
+        return lzma.LZMACompressor(format=lzma.FORMAT_XZ)
+    raise ValueError(f"Unknown compression codec: {codec}")
+
+
+def new_decompressor(codec):
+    """Create a streaming decompressor for codec"""
+    if codec == CODEC_ZLIB:
+        return zlib.decompressobj()
+    if codec == CODEC_BZ2:
+        return bz2.BZ2Decompressor()
+    if codec == CODEC_LZMA:
+        return lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+    raise ValueError(f"Unknown compression codec: {codec}")
+
+
+def iter_decompress(blocks, codec, max_length=64 * 1024):
+    """
+    Decompress a stream of blocks, yielding at most max_length bytes at a time
+
+    Output is bounded per step, so a small, highly compressed message
+    cannot expand into one huge buffer.
+
+    Args:
+        blocks: Iterable of compressed bytes
+        codec: Codec name
+        max_length: Largest block yielded
+
+    Yields:
+        Decompressed bytes
+
+    Raises:
+        ValueError: If the compressed stream is corrupt or cut short
+    """
+    decompressor = new_decompressor(codec)
+    try:
+        for block in blocks:
+            data = _decompress(decompressor, block, max_length)
+            while data:
+                yield data
+                data = _decompress(decompressor, b'', max_length)
+    except (zlib.error, OSError, lzma.LZMAError) as e:
+        raise ValueError("Decompression failed. Corrupted data.") from e
+
+    if not decompressor.eof:
+        raise ValueError("Decompression failed. Data is truncated.")
+
+
+def _decompress(decompressor, data, max_length):
+    """One bounded decompression step; b'' means more input is needed"""
+    if decompressor.eof:
+        if data:
+            raise ValueError("Decompression failed. Unexpected data after the end.")
+        return b''
+    if hasattr(decompressor, 'unconsumed_tail'):  # zlib keeps leftover input outside
+        return decompressor.decompress(decompressor.unconsumed_tail + data, max_length)
+    return decompressor.decompress(data, max_length)
+
+
+class _NullCompressor:
+    """Stand-in compressor for CODEC_NONE"""
+
+    def compress(self, data):
+        return data
+
+    def flush(self):
+        return b''
+
+
+class CompressingReader:
+    """File-like reader that yields the compressed form of src"""
+
+    def __init__(self, src, codec, stats=None, head=b''):
+        """
+        Args:
+            src: Readable binary file-like object with the raw data
+            codec: Codec name
+            stats: CompressionStats updated as data flows through
+            head: Bytes already read from src (e.g. the codec sample)
+        """
+        self._src = src
+        self._head = head
+        self._compressor = new_compressor(codec)
+        self._buf = bytearray()
+        self._done = False
+        self.stats = stats if stats is not None else CompressionStats(codec)
+        self.stats.codec = codec
+
+    def read(self, size=-1):
+        while not self._done and (size is None or size < 0 or len(self._buf) < size):
+            if self._head:
+                chunk, self._head = self._head, b''
+            else:
+                chunk = self._src.read(64 * 1024)
+            if chunk:
+                self.stats.bytes_in += len(chunk)
+                self._buf += self._compressor.compress(chunk)
+            else:
+                self._buf += self._compressor.flush()
+                self._done = True
+
+        if size is None or size < 0:
+            size = len(self._buf)
+        data = bytes(self._buf[:size])
+        del self._buf[:size]
+        self.stats.bytes_out += len(data)
+        return data
@@ -5,67 +5,497 @@ Handles AES-256 encryption and decryption of images
 
 import os
 import hashlib
+import struct
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from Crypto.Cipher import AES
 from Crypto.Random import get_random_bytes
 from Crypto.Util.Padding import pad, unpad
 from PIL import Image
+import numpy as np
 import io
 
+from key_cache import KeyCache
+from compression import (CODEC_NONE, CODEC_IDS, COMPRESS_AUTO, SAMPLE_SIZE,
+                         CompressionStats, CompressingReader, choose_codec,
+                         iter_decompress)
+
+
+# Plaintext/ciphertext is processed in chunks of this many bytes.
+# Must be a multiple of the AES block size.
+CHUNK_SIZE = 64 * 1024
+
+# Cipher modes
+MODE_CBC = 'cbc'  # AES-CBC, one IV per message
+MODE_GCM = 'gcm'  # independently sealed AES-GCM segments
+
+# Key derivation functions
+KDF_SHA256 = 'sha256'  # single unsalted SHA-256 (original behaviour)
+KDF_SCRYPT = 'scrypt'  # salted, memory-hard
+KDF_PBKDF2 = 'pbkdf2'  # salted PBKDF2-HMAC-SHA256
+
+# Default parameters: scrypt (log2 N, r, p) and PBKDF2 (iterations,)
+DEFAULT_KDF_PARAMS = {
+    KDF_SHA256: (),
+    KDF_SCRYPT: (15, 8, 1),
+    KDF_PBKDF2: (600000,),
+}
+# Upper bounds for parameters read from a header, so a crafted message
+# cannot make the receiver burn unbounded CPU or memory
+_KDF_LIMITS = {
+    KDF_SCRYPT: (18, 8, 4),
+    KDF_PBKDF2: (10000000,),
+}
+SALT_SIZE = 16
+
+# Output is a header followed by the mode-specific payload:
+#   magic, mode id, KDF id, segment size       (_HEADER)
+#   KDF parameters and salt                    (salted KDFs only)
+#   CBC: 16-byte IV / GCM: 7-byte nonce prefix
+# The high nibble of the mode id holds the compression codec applied to
+# the plaintext (see compression.CODEC_IDS).
+# Uncompressed CBC with the SHA-256 KDF is written headerless (IV +
+# ciphertext) so older receivers can still read it; anything not starting
+# with the magic is treated that way.
+HEADER_MAGIC = b'SXC2'
+_HEADER = struct.Struct('>4sBBI')
+_MODE_IDS = {MODE_CBC: 0, MODE_GCM: 1}
+_KDF_IDS = {KDF_SHA256: 0, KDF_SCRYPT: 1, KDF_PBKDF2: 2}
+_KDF_PARAMS = {
+    KDF_SHA256: struct.Struct('>'),
+    KDF_SCRYPT: struct.Struct('>BBB'),
+    KDF_PBKDF2: struct.Struct('>I'),
+}
+_GCM_NONCE_PREFIX_SIZE = 7
+_GCM_TAG_SIZE = 16
+
+# Plaintext bytes per GCM segment; each segment is one thread pool task
+SEGMENT_SIZE = 256 * 1024
+
+# Image carrier: one bit per pixel of a 320x256 frame
+FRAME_WIDTH, FRAME_HEIGHT = 320, 256
+FRAME_BYTES = FRAME_WIDTH * FRAME_HEIGHT // 8
+
+# Denser carriers store 1, 2, 4 or 8 bits in every RGB channel. Their
+# first row is always binary and holds the density header (magic + bits
+# per channel); binary frames never start with the magic, so receivers
+# can tell the two apart.
+DENSITY_BINARY = 0
+DENSITY_LEVELS = (1, 2, 4, 8)
+DENSITY_MAGIC = b'SXD1'
+
+# Paged frames start with magic, transfer ID, frame index, frame count and
+# payload length. Single-frame images start with a 4-byte length instead,
+# which can never equal the magic since it is far below 2**31.
+FRAME_MAGIC = b'SXF1'
+_FRAME_HEADER = struct.Struct('>4sIHHI')
+
+# Paged ciphertext is kept in memory up to this size, then on disk
+SPOOL_SIZE = 1024 * 1024
+
+# Keys derived by salted KDFs, shared by every handler in the process
+key_cache = KeyCache()
+
 
 class CryptoHandler:
     """Handles encryption and decryption operations"""
 
-    def __init__(self, password):
+    def __init__(self, password, mode=MODE_CBC, workers=None,
+                 kdf=KDF_SCRYPT, kdf_params=None, compression=CODEC_NONE):
         """
         Initialize crypto handler with password
 
         Args:
             password: Password for encryption/decryption
+            mode: Cipher mode used when encrypting, MODE_CBC or MODE_GCM.
+                Decryption detects the mode from the data.
+            workers: Threads used for GCM segments (default: CPU count)
+            kdf: Key derivation used when encrypting. Decryption reads the
+                KDF and its parameters from the data.
+            kdf_params: Parameter tuple for kdf (default: DEFAULT_KDF_PARAMS)
+            compression: Codec applied before encrypting, a name from
+                compression.CODEC_IDS or COMPRESS_AUTO to pick one from a
+                sample of the input. Decryption detects it.
         """
-        # Derive 256-bit key from password using SHA-256
+        if mode not in _MODE_IDS:
+            raise ValueError(f"Unknown cipher mode: {mode}")
+        if kdf not in _KDF_IDS:
+            raise ValueError(f"Unknown key derivation function: {kdf}")
+        if kdf_params is None:
+            kdf_params = DEFAULT_KDF_PARAMS[kdf]
+        _check_kdf_params(kdf, kdf_params)
+        if compression != COMPRESS_AUTO and compression not in CODEC_IDS:
+            raise ValueError(f"Unknown compression codec: {compression}")
+
+        # Unsalted SHA-256 key, used for headerless (legacy) data
         self.key = hashlib.sha256(password.encode('utf-8')).digest()
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.kdf = kdf
+        self.kdf_params = tuple(kdf_params)
+        self.compression = compression
+        self._password = password
+
+        # Filled in by each encryption
+        self.compression_stats = CompressionStats()
+
+    def encrypt_stream(self, src, dst, chunk_size=CHUNK_SIZE):
+        """
+        Encrypt a file-like object into another, chunk by chunk
+
+        In CBC mode with the SHA-256 KDF the output is IV followed by the
+        AES-CBC ciphertext, the same format as the original code paths.
+        Otherwise a header carrying the mode, KDF parameters and salt comes
+        first; in GCM mode the payload is authenticated segments that are
+        sealed in parallel. Peak memory is bounded regardless of input size.
+
+        Args:
+            src: Readable binary file-like object with the plaintext
+            dst: Writable binary file-like object for the ciphertext
+            chunk_size: Number of bytes to read per chunk (CBC only)
+
+        Returns:
+            Number of bytes written to dst
+        """
+        written = 0
+        for block in self._iter_encrypt(src, chunk_size):
+            dst.write(block)
+            written += len(block)
+        return written
+
+    def encrypt_reader(self, src, chunk_size=CHUNK_SIZE):
+        """
+        Wrap a plaintext file-like object in a reader of its ciphertext
+
+        Plaintext is only read and encrypted as the ciphertext is read,
+        so a consumer such as DataEncoder can pull from an upload without
+        an intermediate buffer or file. Key derivation and the choice of
+        compression happen right away, so their errors are raised here.
+
+        Args:
+            src: Readable binary file-like object with the plaintext
+            chunk_size: Number of bytes to read per chunk (CBC only)
+
+        Returns:
+            Readable binary file-like object with the ciphertext
+        """
+        return _IterReader(self._iter_encrypt(src, chunk_size))
+
+    def decrypt_stream(self, src, dst, chunk_size=CHUNK_SIZE):
+        """
+        Decrypt a file-like object into another, chunk by chunk
+
+        Reads any format written by encrypt_stream, whatever mode and KDF
+        this handler was created with. Errors are only detected when the
+        bad block arrives, so dst may already hold some output when
+        ValueError is raised.
+
+        Args:
+            src: Readable binary file-like object with the ciphertext
+            dst: Writable binary file-like object for the plaintext
+            chunk_size: Number of bytes to read per chunk (CBC only)
+
+        Returns:
+            Number of bytes written to dst
+        """
+        written = 0
+        for block in self._iter_decrypt(src, chunk_size):
+            dst.write(block)
+            written += len(block)
+        return written
+
+    def _iter_encrypt(self, src, chunk_size=CHUNK_SIZE):
+        """
+        Generate ciphertext blocks for the plaintext read from src
+
+        Args:
+            src: Readable binary file-like object
+            chunk_size: Number of bytes to read per chunk
+
+        Yields:
+            Ciphertext as bytes
+        """
+        codec, head = self.compression, b''
+        if codec == COMPRESS_AUTO:
+            head = _read_exact(src, SAMPLE_SIZE)
+            codec = choose_codec(head)
+        self.compression_stats = CompressionStats(codec)
+        src = CompressingReader(src, codec, self.compression_stats, head)
+
+        if self.mode == MODE_CBC and self.kdf == KDF_SHA256 and codec == CODEC_NONE:
+            return self._iter_encrypt_cbc(src, self.key, b'', chunk_size)
+
+        if self.kdf == KDF_SHA256:
+            salt, key = b'', self.key
+        else:
+            salt, key = key_cache.get_for_encryption(
+                self._password, (self.kdf,) + self.kdf_params,
+                _derive_key, SALT_SIZE)
+
+        segment_size = SEGMENT_SIZE if self.mode == MODE_GCM else 0
+        mode_id = _MODE_IDS[self.mode] | CODEC_IDS[codec] << 4
+        header = (_HEADER.pack(HEADER_MAGIC, mode_id,
+                               _KDF_IDS[self.kdf], segment_size)
+                  + _KDF_PARAMS[self.kdf].pack(*self.kdf_params)
+                  + salt)
+
+        if self.mode == MODE_GCM:
+            return self._iter_encrypt_gcm(src, key, header, segment_size)
+        return self._iter_encrypt_cbc(src, key, header, chunk_size)
+
+    def _iter_decrypt(self, src, chunk_size=CHUNK_SIZE):
+        """
+        Generate plaintext blocks for the ciphertext read from src
+
+        Args:
+            src: Readable binary file-like object
+            chunk_size: Number of bytes to read per chunk
+
+        Yields:
+            Plaintext as bytes
+        """
+        head = _read_exact(src, len(HEADER_MAGIC))
+        if head != HEADER_MAGIC:
+            # No header, so these are the first bytes of a CBC IV
+            iv = head + _read_exact(src, 16 - len(head))
+            yield from self._iter_decrypt_cbc(src, self.key, iv, chunk_size)
+            return
+
+        header = head + _read_exact(src, _HEADER.size - len(head))
+        if len(header) < _HEADER.size:
+            raise ValueError("Decryption failed. Corrupted data.")
+        _, mode_id, kdf_id, segment_size = _HEADER.unpack(header)
+        mode = _lookup_id(_MODE_IDS, mode_id & 0x0F, "cipher mode")
+        codec = _lookup_id(CODEC_IDS, mode_id >> 4, "compression codec")
+        kdf = _lookup_id(_KDF_IDS, kdf_id, "key derivation function")
+
+        params_struct = _KDF_PARAMS[kdf]
+        salt_size = SALT_SIZE if kdf != KDF_SHA256 else 0
+        extra = _read_exact(src, params_struct.size + salt_size)
+        if len(extra) < params_struct.size + salt_size:
+            raise ValueError("Decryption failed. Corrupted data.")
+        header += extra
+
+        if kdf == KDF_SHA256:
+            key = self.key
+        else:
+            kdf_params = params_struct.unpack(extra[:params_struct.size])
+            _check_kdf_params(kdf, kdf_params)
+            salt = extra[params_struct.size:]
+            key = key_cache.get(self._password, salt, (kdf,) + kdf_params,
+                                _derive_key)
+
+        if mode == MODE_GCM:
+            blocks = self._iter_decrypt_gcm(src, key, header, segment_size)
+        else:
+            iv = _read_exact(src, 16)
+            blocks = self._iter_decrypt_cbc(src, key, iv, chunk_size)
+
+        if codec != CODEC_NONE:
+            blocks = iter_decompress(blocks, codec, chunk_size)
+        yield from blocks
+
+    def _iter_encrypt_cbc(self, src, key, header, chunk_size):
+        """
+        Generate header + IV + AES-CBC ciphertext blocks for the plaintext
+        """
+        # Generate random IV (Initialization Vector)
+        iv = get_random_bytes(16)
+        cipher = AES.new(key, AES.MODE_CBC, iv)
+        yield header + iv
+
+        # Only whole blocks are encrypted as they come in; the remainder
+        # stays in buf until the final block is padded.
+        buf = bytearray()
+        while True:
+            chunk = src.read(chunk_size)
+            if not chunk:
+                break
+            buf += chunk
+            n = len(buf) - len(buf) % AES.block_size
+            if n:
+                yield cipher.encrypt(memoryview(buf)[:n])
+                del buf[:n]
+
+        yield cipher.encrypt(pad(bytes(buf), AES.block_size))
+
+    def _iter_decrypt_cbc(self, src, key, iv, chunk_size):
+        """
+        Generate plaintext blocks for the AES-CBC ciphertext in src
+        """
+        if len(iv) < 16:
+            raise ValueError("Decryption failed. Corrupted data.")
+        cipher = AES.new(key, AES.MODE_CBC, iv)
+
+        # The last block carries the padding, so always hold one whole
+        # block back until src is exhausted.
+        buf = bytearray()
+        while True:
+            chunk = src.read(chunk_size)
+            if not chunk:
+                break
+            buf += chunk
+            n = len(buf) - (len(buf) % AES.block_size or AES.block_size)
+            if n > 0:
+                yield cipher.decrypt(memoryview(buf)[:n])
+                del buf[:n]
+
+        if len(buf) != AES.block_size:
+            raise ValueError("Decryption failed. Corrupted data.")
+
+        try:
+            yield unpad(cipher.decrypt(bytes(buf)), AES.block_size)
+        except ValueError as e:
+            raise ValueError("Decryption failed. Wrong key or corrupted data.") from e
+
+    def _iter_encrypt_gcm(self, src, key, header, segment_size):
+        """
+        Generate header + AES-GCM segments for the plaintext in src
+
+        Every segment is sealed with its own nonce (random prefix, segment
+        index and a last-segment flag) and the full header as associated
+        data, so segments can be processed in any order, while reordering,
+        truncation or header tampering still fails authentication.
+        """
+        header += get_random_bytes(_GCM_NONCE_PREFIX_SIZE)
+        yield header
+
+        segments = _iter_segments(src, segment_size)
+        yield from self._map_segments(self._seal_segment, segments, key, header)
+
+    def _iter_decrypt_gcm(self, src, key, header, segment_size):
+        """
+        Generate plaintext blocks for the AES-GCM segments in src
+        """
+        nonce_prefix = _read_exact(src, _GCM_NONCE_PREFIX_SIZE)
+        if len(nonce_prefix) < _GCM_NONCE_PREFIX_SIZE or segment_size == 0:
+            raise ValueError("Decryption failed. Corrupted data.")
+        header += nonce_prefix
+
+        segments = _iter_segments(src, segment_size + _GCM_TAG_SIZE)
+        yield from self._map_segments(self._open_segment, segments, key, header)
+
+    def _map_segments(self, func, segments, key, header):
+        """
+        Run func over segments in a thread pool, yielding results in order
+
+        AES-GCM in pycryptodome releases the GIL, so threads scale across
+        cores. At most two segments per worker are in flight at a time.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = deque()
+            for index, last, data in segments:
+                pending.append(pool.submit(func, key, header, index, last, data))
+                if len(pending) >= 2 * self.workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    @staticmethod
+    def _gcm_cipher(key, header, index, last):
+        """Create the AES-GCM cipher for one segment"""
+        nonce = header[-_GCM_NONCE_PREFIX_SIZE:] + struct.pack('>I?', index, last)
+        cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+        cipher.update(header)
+        return cipher
+
+    def _seal_segment(self, key, header, index, last, data):
+        """Encrypt one segment, returning ciphertext + tag"""
+        cipher = self._gcm_cipher(key, header, index, last)
+        ciphertext, tag = cipher.encrypt_and_digest(data)
+        return ciphertext + tag
+
+    def _open_segment(self, key, header, index, last, data):
+        """Decrypt and verify one segment"""
+        if len(data) < _GCM_TAG_SIZE:
+            raise ValueError("Decryption failed. Corrupted data.")
+        cipher = self._gcm_cipher(key, header, index, last)
+        view = memoryview(data)
+        try:
+            return cipher.decrypt_and_verify(view[:-_GCM_TAG_SIZE],
+                                             view[-_GCM_TAG_SIZE:])
+        except ValueError as e:
+            raise ValueError("Decryption failed. Wrong key or corrupted data.") from e
 
-    def encrypt_image(self, image_path, output_path=None):
+    def encrypt_image(self, image_path, output_path=None, density=DENSITY_BINARY):
         """
         Encrypt an image file
 
+        The encrypted data has to fit into a single frame; use
+        encrypt_image_frames for larger files.
+
         Args:
             image_path: Path to input image
             output_path: Path for encrypted output (optional)
+            density: DENSITY_BINARY (1 bit per pixel) or bits per RGB
+                channel from DENSITY_LEVELS. Receivers detect it.
 
         Returns:
             Path to encrypted image file
         """
+        capacity = _frame_capacity(density)
+
         # Generate output path if not provided
         if output_path is None:
             base, ext = os.path.splitext(image_path)
             output_path = f"{base}_encrypted.png" # force png
 
-        # Read image file
+        # Reserve room for the length prefix, then encrypt straight after it
+        buf = io.BytesIO()
+        buf.write(bytes(4))
         with open(image_path, 'rb') as f:
-            image_data = f.read()
+            data_len = self.encrypt_stream(f, buf)
 
-        # Generate random IV (Initialization Vector)
-        iv = get_random_bytes(16)
+        if data_len + 4 > capacity:
+            raise ValueError(
+                f"Encrypted data ({data_len} bytes) does not fit in one "
+                f"{FRAME_WIDTH}x{FRAME_HEIGHT} frame; use encrypt_image_frames")
 
-        # Create cipher
-        cipher = AES.new(self.key, AES.MODE_CBC, iv)
+        # Fill in the length of the data
+        view = buf.getbuffer()
+        view[:4] = data_len.to_bytes(4, 'big')
 
-        # Pad and encrypt data
-        padded_data = pad(image_data, AES.block_size)
-        encrypted_data = cipher.encrypt(padded_data)
+        # Convert data to an image
+        encrypted_image = self._data_to_image(view, density)
+        view.release()
+        encrypted_image.save(output_path)
 
-        # Combine IV and encrypted data
-        final_data = iv + encrypted_data
+        return output_path
 
-        # Prepend the length of the data
-        final_data = len(final_data).to_bytes(4, 'big') + final_data
+    def encrypt_image_frames(self, image_path, density=DENSITY_BINARY):
+        """
+        Encrypt a file of any size into a sequence of image frames
 
-        # Convert data to a binary image
-        encrypted_image = self._data_to_image_binary(final_data)
-        encrypted_image.save(output_path)
+        Each frame starts with a small header (transfer ID, frame index,
+        frame count, payload length), so frames can be received in any
+        order. The ciphertext is spooled to a temporary file, and frames
+        are only rendered as the caller asks for them.
 
-        return output_path
+        Args:
+            image_path: Path to input file
+            density: DENSITY_BINARY or bits per RGB channel (see encrypt_image)
+
+        Yields:
+            PIL Image objects, one per frame
+        """
+        payload_size = _frame_capacity(density) - _FRAME_HEADER.size
+
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+            with open(image_path, 'rb') as f:
+                total = self.encrypt_stream(f, spool)
+            spool.seek(0)
+
+            count = max(1, -(-total // payload_size))
+            if count > 0xFFFF:
+                raise ValueError(f"Encrypted data ({total} bytes) needs more than 65535 frames")
+            transfer_id = int.from_bytes(get_random_bytes(4), 'big')
+
+            for index in range(count):
+                payload = spool.read(payload_size)
+                header = _FRAME_HEADER.pack(FRAME_MAGIC, transfer_id, index,
+                                            count, len(payload))
+                yield self._data_to_image(header + payload, density)
 
     def decrypt_image(self, encrypted_path, output_path=None):
         """
@@ -86,36 +516,79 @@ class CryptoHandler:
         # Read encrypted image
         encrypted_image = Image.open(encrypted_path)
         
-        # Convert binary image to data
-        encrypted_bytes = self._image_to_data_binary(encrypted_image)
+        # Convert image to data
+        _, encrypted_bytes = self._image_to_data(encrypted_image)
 
-        # Extract the length of the data
-        try:
-            data_len = int.from_bytes(encrypted_bytes[:4], 'big')
-            
-            # Extract the actual data
-            final_data = encrypted_bytes[4:4+data_len]
+        # A single page of a paged transfer
+        if encrypted_bytes[:len(FRAME_MAGIC)] == FRAME_MAGIC:
+            return self.decrypt_image_frames([encrypted_image], output_path)
 
-            # Extract IV (first 16 bytes)
-            iv = final_data[:16]
-            encrypted_data = final_data[16:]
-        except (IndexError, ValueError) as e:
-            raise ValueError("Decryption failed. Corrupted data.") from e
+        return self.decrypt_data(encrypted_bytes, output_path)
 
+    def decrypt_image_frames(self, frames, output_path=None):
+        """
+        Reassemble and decrypt frames made by encrypt_image_frames
 
-        # Create cipher
-        cipher = AES.new(self.key, AES.MODE_CBC, iv)
+        Frames may come in any order and duplicates are ignored. Payloads
+        are written into a spooled temporary file at their offsets, so
+        memory use does not grow with the number of frames.
 
-        # Decrypt and unpad
-        try:
-            decrypted_padded = cipher.decrypt(encrypted_data)
-            decrypted_data = unpad(decrypted_padded, AES.block_size)
-        except ValueError as e:
-            raise ValueError("Decryption failed. Wrong key or corrupted data.") from e
+        Args:
+            frames: Iterable of PIL Images or paths to frame images
+            output_path: Path for decrypted output (optional)
 
-        # Write decrypted image
-        with open(output_path, 'wb') as f:
-            f.write(decrypted_data)
+        Returns:
+            Path to decrypted file
+        """
+        transfer_id = count = payload_size = None
+        received = set()
+
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+            for frame in frames:
+                if not isinstance(frame, Image.Image):
+                    frame = Image.open(frame)
+                density, data = self._image_to_data(frame)
+                if len(data) < _FRAME_HEADER.size:
+                    raise ValueError("Decryption failed. Not a valid frame.")
+
+                magic, frame_transfer_id, index, frame_count, length = \
+                    _FRAME_HEADER.unpack_from(data)
+                frame_payload_size = len(data) - _FRAME_HEADER.size
+                if (magic != FRAME_MAGIC or index >= frame_count
+                        or length > frame_payload_size):
+                    raise ValueError("Decryption failed. Not a valid frame.")
+
+                if transfer_id is None:
+                    transfer_id, count = frame_transfer_id, frame_count
+                    payload_size = frame_payload_size
+                elif ((frame_transfer_id, frame_count, frame_payload_size)
+                      != (transfer_id, count, payload_size)):
+                    raise ValueError("Decryption failed. Frames belong to different transfers.")
+
+                if index in received:
+                    continue
+                received.add(index)
+
+                spool.seek(index * payload_size)
+                spool.write(data[_FRAME_HEADER.size:_FRAME_HEADER.size + length])
+
+            if count is None:
+                raise ValueError("Decryption failed. No frames received.")
+            missing = sorted(set(range(count)) - received)
+            if missing:
+                raise ValueError(f"Decryption failed. Missing frames: {missing}")
+
+            # Generate output path if not provided
+            if output_path is None:
+                output_path = 'decrypted_output.png'
+
+            spool.seek(0)
+            try:
+                with open(output_path, 'wb') as f:
+                    self.decrypt_stream(spool, f)
+            except ValueError:
+                os.remove(output_path)
+                raise
 
         return output_path
 
@@ -130,37 +603,23 @@ class CryptoHandler:
         Returns:
             Path to decrypted image file
         """
-        # Extract the length of the data
-        try:
-            data_len = int.from_bytes(encrypted_data[:4], 'big')
-            
-            # Extract the actual data
-            final_data = encrypted_data[4:4+data_len]
-
-            # Extract IV (first 16 bytes)
-            iv = final_data[:16]
-            encrypted_data_payload = final_data[16:]
-        except (IndexError, ValueError) as e:
-            raise ValueError("Decryption failed. Corrupted data.") from e
-
-
-        # Create cipher
-        cipher = AES.new(self.key, AES.MODE_CBC, iv)
-
-        # Decrypt and unpad
-        try:
-            decrypted_padded = cipher.decrypt(encrypted_data_payload)
-            decrypted_data = unpad(decrypted_padded, AES.block_size)
-        except ValueError as e:
-            raise ValueError("Decryption failed. Wrong key or corrupted data.") from e
+        # Extract the length of the data without copying the payload
+        view = memoryview(encrypted_data)
+        data_len = int.from_bytes(view[:4], 'big')
+        if len(view) < 4 or data_len > len(view) - 4:
+            raise ValueError("Decryption failed. Corrupted data.")
 
         # Generate output path if not provided
         if output_path is None:
             output_path = 'decrypted_output.png'
 
-        # Write decrypted image
-        with open(output_path, 'wb') as f:
-            f.write(decrypted_data)
+        # Decrypt the IV + ciphertext straight into the output file
+        try:
+            with open(output_path, 'wb') as f:
+                self.decrypt_stream(_BufferReader(view[4:4+data_len]), f)
+        except ValueError:
+            os.remove(output_path)
+            raise
 
         return output_path
 
@@ -168,32 +627,24 @@ class CryptoHandler:
         """
         Convert bytes to a binary PIL Image
 
+        Each bit becomes one pixel (row-major, MSB first), which is the
+        same layout PIL uses for raw mode '1' data, so the bytes can be
+        handed to Image.frombytes without unpacking them.
+
         Args:
             data: Bytes to convert
 
         Returns:
             PIL Image object
         """
-        # Convert data to a string of bits
-        bits = ''.join(format(byte, '08b') for byte in data)
-
-        width, height = 320, 256
-        total_pixels = width * height
-
-        # Create a new image
-        image = Image.new('1', (width, height))
-        pixels = image.load()
-
-        # Set pixels based on bits
-        for i in range(total_pixels):
-            if i < len(bits):
-                if bits[i] == '1':
-                    pixels[i % width, i // width] = 255
-                else:
-                    pixels[i % width, i // width] = 0
-            else:
-                pixels[i % width, i // width] = 0
-        
+        if len(data) > FRAME_BYTES:
+            raise ValueError(f"{len(data)} bytes do not fit in one frame ({FRAME_BYTES} bytes)")
+
+        # Pad data to exactly one frame of packed bits
+        packed = bytes(data).ljust(FRAME_BYTES, b'\x00')
+
+        image = Image.frombytes('1', (FRAME_WIDTH, FRAME_HEIGHT), packed)
+
         return image.convert('RGB')
 
 
@@ -209,63 +660,92 @@ class CryptoHandler:
         """
         # Convert image to black and white
         image = image.convert('1', dither=Image.NONE)
-        pixels = image.load()
+
+        # One bool per pixel in row-major order, packed 8 pixels per byte.
+        # Trailing pixels that do not fill a whole byte are dropped.
+        bits = np.asarray(image, dtype=bool).ravel()
+        bits = bits[:len(bits) - len(bits) % 8]
+
+        return np.packbits(bits).tobytes()
+
+    def _data_to_image(self, data, density=DENSITY_BINARY):
+        """
+        Convert bytes to a frame image at the given density
+
+        Args:
+            data: Bytes to convert (at most _frame_capacity(density))
+            density: DENSITY_BINARY or bits per RGB channel
+
+        Returns:
+            PIL Image object
+        """
+        if density == DENSITY_BINARY:
+            return self._data_to_image_binary(data)
+        if density not in DENSITY_LEVELS:
+            raise ValueError(f"Unsupported density: {density}")
+
+        # Binary header row, then the payload rows
+        header = (DENSITY_MAGIC + bytes([density])).ljust(FRAME_WIDTH // 8, b'\x00')
+        image = Image.new('RGB', (FRAME_WIDTH, FRAME_HEIGHT))
+        image.paste(Image.frombytes('1', (FRAME_WIDTH, 1), header).convert('RGB'), (0, 0))
+        image.paste(self._bytes_to_image(data, density, FRAME_HEIGHT - 1), (0, 1))
+
+        return image
+
+    def _image_to_data(self, image):
+        """
+        Convert a frame image back to bytes, detecting its density
+
+        Args:
+            image: PIL Image object
+
+        Returns:
+            Tuple of (density, bytes)
+        """
+        image = image.convert('RGB')
         width, height = image.size
 
-        bits = ""
-        for y in range(height):
-            for x in range(width):
-                if pixels[x, y] > 0:
-                    bits += '1'
-                else:
-                    bits += '0'
-
-        # Convert bits to bytes
-        data = bytearray()
-        for i in range(0, len(bits), 8):
-            byte = bits[i:i+8]
-            if len(byte) == 8:
-                try:
-                    data.append(int(byte, 2))
-                except ValueError:
-                    # This can happen if the bits string is not a valid binary representation
-                    # For simplicity, we'll just append a 0 byte
-                    data.append(0)
-
-        return bytes(data)
-
-    def _bytes_to_image(self, data):
+        if (width, height) == (FRAME_WIDTH, FRAME_HEIGHT):
+            header = self._image_to_data_binary(image.crop((0, 0, width, 1)))
+            density = header[len(DENSITY_MAGIC)]
+            if header[:len(DENSITY_MAGIC)] == DENSITY_MAGIC and density in DENSITY_LEVELS:
+                payload = image.crop((0, 1, width, height))
+                return density, self._image_to_bytes(payload, density)
+
+        return DENSITY_BINARY, self._image_to_data_binary(image)
+
+    def _bytes_to_image(self, data, bits=8, height=FRAME_HEIGHT):
         """
         Convert bytes to PIL Image
 
         This creates a visual representation of encrypted data
-        that can be transmitted via SSTV.
+        that can be transmitted via SSTV. Every RGB channel holds
+        `bits` bits, spread evenly over 0..255 so that lower densities
+        survive more noise.
 
         Args:
             data: Bytes to convert
+            bits: Bits per channel, one of DENSITY_LEVELS
+            height: Image height in rows (width is FRAME_WIDTH)
 
         Returns:
             PIL Image object
         """
-        # Calculate image dimensions
-        # Standard SSTV resolution
-        width, height = 320, 256
-        total_pixels = width * height
+        width = FRAME_WIDTH
+        capacity = width * height * 3 * bits // 8
 
-        # We need 3 bytes per pixel (RGB)
-        required_bytes = total_pixels * 3
+        if len(data) > capacity:
+            raise ValueError(f"{len(data)} bytes do not fit in one frame ({capacity} bytes)")
 
-        # Pad or truncate data to fit
-        if len(data) < required_bytes:
-            # Pad with zeros
-            data = data + bytes(required_bytes - len(data))
-        else:
-            # Truncate
-            data = data[:required_bytes]
+        # Pad data with zeros to fill the image
+        arr = np.frombuffer(bytes(data).ljust(capacity, b'\x00'), dtype=np.uint8)
+
+        if bits != 8:
+            # Regroup the bit stream into `bits`-wide channel values
+            weights = 1 << np.arange(bits - 1, -1, -1, dtype=np.uint8)
+            values = np.unpackbits(arr).reshape(-1, bits) @ weights
+            arr = (values.astype(np.uint16) * 255 // ((1 << bits) - 1)).astype(np.uint8)
 
-        # Convert to numpy array and reshape
-        import numpy as np
-        arr = np.frombuffer(data, dtype=np.uint8)
         arr = arr.reshape((height, width, 3))
 
         # Create image
@@ -273,25 +753,27 @@ class CryptoHandler:
 
         return image
 
-    def _image_to_bytes(self, image):
+    def _image_to_bytes(self, image, bits=8):
         """
         Convert PIL Image back to bytes
 
         Args:
             image: PIL Image object
+            bits: Bits per channel used by _bytes_to_image
 
         Returns:
             Bytes representation
         """
-        import numpy as np
-
         # Convert image to array
-        arr = np.array(image)
+        arr = np.asarray(image.convert('RGB')).ravel()
 
-        # Flatten and convert to bytes
-        data = arr.flatten().tobytes()
+        if bits != 8:
+            # Snap each channel to the nearest level, then keep its low bits
+            levels = (1 << bits) - 1
+            values = np.rint(arr * (levels / 255)).astype(np.uint8)
+            arr = np.packbits(np.unpackbits(values[:, None], axis=1)[:, 8 - bits:])
 
-        return data
+        return arr.tobytes()
 
     @staticmethod
     def generate_random_key(length=32):
@@ -305,4 +787,141 @@ class CryptoHandler:
             Random key as hex string
         """
         key = get_random_bytes(length)
-        return key.hex()
\ No newline at end of file
+        return key.hex()
+
+
+def _read_exact(src, size):
+    """
+    Read up to size bytes from src, retrying on short reads
+
+    Args:
+        src: Readable binary file-like object
+        size: Number of bytes wanted
+
+    Returns:
+        Bytes read; shorter than size only at end of stream
+    """
+    data = bytearray()
+    while len(data) < size:
+        chunk = src.read(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return bytes(data)
+
+
+def _frame_capacity(density):
+    """Number of bytes one frame holds at the given density"""
+    if density == DENSITY_BINARY:
+        return FRAME_BYTES
+    if density not in DENSITY_LEVELS:
+        raise ValueError(f"Unsupported density: {density}")
+    return (FRAME_HEIGHT - 1) * FRAME_WIDTH * 3 * density // 8
+
+
+def _derive_key(password, salt, params):
+    """
+    Derive a 256-bit key with a salted KDF
+
+    Args:
+        password: Password string
+        salt: Salt bytes
+        params: Tuple of (KDF name, *KDF parameters)
+
+    Returns:
+        32-byte key
+    """
+    kdf, values = params[0], params[1:]
+    password = password.encode('utf-8')
+
+    if kdf == KDF_SCRYPT:
+        log_n, r, p = values
+        # scrypt needs 128 * r * N bytes per lane
+        maxmem = 128 * r * (1 << log_n) * p + (1 << 20)
+        return hashlib.scrypt(password, salt=salt, n=1 << log_n, r=r, p=p,
+                              maxmem=maxmem, dklen=32)
+    if kdf == KDF_PBKDF2:
+        iterations, = values
+        return hashlib.pbkdf2_hmac('sha256', password, salt, iterations, 32)
+
+    raise ValueError(f"Unknown key derivation function: {kdf}")
+
+
+def _check_kdf_params(kdf, params):
+    """Raise ValueError if params are malformed or exceed _KDF_LIMITS"""
+    limits = _KDF_LIMITS.get(kdf, ())
+    if len(params) != len(limits):
+        raise ValueError(f"Expected {len(limits)} parameters for {kdf}")
+    for value, limit in zip(params, limits):
+        if not 1 <= value <= limit:
+            raise ValueError(f"Unsupported {kdf} parameters: {tuple(params)}")
+
+
+def _lookup_id(ids, value, what):
+    """Map a header id byte back to its name"""
+    for name, id_ in ids.items():
+        if id_ == value:
+            return name
+    raise ValueError(f"Decryption failed. Unknown {what} {value}.")
+
+
+def _iter_segments(src, size):
+    """
+    Split src into segments of size bytes, flagging the last one
+
+    Reads one segment ahead so the last segment is known before it is
+    handed out. Empty input still produces one (empty) last segment.
+
+    Args:
+        src: Readable binary file-like object
+        size: Segment size in bytes
+
+    Yields:
+        (index, last, data) tuples
+    """
+    index = 0
+    data = _read_exact(src, size)
+    while True:
+        following = _read_exact(src, size) if len(data) == size else b''
+        last = not following
+        yield index, last, data
+        if last:
+            return
+        data = following
+        index += 1
+
+
+class _IterReader:
+    """Read-only file object over an iterator of byte blocks"""
+
+    def __init__(self, blocks):
+        self._blocks = iter(blocks)
+        self._buf = bytearray()
+
+    def read(self, size=-1):
+        while size is None or size < 0 or len(self._buf) < size:
+            block = next(self._blocks, None)
+            if block is None:
+                break
+            self._buf += block
+
+        if size is None or size < 0:
+            size = len(self._buf)
+        data = bytes(self._buf[:size])
+        del self._buf[:size]
+        return data
+
+
+class _BufferReader:
+    """Minimal read-only file object over a memoryview, without copying"""
+
+    def __init__(self, view):
+        self._view = view
+        self._pos = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self._view) - self._pos
+        chunk = self._view[self._pos:self._pos + size]
+        self._pos += len(chunk)
+        return chunk
@@ -1,13 +1,470 @@
 import amodem.main
-import amodem.config
+import dataclasses
 import io
+import os
+import queue
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from audio_normalize import NormalizingReader, needs_normalization, WAVE_FORMAT_PCM
+from data_encoder import STRIPE_SIZE, MAX_LANES
+from modem_profiles import DEFAULT_PROFILE, get_config, decode_metadata
+
+# WAVE format tag whose real tag sits in the sub-format GUID
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Non-audio chunks up to this size are kept by read_wav_header
+MAX_KEPT_CHUNK = 64 * 1024
+
+
+@dataclass
+class WavInfo:
+    """Format and data chunk location of a WAV file"""
+    format_tag: int
+    nchannels: int
+    framerate: int
+    sampwidth: int
+    data_offset: int
+    data_size: int
+    chunks: dict = field(default_factory=dict)
+
+    @property
+    def nframes(self):
+        return self.data_size // (self.nchannels * self.sampwidth)
+
+
+@dataclass
+class DecodeResult:
+    """Outcome of one decode run"""
+    success: bool
+    bytes_in: int = 0
+    bytes_out: int = 0
+    audio_seconds: float = 0.0
+    elapsed: float = 0.0
+    profile: str = DEFAULT_PROFILE
+    lanes: int = 1
+    offset: float = 0.0  # seconds into the recording where decoding started
+
+    @property
+    def realtime_factor(self):
+        """Audio seconds demodulated per wall-clock second"""
+        return self.audio_seconds / self.elapsed if self.elapsed else 0.0
+
 
 class DataDecoder:
+    def __init__(self, profile=None):
+        """
+        Args:
+            profile: Modem profile name, or None to follow the profile
+                recorded in each WAV file (falling back to the default
+                for recordings and raw samples)
+        """
+        self.profile = profile
+        self.config = get_config(profile or DEFAULT_PROFILE)
+
     def decode(self, audio_path):
-        config = amodem.config.Configuration()
-        
+        """
+        Demodulate a WAV file into memory
+
+        Args:
+            audio_path: Path to the WAV file
+
+        Returns:
+            Decoded bytes
+        """
         dst = io.BytesIO()
-        with open(audio_path, 'rb') as src:
-            amodem.main.recv(config, src=src, dst=dst)
-            
-        return dst.getvalue()
\ No newline at end of file
+        self.decode_to(audio_path, dst)
+        return dst.getvalue()
+
+    def decode_to(self, audio_path, sink, offset=0.0, length=None):
+        """
+        Demodulate a WAV file, writing decoded bytes to sink as they arrive
+
+        The RIFF header is parsed and the data chunk is memory-mapped, so
+        only the window being demodulated is paged in and memory use does
+        not grow with the size of the recording. Recordings in another
+        format (sample rate, 8/24/32-bit or float samples, stereo) are
+        converted block by block on the way in; untagged multi-channel
+        files are mixed down. Files without a RIFF header are treated as
+        raw samples in the modem's format. Unless a profile was fixed, the
+        one recorded in the file's metadata chunk is used. Multi-lane
+        files are decoded lane by lane in parallel and merged.
+
+        Args:
+            audio_path: Path to the WAV (or raw PCM) file, or an
+                io.BytesIO holding it (e.g. an upload kept in memory)
+            sink: Writable binary file-like object
+            offset: Seconds into the recording to start at
+            length: Seconds of audio to decode (default: to the end)
+
+        Returns:
+            DecodeResult with byte counts and timings
+        """
+        info, profile, metadata = self.probe(audio_path)
+        config = get_config(profile)
+        lanes = metadata.get('lanes', 1)
+        window, samples = map_samples(audio_path, info, offset, length)
+        if lanes > 1:
+            stripe = metadata.get('stripe', STRIPE_SIZE)
+            result = self.decode_lanes(samples, window, sink, profile, stripe)
+        else:
+            src = _MemoryReader(samples)
+            if needs_normalization(window, config):
+                src = NormalizingReader(src, window, config)
+            result = self.decode_stream(src, sink, profile)
+        frame_size = info.nchannels * info.sampwidth
+        result.offset = (window.data_offset - info.data_offset) / (frame_size * info.framerate)
+        return result
+
+    def probe(self, audio_path):
+        """
+        Read a recording's format and metadata and pick its modem profile
+
+        Args:
+            audio_path: Path to the WAV (or raw PCM) file, or an io.BytesIO
+
+        Returns:
+            Tuple of (WavInfo, profile name, metadata dictionary)
+        """
+        profile = self.profile or DEFAULT_PROFILE
+        metadata = {}
+        with _open_audio(audio_path) as f:
+            info = read_wav_header(f)
+            if info is None:
+                size = f.seek(0, io.SEEK_END)
+                config = get_config(profile)
+                info = WavInfo(WAVE_FORMAT_PCM, 1, int(config.Fs), config.sample_size, 0, size)
+            else:
+                metadata = decode_metadata(info.chunks)
+                _check_metadata(metadata)
+
+        if self.profile is None:
+            profile = metadata.get('profile', DEFAULT_PROFILE)
+        elif metadata.get('profile', profile) != profile:
+            raise ValueError(f"WAV was sent with the '{metadata['profile']}' profile, "
+                             f"not '{profile}'")
+        lanes = metadata.get('lanes', 1)
+        if lanes > 1 and info.nchannels != lanes:
+            raise ValueError(f"WAV has {info.nchannels} channels, expected {lanes}")
+        return info, profile, metadata
+
+    def decode_lanes(self, samples, info, sink, profile, stripe=STRIPE_SIZE):
+        """
+        Demodulate each channel of a multi-lane WAV in its own process
+
+        Args:
+            samples: Sample bytes of the data chunk (e.g. from map_samples)
+            info: WavInfo describing samples
+            sink: Writable binary file-like object
+            profile: Modem profile of the samples
+            stripe: Stripe size the payload was split with
+
+        Returns:
+            DecodeResult with byte counts and timings
+        """
+        config = get_config(profile)
+        lanes = info.nchannels
+
+        start = time.perf_counter()
+        if needs_normalization(info, config, lanes):
+            reader = NormalizingReader(_MemoryReader(samples), info, config, lanes)
+            audio = np.frombuffer(reader.read(), dtype='<i2')
+        else:
+            audio = np.frombuffer(samples, dtype='<i2')
+        audio = audio[:len(audio) // lanes * lanes].reshape(-1, lanes)
+        channels = [audio[:, lane].tobytes() for lane in range(lanes)]
+        del audio
+
+        workers = min(lanes, os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_demodulate_lane, [profile] * lanes, channels))
+        bytes_in = sum(len(channel) for channel in channels)
+        del channels
+
+        dst = _CountingWriter(sink)
+        for part in merge_lanes([data for _, data in results], stripe):
+            dst.write(part)
+        elapsed = time.perf_counter() - start
+
+        frames = bytes_in // (lanes * config.sample_size)
+        return DecodeResult(
+            success=all(success for success, _ in results),
+            bytes_in=bytes_in,
+            bytes_out=dst.count,
+            audio_seconds=frames / config.Fs,
+            elapsed=elapsed,
+            profile=profile,
+            lanes=lanes,
+        )
+
+    def decode_stream(self, src, sink, profile=None, progress=None):
+        """
+        Demodulate raw samples read from src, writing bytes to sink
+
+        src may be a LiveStream fed from a microphone; bytes then reach
+        sink while the transmission is still coming in, and decoding
+        returns as soon as its end marker has been demodulated.
+
+        Args:
+            src: Readable binary file-like object with 16-bit mono PCM
+                samples at the modem's sample rate
+            sink: Writable binary file-like object
+            profile: Modem profile of the samples (defaults to the
+                decoder's own)
+            progress: Callable receiving the total bytes decoded so far
+                after every write
+
+        Returns:
+            DecodeResult with byte counts and timings
+        """
+        profile = profile or self.profile or DEFAULT_PROFILE
+        config = get_config(profile)
+        src = _CountingReader(src)
+        dst = _CountingWriter(sink, progress)
+
+        start = time.perf_counter()
+        success = amodem.main.recv(config, src=src, dst=dst)
+        elapsed = time.perf_counter() - start
+
+        samples = src.count // config.sample_size
+        return DecodeResult(
+            success=bool(success),
+            bytes_in=src.count,
+            bytes_out=dst.count,
+            audio_seconds=samples / config.Fs,
+            elapsed=elapsed,
+            profile=profile,
+        )
+
+
+def read_wav_header(f):
+    """
+    Parse the RIFF/WAVE chunks up to the start of the sample data
+
+    Leaves f positioned at the first sample. Small chunks other than
+    'fmt ' and 'data' are kept in WavInfo.chunks.
+
+    Args:
+        f: Readable, seekable binary file object at the start of the file
+
+    Returns:
+        WavInfo, or None (with f rewound) if f is not a RIFF/WAVE file
+    """
+    riff = f.read(12)
+    if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+        f.seek(0)
+        return None
+
+    fmt = None
+    chunks = {}
+    while True:
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8:
+            raise ValueError("Invalid WAV file: no data chunk")
+        chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+
+        if chunk_id == b'data':
+            if fmt is None:
+                raise ValueError("Invalid WAV file: data chunk before fmt chunk")
+            format_tag, nchannels, framerate, _, _, bits = fmt
+            data_offset = f.tell()
+
+            # Streamed files carry a placeholder size; use what is there
+            file_size = f.seek(0, io.SEEK_END)
+            f.seek(data_offset)
+            data_size = min(chunk_size, file_size - data_offset)
+
+            return WavInfo(format_tag, nchannels, framerate, (bits + 7) // 8,
+                           data_offset, data_size, chunks)
+
+        padded_size = chunk_size + (chunk_size & 1)  # chunks are word aligned
+        if chunk_id != b'fmt ' and chunk_size > MAX_KEPT_CHUNK:
+            f.seek(padded_size, io.SEEK_CUR)
+            continue
+
+        body = f.read(padded_size)
+        if chunk_id == b'fmt ':
+            if chunk_size < 16:
+                raise ValueError("Invalid WAV file: short fmt chunk")
+            fmt = struct.unpack('<HHIIHH', body[:16])
+            if fmt[0] == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26:
+                # The real format tag leads the sub-format GUID
+                fmt = (struct.unpack('<H', body[24:26])[0],) + fmt[1:]
+        else:
+            chunks[chunk_id.decode('latin-1')] = body[:chunk_size]
+
+
+def map_samples(audio_path, info, offset=0.0, length=None):
+    """
+    Memory-map a window of a WAV file's data chunk
+
+    Nothing is read until the returned array is used, and then only the
+    pages touched are loaded, so a short window of a multi-gigabyte
+    capture costs little memory.
+
+    Args:
+        audio_path: Path to the WAV (or raw PCM) file, or an io.BytesIO
+            (whose buffer is then used without copying)
+        info: WavInfo of the file
+        offset: Seconds into the data chunk where the window starts
+        length: Seconds in the window (default: to the end)
+
+    Returns:
+        Tuple of (WavInfo describing the window, read-only uint8 array of
+        its sample bytes)
+    """
+    frame_size = info.nchannels * info.sampwidth
+    first = min(max(0, round(offset * info.framerate)), info.nframes)
+    count = info.nframes - first
+    if length is not None:
+        count = min(count, max(0, round(length * info.framerate)))
+
+    window = dataclasses.replace(info, data_offset=info.data_offset + first * frame_size,
+                                 data_size=count * frame_size)
+    if not count:
+        return window, np.zeros(0, dtype=np.uint8)
+    if isinstance(audio_path, io.BytesIO):
+        samples = np.frombuffer(audio_path.getbuffer(), dtype=np.uint8,
+                                count=window.data_size, offset=window.data_offset)
+        samples.flags.writeable = False
+        return window, samples
+    return window, np.memmap(audio_path, dtype=np.uint8, mode='r',
+                             offset=window.data_offset, shape=(window.data_size,))
+
+
+def _check_metadata(metadata):
+    """Raise ValueError unless a WAV's metadata holds a usable profile and lane layout"""
+    if not isinstance(metadata.get('profile', DEFAULT_PROFILE), str):
+        raise ValueError(f"WAV metadata has an invalid profile: {metadata['profile']!r}")
+    lanes = metadata.get('lanes', 1)
+    if type(lanes) is not int or not 1 <= lanes <= MAX_LANES:
+        raise ValueError(f"WAV metadata has an invalid lane count: {lanes!r} "
+                         f"(expected 1 to {MAX_LANES})")
+    stripe = metadata.get('stripe', STRIPE_SIZE)
+    if type(stripe) is not int or stripe < 1:
+        raise ValueError(f"WAV metadata has an invalid stripe size: {stripe!r}")
+
+
+@contextmanager
+def _open_audio(audio_path):
+    """Open a recording by path, or rewind an in-memory one (left open)"""
+    if isinstance(audio_path, io.BytesIO):
+        audio_path.seek(0)
+        yield audio_path
+    else:
+        with open(audio_path, 'rb') as f:
+            yield f
+
+
+def merge_lanes(parts, stripe=STRIPE_SIZE):
+    """
+    Reassemble a payload dealt out by data_encoder.split_lanes
+
+    Args:
+        parts: List of per-lane bytes
+        stripe: Bytes per stripe
+
+    Yields:
+        Payload pieces in their original order
+    """
+    offsets = [0] * len(parts)
+    while True:
+        for lane, part in enumerate(parts):
+            piece = part[offsets[lane]:offsets[lane] + stripe]
+            if not piece:
+                return
+            offsets[lane] += len(piece)
+            yield piece
+
+
+def _demodulate_lane(profile, samples):
+    """Demodulate one lane, returning (success, bytes) (runs in a worker process)"""
+    dst = io.BytesIO()
+    success = amodem.main.recv(get_config(profile), src=io.BytesIO(samples), dst=dst)
+    return bool(success), dst.getvalue()
+
+
+class LiveStream:
+    """
+    Blocking file-like reader over audio blocks pushed from another thread
+
+    The recording thread calls feed() with every block it captures and
+    close() when it stops; the demodulator reads from it like a file, so
+    no recording has to be written to disk first.
+    """
+
+    def __init__(self):
+        self._blocks = queue.Queue()  # unbounded: the microphone must never block
+        self._buf = bytearray()
+        self._closed = False
+
+    def feed(self, data):
+        """Queue a block of samples"""
+        self._blocks.put(bytes(data))
+
+    def close(self):
+        """Mark the end of the stream; readers drain what is queued"""
+        self._blocks.put(None)
+
+    def read(self, size=-1):
+        """Read size bytes, blocking until they arrive or the stream ends"""
+        while not self._closed and (size is None or size < 0 or len(self._buf) < size):
+            block = self._blocks.get()
+            if block is None:
+                self._closed = True
+            else:
+                self._buf += block
+
+        if size is None or size < 0:
+            size = len(self._buf)
+        data = bytes(self._buf[:size])
+        del self._buf[:size]
+        return data
+
+
+class _MemoryReader:
+    """File-like reader over a buffer (e.g. a memory-mapped data chunk)"""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast('B')
+        self._pos = 0
+
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else self._pos + size
+        data = bytes(self._view[self._pos:end])
+        self._pos += len(data)
+        return data
+
+
+class _CountingReader:
+    def __init__(self, f):
+        self._f = f
+        self.count = 0
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        self.count += len(data)
+        return data
+
+
+class _CountingWriter:
+    def __init__(self, f, progress=None):
+        self._f = f
+        self._progress = progress
+        self.count = 0
+
+    def write(self, data):
+        self._f.write(data)
+        self.count += len(data)
+        if self._progress:
+            self._progress(self.count)
+
+    def flush(self):
+        flush = getattr(self._f, 'flush', None)
+        if flush:
+            flush()
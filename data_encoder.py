@@ -1,22 +1,336 @@
 import amodem.main
-import amodem.config
 import io
-import wave
+import os
+import queue
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from modem_profiles import DEFAULT_PROFILE, METADATA_CHUNK, get_config, encode_metadata
+
+# Samples per block handed out by encode_iter
+BLOCK_SAMPLES = 4096
+
+# Blocks buffered between the modulator thread and the consumer
+QUEUE_BLOCKS = 8
+
+# Multi-lane mode: payload bytes per round-robin stripe, and lane limit
+STRIPE_SIZE = 1024
+MAX_LANES = 8
+
 
 class DataEncoder:
-    def encode(self, data, output_path='output.wav'):
-        config = amodem.config.Configuration()
-        
-        # amodem writes raw samples, so we need to add a WAV header
-        raw_audio_io = io.BytesIO()
-        amodem.main.send(config, src=io.BytesIO(data), dst=raw_audio_io)
-        
-        raw_audio = raw_audio_io.getvalue()
-
-        with wave.open(output_path, 'wb') as wf:
-            wf.setnchannels(1) # mono
-            wf.setsampwidth(config.sample_size)
-            wf.setframerate(config.Fs)
-            wf.writeframes(raw_audio)
-            
+    def __init__(self, profile=DEFAULT_PROFILE, lanes=1):
+        """
+        Args:
+            profile: Modem profile name (see modem_profiles.PROFILES)
+            lanes: Number of audio channels to spread the payload over
+        """
+        if not 1 <= lanes <= MAX_LANES:
+            raise ValueError(f"Lane count must be between 1 and {MAX_LANES}")
+        self.profile = profile
+        self.config = get_config(profile)
+        self.lanes = lanes
+
+    @property
+    def bytes_per_second(self):
+        """Payload rate over all lanes, excluding modem framing overhead"""
+        return self.config.modem_bps * self.lanes / 8
+
+    @property
+    def metadata(self):
+        """Transfer metadata stored in the WAV so the decoder can follow"""
+        metadata = {'profile': self.profile}
+        if self.lanes > 1:
+            metadata.update(lanes=self.lanes, stripe=STRIPE_SIZE)
+        return metadata
+
+    def encode(self, data, output_path='output.wav', timer=None):
+        """
+        Modulate data into a WAV file, one block at a time
+
+        With one lane the file is mono and the payload is streamed. With
+        several lanes the payload is read into memory, split into
+        round-robin stripes, and each lane is modulated in its own process
+        and written to its own channel.
+
+        The modem profile (and lane layout) is recorded in a metadata
+        chunk ahead of the samples; DataDecoder picks it up automatically.
+
+        Args:
+            data: Bytes or a readable binary file-like object
+            output_path: Path or writable binary file-like object. Sinks
+                that cannot seek (pipes, sockets via makefile(), HTTP
+                responses) get a streaming header with unknown length.
+            timer: StageTimer charged with the 'modulate' and 'write'
+                stages (optional)
+
+        Returns:
+            output_path
+        """
+        blocks = self.iter_blocks(data, timer)
+        if isinstance(output_path, str):
+            with open(output_path, 'wb') as f:
+                _write_wav(_timed_writer(f, timer), blocks, self.config, self.metadata, self.lanes)
+        else:
+            _write_wav(_timed_writer(output_path, timer), blocks, self.config, self.metadata, self.lanes)
+
         return output_path
+
+    def transmit(self, data, play, tee_path=None, timer=None):
+        """
+        Modulate data and hand every block to play() as soon as it exists
+
+        The modulator runs ahead in a worker thread behind a bounded
+        queue (see encode_iter) while play(), typically an audio output
+        stream's write(), drains it, so sound starts after the first
+        block instead of after the whole payload has been modulated.
+
+        Args:
+            data: Bytes or a readable binary file-like object
+            play: Callable receiving each block of PCM samples
+            tee_path: Also write the audio to this WAV file (optional)
+            timer: StageTimer charged with the 'modulate', 'playback' and
+                'write' stages (optional)
+        """
+        blocks = self.iter_blocks(data, timer)
+        if timer is not None:
+            play = timer.wrap(play, 'playback')
+        if tee_path is None:
+            for block in blocks:
+                play(block)
+            return
+
+        def tee():
+            for block in blocks:
+                play(block)
+                yield block
+
+        with open(tee_path, 'wb') as f:
+            _write_wav(_timed_writer(f, timer), tee(), self.config, self.metadata, self.lanes)
+
+    def iter_blocks(self, data, timer=None):
+        """
+        Yield the PCM blocks of data for the configured lane count
+
+        With a StageTimer, time spent waiting for blocks is charged to
+        its 'modulate' stage.
+        """
+        blocks = self.encode_lanes(data) if self.lanes > 1 else self.encode_iter(data)
+        return blocks if timer is None else timer.iterate(blocks, 'modulate')
+
+    def encode_lanes(self, data, block_samples=BLOCK_SAMPLES):
+        """
+        Modulate data over self.lanes channels in parallel
+
+        Lanes that finish early are padded with silence.
+
+        Args:
+            data: Bytes or a readable binary file-like object
+            block_samples: Frames per block (the last block may be shorter)
+
+        Yields:
+            Interleaved little-endian 16-bit PCM blocks
+        """
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = data.read()
+
+        stripes = split_lanes(data, self.lanes)
+        workers = min(self.lanes, os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            signals = list(pool.map(_modulate_lane, [self.profile] * self.lanes, stripes))
+
+        frames = max(len(signal) for signal in signals) // self.config.sample_size
+        audio = np.zeros((frames, self.lanes), dtype='<i2')
+        for lane, signal in enumerate(signals):
+            samples = np.frombuffer(signal, dtype='<i2')
+            audio[:len(samples), lane] = samples
+        del signals
+
+        for start in range(0, frames, block_samples):
+            yield audio[start:start + block_samples].tobytes()
+
+    def encode_iter(self, data, block_samples=BLOCK_SAMPLES, as_array=False):
+        """
+        Modulate data, yielding the raw audio in fixed-size blocks
+
+        amodem runs in a worker thread that feeds a small bounded queue,
+        so at most QUEUE_BLOCKS blocks are held in memory however large
+        the payload is. Closing the generator early stops the worker.
+
+        Args:
+            data: Bytes or a readable binary file-like object
+            block_samples: Samples per block (the last block may be shorter)
+            as_array: Yield int16 NumPy arrays instead of bytes
+
+        Yields:
+            Little-endian 16-bit PCM blocks
+        """
+        src = io.BytesIO(data) if isinstance(data, (bytes, bytearray, memoryview)) else data
+        blocks = queue.Queue(maxsize=QUEUE_BLOCKS)
+        sink = _BlockWriter(blocks, block_samples * self.config.sample_size)
+
+        def modulate():
+            try:
+                amodem.main.send(self.config, src=src, dst=sink)
+                sink.close()
+            except _Cancelled:
+                pass
+            except BaseException as e:  # hand any failure to the consumer
+                try:
+                    sink.put(e)
+                except _Cancelled:
+                    pass
+
+        worker = threading.Thread(target=modulate, daemon=True)
+        worker.start()
+        try:
+            while True:
+                block = blocks.get()
+                if block is None:
+                    break
+                if isinstance(block, BaseException):
+                    raise block
+                yield np.frombuffer(block, dtype='<i2') if as_array else block
+        finally:
+            sink.cancel()
+            worker.join()
+
+
+def wav_header(config, nchannels=1, data_size=None, metadata=None):
+    """
+    Build a PCM WAV header, optionally with a metadata chunk
+
+    Args:
+        config: amodem Configuration (sample rate and width)
+        nchannels: Number of interleaved channels
+        data_size: Size of the sample data in bytes. None writes the
+            conventional 0xFFFFFFFF "unknown length" for streaming.
+        metadata: Dictionary stored as JSON in a METADATA_CHUNK chunk
+
+    Returns:
+        Header bytes, ending with the data chunk header
+    """
+    framerate = int(config.Fs)
+    block_align = nchannels * config.sample_size
+
+    extra = b''
+    if metadata:
+        body = encode_metadata(metadata)
+        extra = struct.pack('<4sI', METADATA_CHUNK.encode('ascii'), len(body)) + body
+        if len(body) & 1:
+            extra += b'\x00'  # chunks are word aligned
+
+    if data_size is None:
+        riff_size = data_size = 0xFFFFFFFF
+    else:
+        riff_size = 36 + len(extra) + data_size
+
+    return (struct.pack('<4sI4s4sIHHIIHH',
+                        b'RIFF', riff_size, b'WAVE',
+                        b'fmt ', 16, 1, nchannels, framerate,
+                        framerate * block_align, block_align,
+                        config.bits_per_sample)
+            + extra
+            + struct.pack('<4sI', b'data', data_size))
+
+
+def _write_wav(f, blocks, config, metadata, nchannels=1):
+    """
+    Write a WAV file from sample blocks, patching the sizes if f can seek
+    """
+    header = wav_header(config, nchannels, metadata=metadata)
+    start = f.tell() if _seekable(f) else None
+    f.write(header)
+
+    data_size = 0
+    for block in blocks:
+        f.write(block)
+        data_size += len(block)
+
+    if start is not None:
+        end = f.tell()
+        f.seek(start)
+        f.write(wav_header(config, nchannels, data_size, metadata))
+        f.seek(end)
+
+
+def split_lanes(data, lanes, stripe=STRIPE_SIZE):
+    """
+    Deal data out to lanes in round-robin stripes
+
+    Args:
+        data: Payload bytes
+        lanes: Number of lanes
+        stripe: Bytes per stripe
+
+    Returns:
+        List of per-lane bytes (lane i holds stripes i, i + lanes, ...)
+    """
+    view = memoryview(data)
+    parts = [bytearray() for _ in range(lanes)]
+    for index, start in enumerate(range(0, len(view), stripe)):
+        parts[index % lanes] += view[start:start + stripe]
+    return [bytes(part) for part in parts]
+
+
+def _modulate_lane(profile, data):
+    """Modulate one lane into raw PCM bytes (runs in a worker process)"""
+    dst = io.BytesIO()
+    amodem.main.send(get_config(profile), src=io.BytesIO(data), dst=dst)
+    return dst.getvalue()
+
+
+def _timed_writer(f, timer):
+    """Charge writes to f to the timer's 'write' stage, if there is a timer"""
+    return f if timer is None else timer.writer(f)
+
+
+def _seekable(fileobj):
+    try:
+        return fileobj.seekable()
+    except AttributeError:
+        return False
+
+
+class _Cancelled(Exception):
+    """Raised inside the modulator thread when the consumer went away"""
+
+
+class _BlockWriter:
+    """File-like sink that regroups amodem's small writes into blocks"""
+
+    def __init__(self, blocks, block_size):
+        self._blocks = blocks
+        self._block_size = block_size
+        self._buf = bytearray()
+        self._cancelled = threading.Event()
+
+    def write(self, data):
+        self._buf += data
+        while len(self._buf) >= self._block_size:
+            self.put(bytes(self._buf[:self._block_size]))
+            del self._buf[:self._block_size]
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._buf:
+            self.put(bytes(self._buf))
+            self._buf.clear()
+        self.put(None)
+
+    def put(self, item):
+        while True:
+            if self._cancelled.is_set():
+                raise _Cancelled()
+            try:
+                self._blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def cancel(self):
+        self._cancelled.set()
@@ -0,0 +1,169 @@
+"""
+Decode Cache Module
+Keeps demodulated payloads on disk, keyed by the SHA-256 of the audio
+
+Demodulation is by far the slowest part of a decode, and operators often
+upload the same recording again (another key, another output format).
+The cache stores what the demodulator produced, before FEC, chunk
+reassembly and decryption, so a repeat decode only redoes those cheap
+steps. Entries are plain files, so every process (web workers, batch
+runs) shares them; the least recently used are evicted once the cache
+grows past its size limit. The cache is best effort: a failing disk only
+costs a miss, never a decode.
+"""
+
+import dataclasses
+import hashlib
+import json
+import os
+
+from data_decoder import DecodeResult
+from transport import write_atomic
+
+DEFAULT_CACHE = 'decode_cache'
+
+# Bytes of payloads and metadata kept before the oldest entries go
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Bytes hashed per read of an audio file
+HASH_BLOCK = 1024 * 1024
+
+
+def audio_digest(audio):
+    """
+    SHA-256 of a recording's bytes, as hex
+
+    Args:
+        audio: Path to the file, or an io.BytesIO holding it
+
+    Returns:
+        64-character hex digest
+    """
+    digest = hashlib.sha256()
+    if hasattr(audio, 'getbuffer'):
+        digest.update(audio.getbuffer())
+        return digest.hexdigest()
+    with open(audio, 'rb') as f:
+        while block := f.read(HASH_BLOCK):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DecodeCache:
+    """Size-bounded LRU cache of demodulated payloads, one file pair per recording"""
+
+    def __init__(self, root=DEFAULT_CACHE, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            root: Directory holding the entries
+            max_bytes: Total size the entries may take up
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def get(self, digest):
+        """
+        Look up the payload demodulated from a recording
+
+        A hit counts as a use, so the entry moves to the back of the
+        eviction order.
+
+        Args:
+            digest: audio_digest() of the recording
+
+        Returns:
+            Tuple of (payload bytes, DecodeResult), or None on a miss
+        """
+        try:
+            with open(self._meta_path(digest), 'rb') as f:
+                meta = json.loads(f.read().decode('utf-8'))
+            with open(self._payload_path(digest), 'rb') as f:
+                payload = f.read()
+            os.utime(self._payload_path(digest))
+            result = DecodeResult(**meta['result'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None  # missing, evicted meanwhile, unreadable or damaged
+        if len(payload) != result.bytes_out:
+            return None
+        return payload, result
+
+    def put(self, digest, payload, result):
+        """
+        Store the payload demodulated from a recording, evicting old entries
+
+        Payloads larger than the whole cache are not stored, and neither
+        is anything when the cache directory cannot be written.
+
+        Args:
+            digest: audio_digest() of the recording
+            payload: Bytes-like output of the demodulator
+            result: DecodeResult of the run
+
+        Returns:
+            True if the entry was stored
+        """
+        meta = json.dumps({'result': dataclasses.asdict(result)}).encode('utf-8')
+        if len(payload) + len(meta) > self.max_bytes:
+            return False
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            # Metadata first: an entry only counts once its payload is in place
+            write_atomic(self._meta_path(digest), meta)
+            write_atomic(self._payload_path(digest), payload)
+            self._evict()
+        except OSError:
+            return False  # full disk, read-only directory, ...
+        return True
+
+    def usage(self):
+        """
+        Get the cache's size on disk
+
+        Returns:
+            Dictionary with the number of entries, their bytes and the limit
+        """
+        entries = self._entries()
+        return {
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
+
+    def _entries(self):
+        """(digest, bytes, last use) of every complete entry"""
+        entries = []
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return entries
+        for name in names:
+            digest, ext = os.path.splitext(name)
+            if ext != '.bin':
+                continue
+            try:
+                payload = os.stat(self._payload_path(digest))
+                meta = os.stat(self._meta_path(digest))
+            except OSError:
+                continue
+            entries.append((digest, payload.st_size + meta.st_size, payload.st_mtime))
+        return entries
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits"""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for digest, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            for path in (self._payload_path(digest), self._meta_path(digest)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass  # another process evicted it first
+            total -= size
+
+    def _payload_path(self, digest):
+        return os.path.join(self.root, f"{digest}.bin")
+
+    def _meta_path(self, digest):
+        return os.path.join(self.root, f"{digest}.json")
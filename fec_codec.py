@@ -0,0 +1,176 @@
+"""
+Forward Error Correction Module
+Reed-Solomon coding with a block interleaver between the cipher and the modem
+
+amodem checks every 250-byte frame with a CRC and stops at the first bad
+one, so on a noisy link the tail of the payload goes missing rather than
+arriving with flipped bits. Because the length is known from the header,
+the missing bytes are erasures at known positions, and Reed-Solomon can
+fill in up to `nsym` erasures per 255-byte codeword. The interleaver
+spreads a lost stretch over many codewords instead of wiping out a few.
+"""
+
+import struct
+import zlib
+
+import numpy as np
+
+try:
+    from reedsolo import RSCodec, ReedSolomonError
+except ImportError:  # optional dependency
+    RSCodec = None
+    ReedSolomonError = None
+
+FEC_MAGIC = b'SXR1'
+
+# Codeword length in bytes (GF(2^8))
+CODEWORD_SIZE = 255
+
+# Parity bytes per codeword: corrects nsym erasures or nsym // 2 errors
+DEFAULT_NSYM = 32
+FEC_LEVELS = (8, 16, 32, 64)
+
+# magic, nsym, interleave depth (codewords), payload length, payload CRC32
+_HEADER = '>4sBIQI'
+_HEADER_SIZE = struct.calcsize(_HEADER) + 4  # + header CRC32
+
+
+def is_fec(data):
+    """Return True if data starts with a valid FEC header"""
+    return _parse_header(data) is not None
+
+
+def fec_encode(data, nsym=DEFAULT_NSYM, depth=None):
+    """
+    Add Reed-Solomon parity and interleave the codewords
+
+    Args:
+        data: Payload bytes
+        nsym: Parity bytes per 255-byte codeword (1-254)
+        depth: Codewords interleaved together. None interleaves the whole
+            payload, which is what lets a lost tail be recovered.
+
+    Returns:
+        Header followed by the interleaved codewords
+    """
+    codec = _codec(nsym)
+    k = CODEWORD_SIZE - nsym
+    count = max(1, -(-len(data) // k))
+
+    message = np.zeros(count * k, dtype=np.uint8)
+    message[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+    codewords = np.zeros((count, CODEWORD_SIZE), dtype=np.uint8)
+    codewords[:, :k] = message.reshape(count, k)
+    for row in codewords:
+        row[k:] = np.frombuffer(codec.encode(row[:k].tobytes())[k:], dtype=np.uint8)
+
+    depth = count if depth is None else max(1, min(depth, count))
+    header = struct.pack(_HEADER, FEC_MAGIC, nsym, depth, len(data), zlib.crc32(data))
+    header += struct.pack('>I', zlib.crc32(header))
+    return header + _interleave(codewords, depth).tobytes()
+
+
+def fec_decode(data):
+    """
+    Correct and strip FEC framing; data without a FEC header is returned as is
+
+    Args:
+        data: Bytes received from the modem, possibly cut short
+
+    Returns:
+        Payload bytes
+
+    Raises:
+        ValueError: If too much was lost or corrupted to recover
+    """
+    header = _parse_header(data)
+    if header is None:
+        return bytes(data)
+    nsym, depth, length, crc = header
+
+    codec = _codec(nsym)
+    k = CODEWORD_SIZE - nsym
+    count = max(1, -(-length // k))
+    total = count * CODEWORD_SIZE
+
+    # Every codeword needs k of its bytes. Check that before allocating
+    # anything, since the length comes from a header only a CRC protects.
+    available = len(data) - _HEADER_SIZE
+    if available < count * k:
+        raise ValueError(f"Too much of the transmission was lost to recover "
+                         f"({available} bytes received, at least {count * k} needed "
+                         f"for a {length}-byte payload)")
+
+    # Bytes that never arrived are erasures at known positions
+    body = np.zeros(total, dtype=np.uint8)
+    received = np.zeros(total, dtype=bool)
+    payload = np.frombuffer(data, dtype=np.uint8, offset=_HEADER_SIZE)[:total]
+    body[:len(payload)] = payload
+    received[:len(payload)] = True
+
+    codewords = _deinterleave(body, count, depth)
+    present = _deinterleave(received, count, depth)
+
+    message = np.empty((count, k), dtype=np.uint8)
+    for i in range(count):
+        erasures = np.flatnonzero(~present[i])
+        if len(erasures) > nsym:
+            raise ValueError(f"Too much of the transmission was lost to recover "
+                             f"({len(erasures)} of {CODEWORD_SIZE} bytes missing "
+                             f"in a codeword, at most {nsym} can be restored)")
+        try:
+            decoded = codec.decode(codewords[i].tobytes(), erase_pos=erasures.tolist() or None)[0]
+        except ReedSolomonError as e:
+            raise ValueError(f"Uncorrectable errors in the transmission: {e}")
+        message[i] = np.frombuffer(decoded, dtype=np.uint8)
+
+    result = message.reshape(-1)[:length].tobytes()
+    if zlib.crc32(result) != crc:
+        raise ValueError("Error correction failed: payload checksum mismatch")
+    return result
+
+
+def fec_overhead(length, nsym=DEFAULT_NSYM):
+    """Size in bytes of fec_encode's output for a payload of `length` bytes"""
+    k = CODEWORD_SIZE - nsym
+    return _HEADER_SIZE + max(1, -(-length // k)) * CODEWORD_SIZE
+
+
+def _codec(nsym):
+    if RSCodec is None:
+        raise RuntimeError("Error correction needs the 'reedsolo' package: pip install reedsolo")
+    if not 1 <= nsym < CODEWORD_SIZE:
+        raise ValueError(f"FEC parity must be between 1 and {CODEWORD_SIZE - 1} bytes")
+    return RSCodec(nsym, nsize=CODEWORD_SIZE)
+
+
+def _parse_header(data):
+    """Return (nsym, depth, length, crc) or None if data has no FEC header"""
+    if len(data) < _HEADER_SIZE or bytes(data[:4]) != FEC_MAGIC:
+        return None
+    raw = bytes(data[:_HEADER_SIZE - 4])
+    (header_crc,) = struct.unpack('>I', bytes(data[_HEADER_SIZE - 4:_HEADER_SIZE]))
+    if zlib.crc32(raw) != header_crc:
+        return None
+    _, nsym, depth, length, crc = struct.unpack(_HEADER, raw)
+    if not 1 <= nsym < CODEWORD_SIZE or depth < 1:
+        return None
+    return nsym, depth, length, crc
+
+
+def _interleave(codewords, depth):
+    """Write each group of `depth` codewords column by column"""
+    groups = [codewords[i:i + depth].T.reshape(-1) for i in range(0, len(codewords), depth)]
+    return np.concatenate(groups)
+
+
+def _deinterleave(body, count, depth):
+    """Invert _interleave for `count` codewords"""
+    codewords = np.empty((count, CODEWORD_SIZE), dtype=body.dtype)
+    pos = 0
+    for i in range(0, count, depth):
+        rows = min(depth, count - i)
+        size = rows * CODEWORD_SIZE
+        codewords[i:i + rows] = body[pos:pos + size].reshape(CODEWORD_SIZE, rows).T
+        pos += size
+    return codewords
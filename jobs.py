@@ -0,0 +1,296 @@
+"""
+Job Queue Module
+Runs encode and decode work in a bounded process pool, off the request thread
+
+A JobQueue hands each job to a worker process and tracks it through
+queued -> running -> done (or failed). Workers send state and progress
+events back over a multiprocessing queue; a listener thread applies them
+and wakes anyone waiting for a job to change (status polls, SSE streams).
+Admission control caps queued plus running jobs, so a burst of uploads
+is turned away instead of piling up behind the pool. Work run outside the
+pool (in the request thread) takes a slot from the same count. A worker
+that dies (e.g. killed for memory) fails the jobs in flight and the pool
+is replaced.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Jobs admitted per worker (running plus waiting)
+JOBS_PER_WORKER = 2
+
+# Seconds a finished job stays available for status queries
+KEEP_SECONDS = 3600
+
+# Progress events of the current job, in a worker process
+_events = None
+_job_id = None
+
+
+class QueueFull(Exception):
+    """Raised when the queue is at its limit of admitted jobs"""
+
+
+@dataclass
+class Job:
+    """State of one job as seen by the web process"""
+    id: str
+    kind: str
+    state: str = QUEUED
+    stage: str = None
+    created: float = field(default_factory=time.time)
+    started: float = None
+    finished: float = None
+    result: dict = None
+    error: str = None
+    version: int = 0  # bumped on every change
+
+    def to_dict(self):
+        """Job status as JSON-ready data"""
+        now = time.time()
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'state': self.state,
+            'stage': self.stage,
+            'queued_seconds': round((self.started or self.finished or now) - self.created, 3),
+            'run_seconds': round((self.finished or now) - self.started, 3) if self.started else None,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+def report_progress(stage):
+    """
+    Report the stage a job has reached (call from inside a job function)
+
+    Does nothing outside a JobQueue worker, so job functions can also be
+    called directly.
+    """
+    if _events is not None and _job_id is not None:
+        _events.put((_job_id, RUNNING, stage))
+
+
+class JobQueue:
+    """Bounded process pool with job tracking"""
+
+    def __init__(self, workers=None, limit=None, keep_seconds=KEEP_SECONDS):
+        """
+        Args:
+            workers: Worker processes (defaults to the CPU count)
+            limit: Jobs admitted at once, queued plus running (defaults to
+                JOBS_PER_WORKER per worker)
+            keep_seconds: How long finished jobs can still be queried
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.limit = limit or JOBS_PER_WORKER * self.workers
+        self.keep_seconds = keep_seconds
+        self._jobs = {}
+        self._inline = 0  # slots held by work running outside the pool
+        self._changed = threading.Condition()
+        # Fresh interpreters: forking a threaded web server is not safe
+        self._context = multiprocessing.get_context('spawn')
+        self._events = self._context.Queue()
+        self._pool = self._new_pool()
+        self._listener = threading.Thread(target=self._listen, daemon=True)
+        self._listener.start()
+
+    def submit(self, kind, func, *args, **kwargs):
+        """
+        Admit a job and queue func(*args, **kwargs) in the pool
+
+        func must be picklable (a module-level function) and its return
+        value becomes the job's result.
+
+        Returns:
+            Job
+
+        Raises:
+            QueueFull: If `limit` jobs are already queued or running
+        """
+        with self._changed:
+            self._admit()
+            job = Job(uuid.uuid4().hex, kind)
+            self._jobs[job.id] = job
+            pool = self._pool
+            try:
+                try:
+                    future = pool.submit(_run_job, job.id, func, args, kwargs)
+                except BrokenProcessPool:
+                    self._replace_pool(pool)
+                    pool = self._pool
+                    future = pool.submit(_run_job, job.id, func, args, kwargs)
+            except BaseException:
+                del self._jobs[job.id]  # never queued: must not hold a slot
+                raise
+
+        future.add_done_callback(lambda future: self._finish(job.id, future, pool))
+        return job
+
+    def acquire(self):
+        """
+        Take a slot for work run outside the pool, e.g. in a request thread
+
+        Such work competes with the jobs for the same CPUs, so it counts
+        against the same limit. Give the slot back with release().
+
+        Raises:
+            QueueFull: If `limit` jobs are already queued or running
+        """
+        with self._changed:
+            self._admit()
+            self._inline += 1
+
+    def release(self):
+        """Give back a slot taken with acquire()"""
+        with self._changed:
+            self._inline -= 1
+
+    @contextmanager
+    def slot(self):
+        """Hold a slot (see acquire()) for the duration of a block"""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get(self, job_id):
+        """Return the job with this ID, or None"""
+        with self._changed:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id, version, timeout=None):
+        """
+        Wait until a job changes past the given version or finishes
+
+        Returns:
+            Status dictionary and version of the job, or (None, version)
+            for an unknown job
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._changed_since(job_id, version), timeout)
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None, version
+            return job.to_dict(), job.version
+
+    def active(self):
+        """Number of queued and running jobs, plus slots taken with acquire()"""
+        with self._changed:
+            return self._inline + sum(job.state in (QUEUED, RUNNING) for job in self._jobs.values())
+
+    def stats(self):
+        """Counters for /stats"""
+        with self._changed:
+            states = [job.state for job in self._jobs.values()]
+        return {
+            'workers': self.workers,
+            'limit': self.limit,
+            'inline': self._inline,
+            **{state: states.count(state) for state in (QUEUED, RUNNING, DONE, FAILED)},
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._events.put(None)
+        self._listener.join()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=self._context,
+                                   initializer=_init_worker, initargs=(self._events,))
+
+    def _replace_pool(self, broken):
+        """Swap a pool whose worker died for a fresh one (once per broken pool)"""
+        with self._changed:
+            if self._pool is not broken:
+                return
+            self._pool = self._new_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _admit(self):
+        """Raise QueueFull unless a slot is free (lock held)"""
+        self._prune()
+        if self.active() >= self.limit:
+            raise QueueFull(f"{self.limit} jobs already queued or running, try again later")
+
+    def _changed_since(self, job_id, version):
+        job = self._jobs.get(job_id)
+        return job is None or job.version != version or job.state in (DONE, FAILED)
+
+    def _update(self, job_id, **changes):
+        with self._changed:  # re-entrant: callers may hold it already
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            for name, value in changes.items():
+                setattr(job, name, value)
+            job.version += 1
+            self._changed.notify_all()
+
+    def _listen(self):
+        """Apply progress events sent by the workers"""
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            job_id, state, stage = event
+            with self._changed:
+                job = self._jobs.get(job_id)
+                if job is None or job.state in (DONE, FAILED):
+                    continue  # late event of a finished job
+                self._update(job_id, state=state, stage=stage, started=job.started or time.time())
+
+    def _finish(self, job_id, future, pool):
+        now = time.time()
+        job = self.get(job_id)
+        started = job.started if job and job.started else now
+        if future.cancelled():
+            self._update(job_id, state=FAILED, error='cancelled', started=started, finished=now)
+        elif future.exception() is not None:
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                # A worker died; every job in that pool fails with this, and
+                # new jobs go to a fresh pool
+                self._replace_pool(pool)
+                error = 'worker process died (out of memory?)'
+            self._update(job_id, state=FAILED, error=str(error) or type(error).__name__,
+                         started=started, finished=now, stage=None)
+        else:
+            self._update(job_id, state=DONE, result=future.result(), started=started,
+                         finished=now, stage=None)
+
+    def _prune(self):
+        """Forget finished jobs older than keep_seconds (lock held)"""
+        cutoff = time.time() - self.keep_seconds
+        for job_id in [job.id for job in self._jobs.values() if job.finished and job.finished < cutoff]:
+            del self._jobs[job_id]
+
+
+def _init_worker(events):
+    global _events
+    _events = events
+
+
+def _run_job(job_id, func, args, kwargs):
+    """Run one job in a worker process, reporting when it starts"""
+    global _job_id
+    _job_id = job_id
+    _events.put((job_id, RUNNING, None))
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _job_id = None
@@ -0,0 +1,152 @@
+"""
+Derived Key Cache Module
+Keeps recently derived encryption keys so repeat requests skip the KDF
+"""
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class KeyCache:
+    """Bounded LRU/TTL cache of password-derived keys"""
+
+    def __init__(self, max_entries=32, ttl=600.0):
+        """
+        Initialize an empty key cache
+
+        Args:
+            max_entries: Maximum number of keys kept at once
+            ttl: Seconds a key may stay cached after it was derived
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        # (password digest, salt, params) -> (key bytearray, expiry time)
+        self._entries = OrderedDict()
+        # (password digest, params) -> most recent salt, for encryption
+        self._salts = {}
+        self._lock = threading.Lock()
+
+        # Passwords are only kept as an HMAC under a per-process secret
+        self._pepper = os.urandom(32)
+
+    def get(self, password, salt, params, derive):
+        """
+        Return the key for password/salt/params, deriving it on a miss
+
+        Args:
+            password: Password string
+            salt: Salt bytes
+            params: Hashable tuple identifying the KDF and its parameters
+            derive: Callable (password, salt, params) -> key bytes
+
+        Returns:
+            Key as bytes (a copy; the cached key may be zeroized later)
+        """
+        entry_key = (self._digest(password), salt, params)
+
+        with self._lock:
+            key = self._lookup(entry_key)
+            if key is not None:
+                self.hits += 1
+                return bytes(key)
+            self.misses += 1
+
+        # Derive outside the lock; the KDF is the expensive part
+        key = bytearray(derive(password, salt, params))
+
+        with self._lock:
+            self._store(entry_key, key)
+            return bytes(key)
+
+    def get_for_encryption(self, password, params, derive, salt_size=16):
+        """
+        Return (salt, key) for encrypting, reusing a cached salt if possible
+
+        A fresh random salt would make every encryption a cache miss.
+        Reusing the salt of a cached key is safe because every message
+        still gets its own random IV or nonce.
+
+        Args:
+            password: Password string
+            params: Hashable tuple identifying the KDF and its parameters
+            derive: Callable (password, salt, params) -> key bytes
+            salt_size: Length of a new salt in bytes
+
+        Returns:
+            Tuple of (salt, key bytes)
+        """
+        digest = self._digest(password)
+
+        with self._lock:
+            salt = self._salts.get((digest, params))
+            if salt is not None:
+                key = self._lookup((digest, salt, params))
+                if key is not None:
+                    self.hits += 1
+                    return salt, bytes(key)
+
+        salt = os.urandom(salt_size)
+        return salt, self.get(password, salt, params, derive)
+
+    def clear(self):
+        """Zeroize and drop every cached key"""
+        with self._lock:
+            while self._entries:
+                self._evict(next(iter(self._entries)))
+
+    def stats(self):
+        """
+        Get cache counters
+
+        Returns:
+            Dictionary with hits, misses and current size
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+            }
+
+    def _digest(self, password):
+        return hmac.new(self._pepper, password.encode('utf-8'), hashlib.sha256).digest()
+
+    def _lookup(self, entry_key):
+        """Return the live cached key and mark it recently used (lock held)"""
+        entry = self._entries.get(entry_key)
+        if entry is None:
+            return None
+        key, expires = entry
+        if time.monotonic() >= expires:
+            self._evict(entry_key)
+            return None
+        self._entries.move_to_end(entry_key)
+        return key
+
+    def _store(self, entry_key, key):
+        """Insert a key, evicting the least recently used ones (lock held)"""
+        if entry_key in self._entries:
+            self._evict(entry_key)
+        self._entries[entry_key] = (key, time.monotonic() + self.ttl)
+        digest, salt, params = entry_key
+        self._salts[(digest, params)] = salt
+
+        while len(self._entries) > self.max_entries:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, entry_key):
+        """Remove a key and overwrite its bytes in place (lock held)"""
+        key, _ = self._entries.pop(entry_key)
+        key[:] = bytes(len(key))
+
+        digest, salt, params = entry_key
+        if self._salts.get((digest, params)) == salt:
+            del self._salts[(digest, params)]
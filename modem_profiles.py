@@ -0,0 +1,72 @@
+"""
+Modem Profiles Module
+Named amodem configurations shared by the encoder and decoder
+"""
+
+import json
+
+import amodem.config
+
+DEFAULT_PROFILE = 'default'
+
+# name -> (description, amodem Configuration keyword arguments)
+PROFILES = {
+    'robust': ("1 kbps, BPSK on 2 kHz (noisy links)",
+               dict(Fs=8e3, Npoints=2, frequencies=[2e3])),
+    'slow': ("8 kbps, 16-QAM on 1-2 kHz",
+             dict(Fs=8e3, Npoints=16, frequencies=[1e3, 2e3])),
+    'medium': ("24 kbps, 16-QAM on 1-6 kHz",
+               dict(Fs=16e3, Npoints=16, frequencies=[1e3, 6e3])),
+    'default': ("48 kbps, 64-QAM on 1-8 kHz (amodem default)",
+                dict()),
+    'fast': ("80 kbps, 256-QAM on 2-11 kHz (clean links only)",
+             dict(Fs=32e3, Npoints=256, frequencies=[2e3, 11e3])),
+}
+
+# RIFF chunk carrying transfer metadata (JSON) in front of the samples
+METADATA_CHUNK = 'sxmd'
+
+_configs = {}
+
+
+def get_config(profile=DEFAULT_PROFILE):
+    """
+    Get the amodem configuration for a profile
+
+    Args:
+        profile: Profile name from PROFILES
+
+    Returns:
+        amodem.config.Configuration (shared, do not modify)
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown modem profile '{profile}'. "
+                         f"Choose one of: {', '.join(PROFILES)}")
+    if profile not in _configs:
+        _configs[profile] = amodem.config.Configuration(**PROFILES[profile][1])
+    return _configs[profile]
+
+
+def encode_metadata(metadata):
+    """Serialize transfer metadata for the WAV metadata chunk"""
+    return json.dumps(metadata, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+def decode_metadata(chunks):
+    """
+    Read transfer metadata from the chunks kept by read_wav_header
+
+    Args:
+        chunks: Dictionary of chunk ID -> bytes
+
+    Returns:
+        Metadata dictionary (empty if the file has none)
+    """
+    raw = chunks.get(METADATA_CHUNK)
+    if not raw:
+        return {}
+    try:
+        metadata = json.loads(raw.decode('utf-8'))
+    except (UnicodeDecodeError, ValueError):
+        return {}
+    return metadata if isinstance(metadata, dict) else {}
@@ -10,15 +10,19 @@ Date: November 2025
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import os
+import io
 import threading
-from data_encoder import DataEncoder
-from data_decoder import DataDecoder
-from crypto_handler import CryptoHandler
-from Crypto.Random import get_random_bytes
-from Crypto.Util.Padding import pad, unpad
-from Crypto.Cipher import AES
+import time
+from data_encoder import DataEncoder, wav_header, MAX_LANES, STRIPE_SIZE
+from data_decoder import DataDecoder, LiveStream
+from crypto_handler import CryptoHandler, MODE_CBC, MODE_GCM
+from modem_profiles import PROFILES, DEFAULT_PROFILE, get_config
+from fec_codec import FEC_LEVELS, fec_encode, fec_decode, is_fec
+from compression import COMPRESS_AUTO, CODEC_NONE
+from carrier_detect import CarrierDetector, DEFAULT_THRESHOLD
+from transport import ChunkStore, DEFAULT_OUTBOX, frame_transfer, format_ranges, parse_ranges, is_framed
+from stage_timer import StageTimer, profiled
 import pyaudio
-import wave
 
 
 class DataTransceiverApp:
@@ -38,6 +42,18 @@ class DataTransceiverApp:
         self.selected_file = None
         self.encryption_key = tk.StringVar()
         self.use_encryption = tk.BooleanVar(value=True)
+        self.use_parallel_cipher = tk.BooleanVar(value=False)
+        self.use_compression = tk.BooleanVar(value=True)
+        self.modem_profile = tk.StringVar(value=DEFAULT_PROFILE)
+        self.lanes = tk.IntVar(value=1)
+        self.fec_level = tk.StringVar(value="Off")
+        self.use_chunks = tk.BooleanVar(value=True)
+        self.resend_spec = tk.StringVar()
+        self.keep_wav_copy = tk.BooleanVar(value=False)
+        self.chunk_store = ChunkStore()
+        self.outbox = ChunkStore(DEFAULT_OUTBOX)
+        self.live_stop = None  # set while live receive is running
+        self.detect_threshold = tk.DoubleVar(value=DEFAULT_THRESHOLD)
 
         self.setup_ui()
 
@@ -76,6 +92,28 @@ class DataTransceiverApp:
             font=("Arial", 11)
         ).pack(side=tk.LEFT, padx=20)
 
+        # Modem profile and lane (channel) count, shared by both modes. Saved
+        # WAV files carry both, so the receiver only needs them for live
+        # recordings.
+        tk.Spinbox(
+            mode_frame,
+            from_=1,
+            to=MAX_LANES,
+            textvariable=self.lanes,
+            state="readonly",
+            width=3
+        ).pack(side=tk.RIGHT)
+        tk.Label(mode_frame, text="Lanes:", font=("Arial", 10)).pack(side=tk.RIGHT, padx=5)
+
+        ttk.Combobox(
+            mode_frame,
+            textvariable=self.modem_profile,
+            values=list(PROFILES),
+            state="readonly",
+            width=10
+        ).pack(side=tk.RIGHT)
+        tk.Label(mode_frame, text="Modem profile:", font=("Arial", 10)).pack(side=tk.RIGHT, padx=5)
+
         # Main content frame (will switch based on mode)
         self.content_frame = tk.Frame(self.root)
         self.content_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
@@ -171,6 +209,49 @@ class DataTransceiverApp:
         )
         self.key_entry.pack(fill=tk.X, pady=(0, 5))
 
+        tk.Checkbutton(
+            encrypt_frame,
+            text="Parallel AES-GCM (faster for large files, needs an updated receiver)",
+            variable=self.use_parallel_cipher,
+            font=("Arial", 10)
+        ).pack(anchor=tk.W)
+
+        tk.Checkbutton(
+            encrypt_frame,
+            text="Compress before encrypting (skipped for images and archives)",
+            variable=self.use_compression,
+            font=("Arial", 10)
+        ).pack(anchor=tk.W)
+
+        fec_row = tk.Frame(encrypt_frame)
+        fec_row.pack(anchor=tk.W)
+        tk.Label(fec_row, text="Error correction (parity bytes per 255):", font=("Arial", 10)).pack(side=tk.LEFT)
+        ttk.Combobox(
+            fec_row,
+            textvariable=self.fec_level,
+            values=["Off"] + [str(level) for level in FEC_LEVELS],
+            state="readonly",
+            width=5
+        ).pack(side=tk.LEFT, padx=5)
+
+        chunk_row = tk.Frame(encrypt_frame)
+        chunk_row.pack(anchor=tk.W)
+        tk.Checkbutton(
+            chunk_row,
+            text="Resumable chunks",
+            variable=self.use_chunks,
+            font=("Arial", 10)
+        ).pack(side=tk.LEFT)
+        tk.Label(chunk_row, text="Re-send (ID:chunks):", font=("Arial", 10)).pack(side=tk.LEFT, padx=(10, 0))
+        tk.Entry(chunk_row, textvariable=self.resend_spec, font=("Arial", 10), width=20).pack(side=tk.LEFT, padx=5)
+
+        tk.Checkbutton(
+            encrypt_frame,
+            text="Keep a WAV copy while playing (output.wav)",
+            variable=self.keep_wav_copy,
+            font=("Arial", 10)
+        ).pack(anchor=tk.W)
+
         tk.Label(
             encrypt_frame, 
             text="⚠ Remember this key - you'll need it to decrypt!", 
@@ -242,6 +323,19 @@ class DataTransceiverApp:
             cursor="hand2"
         ).pack(side=tk.LEFT, padx=10, expand=True, fill=tk.X)
 
+        self.live_button = tk.Button(
+            source_frame,
+            text="📡 Live Receive",
+            command=self.toggle_live_receive,
+            bg="#e67e22",
+            fg="white",
+            font=("Arial", 10),
+            padx=15,
+            pady=8,
+            cursor="hand2"
+        )
+        self.live_button.pack(side=tk.LEFT, padx=10, expand=True, fill=tk.X)
+
         tk.Button(
             source_frame,
             text="📁 Load Audio File",
@@ -254,6 +348,19 @@ class DataTransceiverApp:
             cursor="hand2"
         ).pack(side=tk.LEFT, padx=10, expand=True, fill=tk.X)
 
+        detect_row = tk.Frame(self.content_frame)
+        detect_row.pack(fill=tk.X, pady=(0, 10))
+        tk.Label(detect_row, text="Carrier detection threshold:", font=("Arial", 10)).pack(side=tk.LEFT)
+        tk.Scale(
+            detect_row,
+            variable=self.detect_threshold,
+            from_=0.5,
+            to=0.99,
+            resolution=0.01,
+            orient=tk.HORIZONTAL,
+            length=200
+        ).pack(side=tk.LEFT, padx=5)
+
         # Decryption Key Frame
         decrypt_frame = tk.LabelFrame(
             self.content_frame, 
@@ -323,39 +430,98 @@ class DataTransceiverApp:
     def _generate_and_play_thread(self):
         """Thread function for generating and playing audio"""
         try:
-            # Read file data
-            with open(self.selected_file, 'rb') as f:
-                file_data = f.read()
+            timer = StageTimer()
+            with profiled('transmit'):
+                final_data = self._read_payload(timer)
+
+                # Play the audio while it is being generated
+                self.log_sender(f"Generating and playing audio ({self._profile_label()})...")
+                self.encoder = DataEncoder(self.modem_profile.get(), lanes=self.lanes.get())
+                tee_path = 'output.wav' if self.keep_wav_copy.get() else None
+                self.play_stream(self.encoder, final_data, tee_path, timer)
+            self.log_sender("✓ Playback complete")
+            if tee_path:
+                self.log_sender(f"✓ Audio saved: {tee_path}")
+            self.log_sender(f"⏱ {timer.summary()}")
 
-            if self.use_encryption.get():
+        except Exception as e:
+            self.log_sender(f"✗ Error: {str(e)}")
+            messagebox.showerror("Error", f"Failed to generate audio: {str(e)}")
+
+    def _read_payload(self, timer):
+        """Read the selected file, encrypting, chunking and adding FEC if enabled"""
+        if self.resend_spec.get().strip():
+            with timer.stage('chunk') as stage:
+                data = self._resend_payload()
+                stage.bytes = len(data)
+            return self._add_fec(data, timer)
+
+        with open(self.selected_file, 'rb') as f:
+            f = timer.reader(f)
+            if not self.use_encryption.get():
+                self.log_sender("Encryption skipped")
+                data = f.read()
+            else:
                 # Initialize crypto
-                self.crypto = CryptoHandler(self.encryption_key.get())
+                mode = MODE_GCM if self.use_parallel_cipher.get() else MODE_CBC
+                compression = COMPRESS_AUTO if self.use_compression.get() else CODEC_NONE
+                self.crypto = CryptoHandler(self.encryption_key.get(), mode=mode,
+                                            compression=compression)
 
                 # Encrypt file
                 self.log_sender("Encrypting data...")
-                iv = get_random_bytes(16)
-                cipher = AES.new(self.crypto.key, AES.MODE_CBC, iv)
-                padded_data = pad(file_data, AES.block_size)
-                encrypted_data = cipher.encrypt(padded_data)
-                final_data = iv + encrypted_data
+                buf = io.BytesIO()
+                with timer.stage('encrypt') as stage:
+                    stage.bytes = self.crypto.encrypt_stream(f, buf)
                 self.log_sender("✓ Data encrypted successfully")
-            else:
-                final_data = file_data
-                self.log_sender("Encryption skipped")
-
-            # Generate audio
-            self.log_sender("Generating audio...")
-            audio_path = self.encoder.encode(final_data)
-            self.log_sender(f"✓ Audio generated: {audio_path}")
-
-            # Play audio
-            self.log_sender("Playing audio...")
-            self.play_audio(audio_path)
-            self.log_sender("✓ Playback complete")
-
-        except Exception as e:
-            self.log_sender(f"✗ Error: {str(e)}")
-            messagebox.showerror("Error", f"Failed to generate audio: {str(e)}")
+                data = buf.getvalue()
+
+                stats = self.crypto.compression_stats
+                if stats.codec != CODEC_NONE:
+                    rate = get_config(self.modem_profile.get()).modem_bps * self.lanes.get() / 8
+                    self.log_sender(
+                        f"✓ Compressed with {stats.codec}: saved {stats.bytes_saved} bytes "
+                        f"(~{stats.airtime_saved(rate):.1f} s of audio)")
+
+        if self.use_chunks.get():
+            with timer.stage('chunk') as stage:
+                transfer_id = self.outbox.save_outgoing(data)
+                _, data = frame_transfer(data, transfer_id=transfer_id)
+                stage.bytes = len(data)
+            count = self.outbox.status(transfer_id)['count']
+            self.log_sender(f"✓ Transfer {transfer_id:08x}: {count} chunks "
+                            f"(re-send missing ones as {transfer_id:08x}:<chunks>)")
+        return self._add_fec(data, timer)
+
+    def _resend_payload(self):
+        """Frame the chunks named in the re-send field, e.g. '1a2b3c4d:0,5-7'"""
+        transfer, _, chunks = self.resend_spec.get().strip().partition(':')
+        try:
+            transfer_id = int(transfer, 16)
+        except ValueError:
+            raise ValueError(f"Invalid transfer ID: {transfer}")
+        indices = parse_ranges(chunks) if chunks.strip() else None
+        data = self.outbox.frame_resend(transfer_id, indices)
+        self.log_sender(f"Re-sending transfer {transfer_id:08x}, chunks "
+                        f"{format_ranges(indices) if indices else 'all'}")
+        return data
+
+    def _add_fec(self, data, timer):
+        """Add error correction if enabled"""
+        if self.fec_level.get() != "Off":
+            size = len(data)
+            with timer.stage('fec') as stage:
+                data = fec_encode(data, nsym=int(self.fec_level.get()))
+                stage.bytes = len(data)
+            self.log_sender(f"✓ Error correction added: {size} -> {len(data)} bytes")
+        return data
+
+    def _profile_label(self):
+        """Name and description of the selected modem profile"""
+        name = self.modem_profile.get()
+        lanes = self.lanes.get()
+        label = f"{name}: {PROFILES[name][0]}"
+        return label if lanes == 1 else f"{label} x {lanes} lanes"
 
     def save_audio(self):
         """Generate and save audio file"""
@@ -380,30 +546,16 @@ class DataTransceiverApp:
     def _save_audio_thread(self, save_path):
         """Thread function for saving audio"""
         try:
-            # Read file data
-            with open(self.selected_file, 'rb') as f:
-                file_data = f.read()
-
-            if self.use_encryption.get():
-                # Initialize crypto
-                self.crypto = CryptoHandler(self.encryption_key.get())
-
-                # Encrypt file
-                self.log_sender("Encrypting data...")
-                iv = get_random_bytes(16)
-                cipher = AES.new(self.crypto.key, AES.MODE_CBC, iv)
-                padded_data = pad(file_data, AES.block_size)
-                encrypted_data = cipher.encrypt(padded_data)
-                final_data = iv + encrypted_data
-                self.log_sender("✓ Data encrypted successfully")
-            else:
-                final_data = file_data
-                self.log_sender("Encryption skipped")
-
-            # Generate audio
-            self.log_sender("Generating audio...")
-            audio_path = self.encoder.encode(final_data, output_path=save_path)
+            timer = StageTimer()
+            with profiled('encode'):
+                final_data = self._read_payload(timer)
+
+                # Generate audio
+                self.log_sender(f"Generating audio ({self._profile_label()})...")
+                self.encoder = DataEncoder(self.modem_profile.get(), lanes=self.lanes.get())
+                self.encoder.encode(final_data, output_path=save_path, timer=timer)
             self.log_sender(f"✓ Audio saved: {save_path}")
+            self.log_sender(f"⏱ {timer.summary()}")
 
             messagebox.showinfo("Success", f"Audio saved successfully!")
 
@@ -413,41 +565,142 @@ class DataTransceiverApp:
 
     def record_audio(self):
         """Record audio from microphone"""
-        self.log_receiver("🎤 Starting microphone recording...")
-        self.log_receiver("Recording will stop after 10 seconds...")
+        self.log_receiver("🎤 Listening for a carrier...")
 
         # Run in thread
         thread = threading.Thread(target=self._record_audio_thread)
         thread.daemon = True
         thread.start()
 
-    def _record_audio_thread(self):
-        """Thread function for recording audio"""
+    def _record_audio_thread(self, max_seconds=600):
+        """Record from the carrier appearing until it drops, then decode"""
         try:
             audio_path = 'recorded_audio.wav'
+            profile = self.modem_profile.get()
+            lanes = self.lanes.get()
+            config = get_config(profile)
+            detector = CarrierDetector(config, nchannels=lanes, threshold=self.detect_threshold.get())
             p = pyaudio.PyAudio()
-            stream = p.open(format=pyaudio.paInt16, channels=1, rate=48000, input=True, frames_per_buffer=1024)
+            rate = int(config.Fs)
+            stream = p.open(format=pyaudio.paInt16, channels=lanes, rate=rate, input=True, frames_per_buffer=1024)
             frames = []
-            for i in range(0, int(48000 / 1024 * 10)):
-                data = stream.read(1024)
-                frames.append(data)
-            stream.stop_stream()
-            stream.close()
-            p.terminate()
-
-            wf = wave.open(audio_path, 'wb')
-            wf.setnchannels(1)
-            wf.setsampwidth(p.get_sample_size(pyaudio.paInt16))
-            wf.setframerate(48000)
-            wf.writeframes(b''.join(frames))
-            wf.close()
-
-            self.log_receiver(f"✓ Recording saved: {audio_path}")
+            waited = recorded = 0
+            try:
+                while not detector.finished:
+                    data = stream.read(1024, exception_on_overflow=False)
+                    kept = detector.feed(data)
+                    if not detector.active and not detector.finished:
+                        waited += 1024
+                        if waited > config.timeout * rate:
+                            break
+                        continue
+                    if not frames:
+                        self.log_receiver("📡 Carrier detected, recording...")
+                    frames.append(kept)
+                    recorded += 1024
+                    if recorded > max_seconds * rate:
+                        self.log_receiver(f"⚠ Stopped after {max_seconds} s")
+                        break
+            finally:
+                stream.stop_stream()
+                stream.close()
+                p.terminate()
+
+            if not frames:
+                self.log_receiver(f"✗ No carrier heard within {config.timeout:.0f} s")
+                return
+
+            # Tag the recording with its profile so decoding follows it
+            metadata = {'profile': profile}
+            if lanes > 1:
+                metadata.update(lanes=lanes, stripe=STRIPE_SIZE)
+            samples = b''.join(frames)
+            with open(audio_path, 'wb') as wf:
+                wf.write(wav_header(config, lanes, len(samples), metadata))
+                wf.write(samples)
+
+            seconds = len(samples) / (lanes * config.sample_size * rate)
+            self.log_receiver(f"✓ Carrier dropped, recorded {seconds:.1f} s: {audio_path}")
             self.selected_file = audio_path
+            self.root.after(0, self.decode_audio)
         except Exception as e:
             self.log_receiver(f"✗ Recording error: {str(e)}")
             messagebox.showerror("Error", f"Recording failed: {str(e)}")
 
+    def toggle_live_receive(self):
+        """Start demodulating from the microphone, or stop listening"""
+        if self.live_stop is not None:
+            self.live_stop.set()
+            self.log_receiver("Stopping live receive...")
+            return
+
+        if self.lanes.get() > 1:
+            messagebox.showwarning("Live Receive", "Live receive decodes a single lane. "
+                                   "Record multi-lane transmissions and decode them afterwards.")
+            return
+        if self.use_encryption.get() and not self.encryption_key.get():
+            messagebox.showwarning("No Key", "Please enter the decryption key!")
+            return
+
+        self.live_stop = threading.Event()
+        self.live_button.config(text="⏹ Stop Listening")
+        self.log_receiver(f"📡 Listening for a transmission ({self._profile_label()})...")
+
+        thread = threading.Thread(target=self._live_receive_thread, args=(self.live_stop,))
+        thread.daemon = True
+        thread.start()
+
+    def _live_receive_thread(self, stop):
+        """Feed microphone blocks straight into the demodulator"""
+        live = LiveStream()
+        profile = self.modem_profile.get()
+        rate = int(get_config(profile).Fs)
+
+        def listen():
+            p = pyaudio.PyAudio()
+            try:
+                stream = p.open(format=pyaudio.paInt16, channels=1, rate=rate,
+                                input=True, frames_per_buffer=1024)
+                while not stop.is_set():
+                    live.feed(stream.read(1024, exception_on_overflow=False))
+                stream.stop_stream()
+                stream.close()
+            except Exception as e:
+                self.log_receiver(f"✗ Recording error: {str(e)}")
+            finally:
+                p.terminate()
+                live.close()
+
+        last_report = [0.0]
+
+        def progress(count):
+            now = time.monotonic()
+            if now - last_report[0] >= 0.5:
+                last_report[0] = now
+                self.log_receiver(f"… {count} bytes received")
+
+        listener = threading.Thread(target=listen, daemon=True)
+        listener.start()
+        try:
+            decoded = io.BytesIO()
+            result = self.decoder.decode_stream(live, decoded, profile, progress=progress)
+            stop.set()  # the transmission is over: stop the microphone
+            listener.join()
+            decoded.seek(0)
+            if result.bytes_out:
+                self.log_receiver(f"✓ Received {result.bytes_out} bytes live "
+                                  f"({result.audio_seconds:.1f} s of audio)")
+                self._finish_decode(decoded, result)
+            else:
+                self.log_receiver("✗ No transmission received")
+        except Exception as e:
+            self.log_receiver(f"✗ Error: {str(e)}")
+            messagebox.showerror("Error", f"Live receive failed: {str(e)}")
+        finally:
+            stop.set()
+            self.live_stop = None
+            self.live_button.config(text="📡 Live Receive")
+
     def load_audio_file(self):
         """Load audio file for decoding"""
         filename = filedialog.askopenfilename(
@@ -483,23 +736,56 @@ class DataTransceiverApp:
         try:
             # Decode audio
             self.log_receiver("Decoding audio...")
-            decoded_data = self.decoder.decode(self.selected_file)
-            self.log_receiver(f"✓ Audio decoded")
+            timer = StageTimer()
+            with profiled('decode'):
+                decoded = io.BytesIO()
+                with timer.stage('demodulate') as stage:
+                    result = self.decoder.decode_to(self.selected_file, decoded)
+                    stage.bytes = result.bytes_out
+                decoded.seek(0)
+                self.log_receiver(
+                    f"✓ Audio decoded ({result.profile}, {result.lanes} lane(s)): {result.bytes_out} bytes from "
+                    f"{result.audio_seconds:.1f} s of audio in {result.elapsed:.1f} s")
+                self._finish_decode(decoded, result, timer)
+
+        except Exception as e:
+            self.log_receiver(f"✗ Error: {str(e)}")
+            messagebox.showerror("Error", f"Decoding failed: {str(e)}")
+
+    def _finish_decode(self, decoded, result, timer=None):
+        """Correct, reassemble, decrypt and save demodulated bytes"""
+        timer = timer or StageTimer()
+        try:
+            if is_fec(decoded.getbuffer()):
+                with timer.stage('fec') as stage:
+                    decoded = io.BytesIO(fec_decode(decoded.getbuffer()))
+                    stage.bytes = len(decoded.getbuffer())
+                if result.success:
+                    self.log_receiver("✓ Error correction checked")
+                else:
+                    self.log_receiver("✓ Error correction restored the lost part of the signal")
+            elif not result.success:
+                self.log_receiver("⚠ Signal ended early, the data may be incomplete")
+
+            if is_framed(decoded.getbuffer()):
+                with timer.stage('chunk'):
+                    decoded = self._collect_chunks(decoded.getvalue())
+                if decoded is None:
+                    return
 
             if self.use_encryption.get():
                 # Decrypt data
                 self.crypto = CryptoHandler(self.encryption_key.get())
                 self.log_receiver("Decrypting data...")
                 
-                iv = decoded_data[:16]
-                encrypted_data = decoded_data[16:]
-                cipher = AES.new(self.crypto.key, AES.MODE_CBC, iv)
-                decrypted_padded = cipher.decrypt(encrypted_data)
-                final_data = unpad(decrypted_padded, AES.block_size)
+                buf = io.BytesIO()
+                with timer.stage('decrypt') as stage:
+                    stage.bytes = self.crypto.decrypt_stream(decoded, buf)
+                final_data = buf.getbuffer()
 
                 self.log_receiver("✓ Data decrypted successfully")
             else:
-                final_data = decoded_data
+                final_data = decoded.getbuffer()
                 self.log_receiver("Decryption skipped")
 
             # Ask user where to save the decrypted file
@@ -514,16 +800,50 @@ class DataTransceiverApp:
             )
             if save_path:
                 with open(save_path, 'wb') as f:
-                    f.write(final_data)
+                    timer.writer(f).write(final_data)
                 self.log_receiver(f"✓ Decoded file saved: {save_path}")
+                self.log_receiver(f"⏱ {timer.summary()}")
                 messagebox.showinfo("Success", f"File saved successfully!")
 
         except Exception as e:
             self.log_receiver(f"✗ Error: {str(e)}")
             messagebox.showerror("Error", f"Decoding failed: {str(e)}")
 
+    def _collect_chunks(self, data):
+        """
+        Store received chunks; return the payload once the transfer is complete
+
+        Returns:
+            BytesIO with the reassembled payload, or None if chunks are missing
+        """
+        added = self.chunk_store.add(data)
+        if not added:
+            self.log_receiver("✗ No intact chunks found")
+            return None
+
+        complete = None
+        for transfer_id, new in added.items():
+            status = self.chunk_store.status(transfer_id)
+            self.log_receiver(f"Transfer {transfer_id:08x}: {new} new chunks, "
+                              f"{status['received']}/{status['count']} received")
+            if status['missing']:
+                self.log_receiver(f"⚠ Ask the sender to re-send "
+                                  f"{transfer_id:08x}:{format_ranges(status['missing'])}")
+            elif complete is None:
+                complete = transfer_id
+
+        if complete is None:
+            return None
+        payload = io.BytesIO()
+        self.chunk_store.assemble(complete, payload)
+        payload.seek(0)
+        self.log_receiver(f"✓ Transfer {complete:08x} complete")
+        return payload
+
     def validate_sender_inputs(self):
         """Validate sender inputs"""
+        if self.resend_spec.get().strip():
+            return True
         if not self.selected_file:
             messagebox.showwarning("No File", "Please select a file first!")
             return False
@@ -553,35 +873,30 @@ class DataTransceiverApp:
         from datetime import datetime
         return datetime.now().strftime("%H:%M:%S")
 
-    def play_audio(self, wav_path):
-        """Play WAV audio file"""
-        # Open WAV file
-        wf = wave.open(wav_path, 'rb')
-
-        # Create PyAudio instance
+    def play_stream(self, encoder, data, tee_path=None, timer=None):
+        """Play data through the speakers while the encoder modulates it"""
         p = pyaudio.PyAudio()
-
-        # Open stream
         stream = p.open(
-            format=p.get_format_from_width(wf.getsampwidth()),
-            channels=wf.getnchannels(),
-            rate=wf.getframerate(),
+            format=pyaudio.paInt16,
+            channels=encoder.lanes,
+            rate=int(encoder.config.Fs),
             output=True
         )
+        start = time.perf_counter()
+        first = []
 
-        # Read and play data
-        chunk = 1024
-        data = wf.readframes(chunk)
+        def play(block):
+            if not first:
+                first.append(block)
+                self.log_sender(f"🔊 First sound after {time.perf_counter() - start:.2f} s")
+            stream.write(block)
 
-        while data:
-            stream.write(data)
-            data = wf.readframes(chunk)
-
-        # Cleanup
-        stream.stop_stream()
-        stream.close()
-        p.terminate()
-        wf.close()
+        try:
+            encoder.transmit(data, play, tee_path, timer)
+        finally:
+            stream.stop_stream()
+            stream.close()
+            p.terminate()
 
 if __name__ == "__main__":
     root = tk.Tk()
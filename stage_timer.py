@@ -0,0 +1,217 @@
+"""
+Stage Timer Module
+Measures how long each pipeline stage takes and how many bytes it produces
+
+A StageTimer collects named stages (read, encrypt, modulate, write,
+playback, ...). Stages may nest or overlap with wrapped readers, writers
+and iterators; each stage is charged only its own time, so the stages of
+one run add up to its wall time rather than counting anything twice.
+
+Setting the environment variable TRANSCEIVER_PROFILE to a directory also
+runs every operation wrapped in profiled() under cProfile and writes the
+statistics there as <label>-<time>-<pid>-<n>.prof (open them with
+`python -m pstats` or a viewer such as snakeviz).
+"""
+
+import cProfile
+import itertools
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+# Directory for cProfile dumps; profiling is off when unset
+PROFILE_ENV = 'TRANSCEIVER_PROFILE'
+
+# Tells apart dumps written by one process within the same second
+_dump_numbers = itertools.count(1)
+
+
+@dataclass
+class Stage:
+    """Time spent in one stage and the bytes it produced (read, wrote, ...)"""
+    name: str
+    seconds: float = 0.0
+    bytes: int = 0
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+
+class StageTimer:
+    """Per-stage wall time and byte counts of one encode or decode run"""
+
+    def __init__(self):
+        self._stages = {}  # name -> Stage, in the order first seen
+        self._children = []  # time spent in inner stages, per open stage
+
+    @property
+    def stages(self):
+        return list(self._stages.values())
+
+    @property
+    def total(self):
+        return sum(stage.seconds for stage in self._stages.values())
+
+    @contextmanager
+    def stage(self, name, nbytes=0):
+        """
+        Time a block of code as a stage
+
+        Running the same stage again adds to its time and bytes. The
+        yielded Stage can be updated with the bytes once they are known.
+
+        Args:
+            name: Stage name
+            nbytes: Bytes the stage produces
+        """
+        stage = self._get(name)
+        stage.bytes += nbytes
+        self._children.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            self._charge(stage, time.perf_counter() - start, self._children.pop())
+
+    def reader(self, f, name='read'):
+        """Wrap a file object so time spent in read() goes to a stage"""
+        return _TimedFile(self, f, self._get(name), 'read')
+
+    def writer(self, f, name='write'):
+        """Wrap a file object so time spent in write() goes to a stage"""
+        return _TimedFile(self, f, self._get(name), 'write')
+
+    def wrap(self, func, name):
+        """Wrap a callable taking a block of bytes, e.g. an audio stream's write"""
+        stage = self._get(name)
+
+        def timed(block, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(block, *args, **kwargs)
+            finally:
+                self._charge(stage, time.perf_counter() - start, 0.0, len(block))
+        return timed
+
+    def iterate(self, blocks, name):
+        """Wrap an iterator of byte blocks so producing them goes to a stage"""
+        return self._iterate(iter(blocks), self._get(name))
+
+    def as_dict(self):
+        """Stages as JSON-ready data"""
+        return {
+            'stages': [{'name': stage.name, 'seconds': round(stage.seconds, 4), 'bytes': stage.bytes}
+                       for stage in self._stages.values()],
+            'total_seconds': round(self.total, 4),
+        }
+
+    def summary(self):
+        """One line with every stage, e.g. 'read 0.01 s (2.0 MB) · encrypt ...'"""
+        return format_timings(self.as_dict())
+
+    def _get(self, name):
+        if name not in self._stages:
+            self._stages[name] = Stage(name)
+        return self._stages[name]
+
+    def _iterate(self, blocks, stage):
+        while True:
+            start = time.perf_counter()
+            try:
+                block = next(blocks)
+            except StopIteration:
+                self._charge(stage, time.perf_counter() - start, 0.0)
+                return
+            self._charge(stage, time.perf_counter() - start, 0.0, len(block))
+            yield block
+
+    def _charge(self, stage, elapsed, inner, nbytes=0):
+        """Credit a stage with its own time and pass the whole to the enclosing stage"""
+        stage.seconds += elapsed - inner
+        stage.bytes += nbytes
+        if self._children:
+            self._children[-1] += elapsed
+
+
+def format_timings(timings):
+    """Format the output of StageTimer.as_dict() as one line"""
+    parts = []
+    for stage in timings['stages']:
+        detail = f"{stage['name']} {stage['seconds']:.2f} s"
+        if stage['bytes']:
+            detail += f" ({_format_bytes(stage['bytes'])}"
+            if stage['seconds'] >= 0.01:
+                detail += f", {_format_bytes(stage['bytes'] / stage['seconds'])}/s"
+            detail += ")"
+        parts.append(detail)
+    return " · ".join(parts) + f" = {timings['total_seconds']:.2f} s"
+
+
+@contextmanager
+def profiled(label):
+    """
+    Run a block under cProfile if TRANSCEIVER_PROFILE is set
+
+    Only the calling thread is profiled; work in other processes (lanes,
+    batch workers) is profiled where they call profiled() themselves.
+
+    Args:
+        label: Start of the dump's file name, e.g. 'encode'
+
+    Yields:
+        Path the statistics will be written to, or None when off
+    """
+    directory = os.environ.get(PROFILE_ENV)
+    if not directory:
+        yield None
+        return
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-"
+                                   f"{os.getpid()}-{next(_dump_numbers)}.prof")
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield path
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+class _TimedFile:
+    """File object proxy timing one of its methods"""
+
+    def __init__(self, timer, f, stage, method):
+        self._timer = timer
+        self._f = f
+        self._stage = stage
+        self._method = method
+
+    def __getattr__(self, name):
+        attr = getattr(self._f, name)
+        if name != self._method:
+            return attr
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = attr(*args, **kwargs)
+            if name == 'read':
+                nbytes = len(result)
+            else:
+                nbytes = result if isinstance(result, int) else memoryview(args[0]).nbytes
+            self._timer._charge(self._stage, time.perf_counter() - start, 0.0, nbytes)
+            return result
+        return timed
+
+    def __iter__(self):
+        return iter(self._f)
+
+
+def _format_bytes(n):
+    for unit in ('B', 'kB', 'MB'):
+        if n < 1000:
+            return f"{n:.0f} {unit}" if unit == 'B' else f"{n:.1f} {unit}"
+        n /= 1000
+    return f"{n:.1f} GB"
@@ -92,6 +92,1166 @@ def test_end_to_end():
         traceback.print_exc()
         return False
 
+def test_streaming_encoder():
+    """Test block-wise encoding into a sink that cannot seek"""
+    print("\nTesting streaming encoder...")
+    try:
+        import io
+        from data_encoder import DataEncoder
+        from data_decoder import DataDecoder
+        from Crypto.Random import get_random_bytes
+
+        class PipeSink:
+            """Write-only sink, like a socket or HTTP response"""
+            def __init__(self):
+                self.chunks = []
+            def write(self, data):
+                self.chunks.append(bytes(data))
+
+        original_data = get_random_bytes(2048)
+        encoder = DataEncoder()
+
+        sink = PipeSink()
+        encoder.encode(io.BytesIO(original_data), output_path=sink)
+        audio_path = 'streamed_output.wav'
+        with open(audio_path, 'wb') as f:
+            f.write(b''.join(sink.chunks))
+
+        decoded = io.BytesIO()
+        result = DataDecoder().decode_to(audio_path, decoded)
+        decoded_data = decoded.getvalue()
+        os.remove(audio_path)
+
+        if not result.success or result.bytes_out != len(original_data):
+            print(f"  ✗ Streaming encoder failed: Unexpected decode result {result}.")
+            return False
+
+        if decoded_data == original_data:
+            print("  ✓ Streaming encoder passed!")
+            return True
+        else:
+            print("  ✗ Streaming encoder failed: Decoded data does not match original data.")
+            return False
+
+    except Exception as e:
+        print(f"  ✗ Streaming encoder failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_stream_roundtrip():
+    """Test chunked stream encryption against the whole-buffer format"""
+    print("\nTesting stream encryption...")
+    try:
+        import io
+        from crypto_handler import CryptoHandler, MODE_GCM, KDF_SHA256
+        from Crypto.Random import get_random_bytes
+        from Crypto.Cipher import AES
+        from Crypto.Util.Padding import unpad
+
+        crypto = CryptoHandler("test_password", kdf=KDF_SHA256)
+
+        # Sizes around the AES block and chunk boundaries
+        for size in (0, 1, 15, 16, 17, 4096, 65535, 65536, 200001):
+            original_data = get_random_bytes(size)
+
+            encrypted = io.BytesIO()
+            crypto.encrypt_stream(io.BytesIO(original_data), encrypted, chunk_size=4096)
+            encrypted_data = encrypted.getvalue()
+
+            # Must stay readable by the plain IV + AES-CBC code path
+            cipher = AES.new(crypto.key, AES.MODE_CBC, encrypted_data[:16])
+            if unpad(cipher.decrypt(encrypted_data[16:]), AES.block_size) != original_data:
+                print(f"  ✗ Stream encryption failed: Wrong ciphertext for {size} bytes.")
+                return False
+
+            decrypted = io.BytesIO()
+            crypto.decrypt_stream(io.BytesIO(encrypted_data), decrypted, chunk_size=1000)
+            if decrypted.getvalue() != original_data:
+                print(f"  ✗ Stream decryption failed: Wrong plaintext for {size} bytes.")
+                return False
+
+        # Parallel GCM output with a salted key, read back by a handler
+        # created with the defaults
+        crypto = CryptoHandler("test_password")
+        gcm = CryptoHandler("test_password", mode=MODE_GCM, workers=3)
+        for size in (0, 1, 262143, 262144, 262145, 1000000):
+            original_data = get_random_bytes(size)
+
+            encrypted = io.BytesIO()
+            gcm.encrypt_stream(io.BytesIO(original_data), encrypted)
+            decrypted = io.BytesIO()
+            crypto.decrypt_stream(io.BytesIO(encrypted.getvalue()), decrypted)
+            if decrypted.getvalue() != original_data:
+                print(f"  ✗ GCM round trip failed: Wrong plaintext for {size} bytes.")
+                return False
+
+        print("  ✓ Stream round trip passed!")
+        return True
+
+    except Exception as e:
+        print(f"  ✗ Stream round trip failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_key_cache():
+    """Test that repeat derivations hit the key cache and evictions zeroize"""
+    print("\nTesting derived key cache...")
+    try:
+        from key_cache import KeyCache
+
+        calls = []
+        def derive(password, salt, params):
+            calls.append(salt)
+            return bytes(range(32))
+
+        cache = KeyCache(max_entries=2)
+        salt, key = cache.get_for_encryption("pw", ('test',), derive)
+        salt_again, key_again = cache.get_for_encryption("pw", ('test',), derive)
+        cache.get("pw", salt, ('test',), derive)
+        if salt_again != salt or key_again != key or len(calls) != 1:
+            print("  ✗ Key cache failed: Repeat lookups re-ran the KDF.")
+            return False
+
+        stored = next(iter(cache._entries.values()))[0]
+        cache.get("pw", b'other salt 1', ('test',), derive)
+        cache.get("pw", b'other salt 2', ('test',), derive)
+        if any(stored) or cache.stats()['size'] != 2:
+            print("  ✗ Key cache failed: Evicted key was not zeroized.")
+            return False
+
+        if cache.stats()['hits'] != 2 or cache.stats()['misses'] != 3:
+            print(f"  ✗ Key cache failed: Unexpected counters {cache.stats()}.")
+            return False
+
+        print("  ✓ Key cache passed!")
+        return True
+
+    except Exception as e:
+        print(f"  ✗ Key cache failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_image_roundtrip():
+    """Test encrypting a file into a binary image and back"""
+    print("\nTesting image encryption round trip...")
+    try:
+        import tempfile
+        from crypto_handler import CryptoHandler, DENSITY_BINARY, DENSITY_LEVELS
+        from Crypto.Random import get_random_bytes
+
+        original_data = get_random_bytes(4096)
+        crypto = CryptoHandler("test_password")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            input_path = os.path.join(tmp, 'input.bin')
+            with open(input_path, 'wb') as f:
+                f.write(original_data)
+
+            encrypted_path = crypto.encrypt_image(input_path)
+            decrypted_path = crypto.decrypt_image(
+                encrypted_path, os.path.join(tmp, 'output.bin'))
+
+            with open(decrypted_path, 'rb') as f:
+                decrypted_data = f.read()
+
+            if original_data != decrypted_data:
+                print("  ✗ Image round trip failed: Decrypted data does not match original data.")
+                return False
+
+            # Paged mode at every density, frames received in reverse order
+            original_data = get_random_bytes(50000)
+            with open(input_path, 'wb') as f:
+                f.write(original_data)
+
+            for density in (DENSITY_BINARY,) + DENSITY_LEVELS:
+                frames = list(crypto.encrypt_image_frames(input_path, density=density))
+                decrypted_path = crypto.decrypt_image_frames(
+                    reversed(frames), os.path.join(tmp, 'output.bin'))
+
+                with open(decrypted_path, 'rb') as f:
+                    decrypted_data = f.read()
+                if original_data != decrypted_data:
+                    print(f"  ✗ Image round trip failed at density {density}.")
+                    return False
+
+        if original_data == decrypted_data:
+            print("  ✓ Image round trip passed!")
+            return True
+        else:
+            print("  ✗ Image round trip failed: Decrypted data does not match original data.")
+            return False
+
+    except Exception as e:
+        print(f"  ✗ Image round trip failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_modem_profiles():
+    """Test that the decoder follows the profile recorded in the WAV file"""
+    print("\nTesting modem profiles...")
+    try:
+        import io
+        from data_encoder import DataEncoder
+        from data_decoder import DataDecoder
+        from modem_profiles import get_config
+        from Crypto.Random import get_random_bytes
+
+        original_data = get_random_bytes(1024)
+        for profile in ('medium', 'fast'):
+            audio_path = f'profile_{profile}.wav'
+            DataEncoder(profile).encode(original_data, output_path=audio_path)
+
+            decoded = io.BytesIO()
+            result = DataDecoder().decode_to(audio_path, decoded)
+
+            # A fixed, mismatched profile must be refused, not misdecoded
+            try:
+                DataDecoder('robust').decode(audio_path)
+                refused = False
+            except ValueError:
+                refused = True
+            os.remove(audio_path)
+
+            if result.profile != profile or decoded.getvalue() != original_data:
+                print(f"  ✗ Modem profiles failed: '{profile}' round trip mismatch.")
+                return False
+            if not refused:
+                print(f"  ✗ Modem profiles failed: '{profile}' decoded with the wrong profile.")
+                return False
+
+        try:
+            get_config('warp')
+            print("  ✗ Modem profiles failed: Unknown profile accepted.")
+            return False
+        except ValueError:
+            pass
+
+        print("  ✓ Modem profiles passed!")
+        return True
+
+    except Exception as e:
+        print(f"  ✗ Modem profiles failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_multi_lane():
+    """Test striping a payload over several audio channels"""
+    print("\nTesting multi-lane modulation...")
+    try:
+        import io
+        import wave
+        from data_encoder import DataEncoder, STRIPE_SIZE, split_lanes, wav_header
+        from data_decoder import DataDecoder, merge_lanes
+        from Crypto.Random import get_random_bytes
+
+        # Uneven tail, so lanes end up with different lengths
+        original_data = get_random_bytes(5 * STRIPE_SIZE + 77)
+
+        parts = split_lanes(original_data, 3)
+        if b''.join(merge_lanes(parts)) != original_data:
+            print("  ✗ Multi-lane failed: Stripe split/merge mismatch.")
+            return False
+
+        audio_path = 'lanes_output.wav'
+        DataEncoder(lanes=2).encode(original_data, output_path=audio_path)
+        with wave.open(audio_path, 'rb') as wf:
+            channels = wf.getnchannels()
+
+        decoded = io.BytesIO()
+        result = DataDecoder().decode_to(audio_path, decoded)
+        os.remove(audio_path)
+
+        if channels != 2 or result.lanes != 2 or not result.success:
+            print(f"  ✗ Multi-lane failed: Unexpected layout {channels} channels, {result}.")
+            return False
+
+        # Lane layouts from a (possibly forged) metadata chunk are checked
+        config = DataEncoder().config
+        for bad in ({'lanes': 2, 'stripe': 0}, {'lanes': '2'}, {'lanes': 2.0}, {'lanes': 99},
+                    {'lanes': 2, 'stripe': 'x'}, {'profile': ['fast']}):
+            forged = io.BytesIO(wav_header(config, 2, 4000, bad) + bytes(4000))
+            try:
+                DataDecoder().probe(forged)
+                print(f"  ✗ Multi-lane failed: Accepted metadata {bad}.")
+                return False
+            except ValueError:
+                pass
+
+        if decoded.getvalue() == original_data:
+            print("  ✓ Multi-lane passed!")
+            return True
+        else:
+            print("  ✗ Multi-lane failed: Decoded data does not match original data.")
+            return False
+
+    except Exception as e:
+        print(f"  ✗ Multi-lane failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_batch_cli():
+    """Test the batch CLI on inputs whose names collide"""
+    print("\nTesting batch CLI...")
+    try:
+        import tempfile
+        from batch_cli import main as batch_main
+        from Crypto.Random import get_random_bytes
+
+        with tempfile.TemporaryDirectory() as tmp:
+            originals = {}
+            for folder, size in (('a', 1500), ('b', 700)):
+                os.makedirs(os.path.join(tmp, folder))
+                path = os.path.join(tmp, folder, 'data.bin')
+                originals[folder] = get_random_bytes(size)
+                with open(path, 'wb') as f:
+                    f.write(originals[folder])
+
+            audio_dir = os.path.join(tmp, 'audio')
+            decoded_dir = os.path.join(tmp, 'decoded')
+            rc = batch_main(['encode', '-k', 'batch', '-j', '2', '-o', audio_dir,
+                             os.path.join(tmp, 'a'), os.path.join(tmp, 'b', '*.bin')])
+            if rc != 0 or sorted(os.listdir(audio_dir)) != ['data.wav', 'data_1.wav']:
+                print(f"  ✗ Batch CLI failed: Unexpected encode outputs {os.listdir(audio_dir)}.")
+                return False
+
+            rc = batch_main(['decode', '-k', 'batch', '-j', '2', '-o', decoded_dir, audio_dir])
+            with open(os.path.join(decoded_dir, 'decoded_data.bin'), 'rb') as f:
+                first = f.read()
+            with open(os.path.join(decoded_dir, 'decoded_data_1.bin'), 'rb') as f:
+                second = f.read()
+
+        if rc == 0 and first == originals['a'] and second == originals['b']:
+            print("  ✓ Batch CLI passed!")
+            return True
+        else:
+            print("  ✗ Batch CLI failed: Decoded files do not match the originals.")
+            return False
+
+    except Exception as e:
+        print(f"  ✗ Batch CLI failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_fec():
+    """Test Reed-Solomon recovery of a transmission that was cut short"""
+    print("\nTesting forward error correction...")
+    try:
+        import io
+        import struct
+        import zlib
+        from data_encoder import DataEncoder
+        from data_decoder import DataDecoder
+        from fec_codec import fec_encode, fec_decode
+        from Crypto.Random import get_random_bytes
+
+        original_data = get_random_bytes(3000)
+        protected = fec_encode(original_data, nsym=32)
+
+        # Clean trip through the modem
+        audio_path = 'fec_output.wav'
+        DataEncoder().encode(protected, output_path=audio_path)
+        decoded = io.BytesIO()
+        DataDecoder().decode_to(audio_path, decoded)
+        os.remove(audio_path)
+        if fec_decode(decoded.getvalue()) != original_data:
+            print("  ✗ FEC failed: Clean round trip mismatch.")
+            return False
+
+        # amodem stops at the first bad frame: lose the last 10%
+        cut = protected[:len(protected) * 9 // 10]
+        if fec_decode(cut) != original_data:
+            print("  ✗ FEC failed: Lost tail was not restored.")
+            return False
+
+        # A few flipped bytes are corrected too
+        damaged = bytearray(protected)
+        for pos in (40, 1000, 2500):
+            damaged[pos] ^= 0x5A
+        if fec_decode(bytes(damaged)) != original_data:
+            print("  ✗ FEC failed: Byte errors were not corrected.")
+            return False
+
+        # Losing more than the parity covers must fail loudly
+        try:
+            fec_decode(protected[:len(protected) // 2])
+            print("  ✗ FEC failed: Unrecoverable loss was not reported.")
+            return False
+        except ValueError:
+            pass
+
+        # A forged length is refused before buffers are sized from it
+        header = struct.pack('>4sBIQI', b'SXR1', 32, 1, 2 ** 31, 0)
+        forged = header + struct.pack('>I', zlib.crc32(header)) + bytes(100)
+        try:
+            fec_decode(forged)
+            print("  ✗ FEC failed: Forged payload length was accepted.")
+            return False
+        except ValueError as e:
+            if 'received' not in str(e):
+                print(f"  ✗ FEC failed: Forged length not caught up front ({e}).")
+                return False
+
+        print("  ✓ FEC passed!")
+        return True
+
+    except Exception as e:
+        print(f"  ✗ FEC failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_compression():
+    """Test the compression stage ahead of encryption"""
+    print("\nTesting compression before encryption...")
+    try:
+        import io
+        import tempfile
+        from batch_cli import main as batch_main
+        from crypto_handler import CryptoHandler, MODE_CBC, MODE_GCM, KDF_SHA256
+        from compression import COMPRESS_AUTO, CODEC_NONE, CODEC_IDS
+        from Crypto.Random import get_random_bytes
+
+        text = b"".join(b"line %d of a very repetitive log file\n" % i for i in range(20000))
+        png = b'\x89PNG\r\n\x1a\n' + text  # claims to be compressed already
+
+        cases = [(codec, text) for codec in CODEC_IDS]
+        cases += [(COMPRESS_AUTO, text), (COMPRESS_AUTO, png), (COMPRESS_AUTO, get_random_bytes(50000))]
+        for compression, original_data in cases:
+            for mode, kdf in ((MODE_CBC, KDF_SHA256), (MODE_GCM, None)):
+                options = {'kdf': kdf} if kdf else {}
+                crypto = CryptoHandler("compress", mode=mode, compression=compression, **options)
+                encrypted = io.BytesIO()
+                crypto.encrypt_stream(io.BytesIO(original_data), encrypted)
+                encrypted.seek(0)
+
+                decrypted = io.BytesIO()
+                CryptoHandler("compress").decrypt_stream(encrypted, decrypted, chunk_size=4096)
+                if decrypted.getvalue() != original_data:
+                    print(f"  ✗ Compression failed: {compression}/{mode} round trip mismatch.")
+                    return False
+
+                stats = crypto.compression_stats
+                expect_none = compression == CODEC_NONE or original_data is not text
+                if (stats.codec == CODEC_NONE) != expect_none:
+                    print(f"  ✗ Compression failed: {compression} picked {stats.codec}.")
+                    return False
+                if not expect_none and len(encrypted.getvalue()) > len(original_data) // 4:
+                    print(f"  ✗ Compression failed: {stats.codec} saved too little.")
+                    return False
+
+        # Without a key there is nothing to compress into: refuse the option
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "log.txt")
+            with open(path, 'wb') as f:
+                f.write(text)
+            if batch_main(['encode', '--compress', 'zlib', '-o', tmp, path]) != 2:
+                print("  ✗ Compression failed: --compress without a key was accepted.")
+                return False
+
+        print("  ✓ Compression passed!")
+        return True
+
+    except Exception as e:
+        print(f"  ✗ Compression failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_transport():
+    """Test chunk framing, partial reception and re-sending missing chunks"""
+    print("\nTesting chunked transport...")
+    try:
+        import io
+        import tempfile
+        import struct
+        import threading
+        import zlib
+        from transport import (ChunkStore, frame_transfer, iter_chunks, format_ranges, parse_ranges,
+                               CHUNK_MAGIC, MAX_CHUNKS)
+
+        original_data = bytes(range(256)) * 40  # 5 chunks of 2048 bytes
+        with tempfile.TemporaryDirectory() as tmp:
+            outbox = ChunkStore(os.path.join(tmp, 'outbox'))
+            store = ChunkStore(os.path.join(tmp, 'transfers'))
+            transfer_id = outbox.save_outgoing(original_data)
+            _, framed = frame_transfer(original_data, transfer_id=transfer_id)
+
+            # Corrupt chunk 2 and cut the stream off inside chunk 4
+            chunk = len(framed) // 5
+            received = bytearray(framed[:chunk * 4 + 100])
+            received[chunk * 2 + 50] ^= 0xFF
+            if len(list(iter_chunks(received))) != 3:
+                print("  ✗ Transport failed: damaged chunks were not skipped.")
+                return False
+
+            store.add(received)
+            missing = store.missing(transfer_id)
+            if format_ranges(missing) != '2,4' or parse_ranges('2,4') != missing:
+                print(f"  ✗ Transport failed: expected chunks 2,4 missing, got {missing}.")
+                return False
+
+            store.add(outbox.frame_resend(transfer_id, missing))
+            assembled = io.BytesIO()
+            store.assemble(transfer_id, assembled)
+            if assembled.getvalue() != original_data:
+                print("  ✗ Transport failed: reassembled payload mismatch.")
+                return False
+
+            # Chunks of another payload sharing the ID and chunk count are caught
+            other_data = bytes(reversed(original_data))
+            _, other = frame_transfer(other_data, transfer_id=transfer_id)
+            mixed = ChunkStore(os.path.join(tmp, 'mixed'))
+            mixed.add(framed[:chunk * 2] + other[chunk * 2:])
+            try:
+                mixed.assemble(transfer_id, io.BytesIO())
+                print("  ✗ Transport failed: assembled chunks of two payloads.")
+                return False
+            except ValueError:
+                pass
+
+            # A well-formed chunk claiming billions of siblings is refused
+            header = struct.pack('>4sIIII', CHUNK_MAGIC, 0xBAD, 0, 0xFFFFFFFF, 4) + b"evil"
+            forged = header + struct.pack('>I', zlib.crc32(header))
+            if list(iter_chunks(forged)) or store.add(forged):
+                print(f"  ✗ Transport failed: accepted a chunk count above {MAX_CHUNKS}.")
+                return False
+
+            # Concurrent writers of the same chunks must not trip over each other
+            errors = []
+
+            def add():
+                try:
+                    ChunkStore(os.path.join(tmp, 'race')).add(framed)
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=add) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            if errors or not ChunkStore(os.path.join(tmp, 'race')).is_complete(transfer_id):
+                print(f"  ✗ Transport failed: concurrent adds failed ({errors}).")
+                return False
+
+        print("  ✓ Transport passed!")
+        return True
+
+    except Exception as e:
+        print(f"  ✗ Transport failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_live_stream():
+    """Test demodulating samples while they are still being fed in"""
+    print("\nTesting live receive...")
+    try:
+        import io
+        import threading
+        from data_encoder import DataEncoder
+        from data_decoder import DataDecoder, LiveStream
+
+        original_data = bytes(range(256)) * 20
+        samples = b"".join(DataEncoder().encode_iter(original_data))
+        silence = bytes(16000)
+
+        # Play the "microphone" blocks in from another thread, with a long
+        # tail of silence the decoder should not wait for
+        live = LiveStream()
+        def microphone():
+            audio = silence + samples + silence * 50
+            for i in range(0, len(audio), 2048):
+                live.feed(audio[i:i + 2048])
+            live.close()
+        threading.Thread(target=microphone, daemon=True).start()
+
+        updates = []
+        decoded = io.BytesIO()
+        result = DataDecoder().decode_stream(live, decoded, progress=updates.append)
+        if not result.success or decoded.getvalue() != original_data:
+            print("  ✗ Live receive failed: decoded data mismatch.")
+            return False
+        if not updates or updates[-1] != len(original_data):
+            print("  ✗ Live receive failed: no progress reported.")
+            return False
+        if result.bytes_in >= len(silence + samples + silence * 50):
+            print("  ✗ Live receive failed: waited for the end of the stream.")
+            return False
+
+        print("  ✓ Live receive passed!")
+        return True
+
+    except Exception as e:
+        print(f"  ✗ Live receive failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_transmit_stream():
+    """Test playing audio while it is modulated, with an optional WAV tee"""
+    print("\nTesting streaming transmit...")
+    try:
+        import tempfile
+        from data_encoder import DataEncoder
+        from data_decoder import DataDecoder
+
+        original_data = bytes(range(256)) * 30
+        with tempfile.TemporaryDirectory() as tmp:
+            for lanes in (1, 2):
+                encoder = DataEncoder(lanes=lanes)
+                played = []
+                encoder.transmit(original_data, played.append)
+
+                tee_path = os.path.join(tmp, f"tee_{lanes}.wav")
+                teed = []
+                encoder.transmit(original_data, teed.append, tee_path=tee_path)
+                if b"".join(teed) != b"".join(played):
+                    print("  ✗ Streaming transmit failed: tee changed the audio.")
+                    return False
+                if DataDecoder().decode(tee_path) != original_data:
+                    print(f"  ✗ Streaming transmit failed: {lanes}-lane tee did not decode.")
+                    return False
+
+        print("  ✓ Streaming transmit passed!")
+        return True
+
+    except Exception as e:
+        print(f"  ✗ Streaming transmit failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_carrier_detect():
+    """Test carrier detection on recordings with leading and trailing silence"""
+    print("\nTesting carrier detection...")
+    try:
+        import io
+        import tempfile
+        import numpy as np
+        from data_encoder import DataEncoder, wav_header
+        from data_decoder import DataDecoder, read_wav_header
+        from carrier_detect import CarrierDetector
+
+        rng = np.random.default_rng(7)
+        original_data = bytes(range(256)) * 4
+        encoder = DataEncoder()
+        config = encoder.config
+        signal = np.frombuffer(b"".join(encoder.encode_iter(original_data)), dtype='<i2')
+
+        def noise(seconds, level):
+            return rng.normal(0, level, int(seconds * config.Fs)).astype('<i2')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # Synthetic recording: 3 s of hiss, the transmission, 5 s of hiss
+            path = os.path.join(tmp, "recording.wav")
+            audio = np.concatenate([noise(3, 300), signal + noise(len(signal) / config.Fs, 100), noise(5, 300)])
+            with open(path, 'wb') as f:
+                f.write(wav_header(config, 1, audio.nbytes))
+                f.write(audio.tobytes())
+
+            detector = CarrierDetector(config)
+            kept = []
+            with open(path, 'rb') as f:
+                info = read_wav_header(f)
+                for _ in range(0, info.data_size, 2048):
+                    kept.append(detector.feed(f.read(2048)))
+                    if detector.finished:
+                        break
+            kept = b"".join(kept)
+
+            if not detector.finished:
+                print("  ✗ Carrier detection failed: the end of the carrier was missed.")
+                return False
+            if len(kept) >= audio.nbytes - 4 * config.Fs * 2:
+                print("  ✗ Carrier detection failed: silence was kept.")
+                return False
+            decoded = io.BytesIO()
+            DataDecoder().decode_stream(io.BytesIO(kept), decoded)
+            if decoded.getvalue() != original_data:
+                print("  ✗ Carrier detection failed: kept audio does not decode.")
+                return False
+
+        # Hiss alone must never start a recording
+        detector = CarrierDetector(config)
+        hiss = noise(10, 3000).tobytes()
+        for i in range(0, len(hiss), 2048):
+            detector.feed(hiss[i:i + 2048])
+        if detector.state != 'idle':
+            print("  ✗ Carrier detection failed: noise triggered the detector.")
+            return False
+
+        print("  ✓ Carrier detection passed!")
+        return True
+
+    except Exception as e:
+        print(f"  ✗ Carrier detection failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_format_normalization():
+    """Test decoding recordings at other rates, widths and channel counts"""
+    print("\nTesting input format normalization...")
+    try:
+        import io
+        import struct
+        import tempfile
+        import numpy as np
+        from scipy.signal import resample_poly
+        from data_encoder import DataEncoder
+        from data_decoder import DataDecoder
+        from audio_normalize import PolyphaseResampler
+
+        # The streaming resampler must match scipy's one-shot version
+        x = np.random.default_rng(3).normal(size=(20011, 2))
+        resampler = PolyphaseResampler(44100, 32000, channels=2)
+        blocks = [resampler.process(x[i:i + 4097]) for i in range(0, len(x), 4097)]
+        streamed = np.concatenate(blocks + [resampler.flush()])
+        expected = resample_poly(x, 320, 441, axis=0)
+        if streamed.shape != expected.shape or np.abs(streamed - expected).max() > 1e-9:
+            print("  ✗ Format normalization failed: streaming resampler mismatch.")
+            return False
+
+        original_data = bytes(range(256)) * 12
+        signal = np.frombuffer(b"".join(DataEncoder().encode_iter(original_data)), dtype='<i2') / 32768
+
+        def write_wav(path, rate, format_tag, width, channels):
+            g = np.gcd(rate, 32000)
+            audio = np.repeat(resample_poly(signal, rate // g, 32000 // g)[:, None], channels, axis=1)
+            if format_tag == 3:
+                raw = audio.astype(f'<f{width}').tobytes()
+            elif width == 3:
+                ints = np.round(audio * (1 << 23)).astype('<i4').reshape(-1)
+                raw = ints.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+            else:
+                raw = np.round(audio * 32767).astype('<i2').tobytes()
+            block_align = channels * width
+            with open(path, 'wb') as f:
+                f.write(struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + len(raw), b'WAVE',
+                                    b'fmt ', 16, format_tag, channels, rate, rate * block_align,
+                                    block_align, 8 * width, b'data', len(raw)))
+                f.write(raw)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "field.wav")
+            for rate, format_tag, width, channels in ((44100, 1, 3, 2), (48000, 3, 4, 1), (44100, 1, 2, 2)):
+                write_wav(path, rate, format_tag, width, channels)
+                decoded = io.BytesIO()
+                result = DataDecoder().decode_to(path, decoded)
+                if not result.success or decoded.getvalue() != original_data:
+                    print(f"  ✗ Format normalization failed: {rate} Hz, {8 * width}-bit, "
+                          f"{channels} channel(s).")
+                    return False
+
+        print("  ✓ Format normalization passed!")
+        return True
+
+    except Exception as e:
+        print(f"  ✗ Format normalization failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_windowed_decode():
+    """Test decoding a window of a long recording through a memory map"""
+    print("\nTesting windowed decoding...")
+    try:
+        import io
+        import tempfile
+        from data_encoder import DataEncoder, wav_header
+        from data_decoder import DataDecoder
+
+        first, second = bytes(range(256)) * 3, bytes(range(255, -1, -1)) * 5
+        encoder = DataEncoder()
+        config = encoder.config
+        gap = bytes(int(config.Fs) * 10 * config.sample_size)  # 10 s of silence
+        samples = [b"".join(encoder.encode_iter(first)), gap, b"".join(encoder.encode_iter(second))]
+        second_start = (len(samples[0]) + len(gap)) / config.sample_size / config.Fs
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "capture.wav")
+            with open(path, 'wb') as f:
+                f.write(wav_header(config, 1, sum(map(len, samples))))
+                for part in samples:
+                    f.write(part)
+
+            decoded = io.BytesIO()
+            result = DataDecoder().decode_to(path, decoded, offset=second_start - 0.2, length=5)
+            if decoded.getvalue() != second or abs(result.offset - (second_start - 0.2)) > 1e-3:
+                print("  ✗ Windowed decoding failed: second transmission not found in its window.")
+                return False
+            if result.audio_seconds > 5.01:
+                print("  ✗ Windowed decoding failed: read past the window.")
+                return False
+            if DataDecoder().decode(path) != first:
+                print("  ✗ Windowed decoding failed: whole-file decode changed.")
+                return False
+
+        print("  ✓ Windowed decoding passed!")
+        return True
+
+    except Exception as e:
+        print(f"  ✗ Windowed decoding failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_burst_scanner():
+    """Test finding and decoding several transmissions in one recording"""
+    print("\nTesting burst scanner...")
+    try:
+        import tempfile
+        import numpy as np
+        from data_encoder import DataEncoder, wav_header
+        from burst_scanner import scan_recording
+
+        rng = np.random.default_rng(11)
+        encoder = DataEncoder()
+        config = encoder.config
+        payloads = [bytes([n]) * size for n, size in ((1, 1500), (2, 4000), (3, 700))]
+
+        parts, starts, position = [], [], 0
+        for payload in payloads:
+            hiss = rng.normal(0, 200, int(rng.uniform(1, 3) * config.Fs)).astype('<i2').tobytes()
+            starts.append((position + len(hiss)) / config.sample_size / config.Fs)
+            signal = b"".join(encoder.encode_iter(payload))
+            parts += [hiss, signal]
+            position += len(hiss) + len(signal)
+        parts.append(bytes(int(config.Fs)))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "monitor.wav")
+            with open(path, 'wb') as f:
+                f.write(wav_header(config, 1, sum(map(len, parts))))
+                for part in parts:
+                    f.write(part)
+            bursts = scan_recording(path, workers=2)
+
+        if len(bursts) != len(payloads):
+            print(f"  ✗ Burst scanner failed: found {len(bursts)} of {len(payloads)} transmissions.")
+            return False
+        for burst, payload, start in zip(bursts, payloads, starts):
+            if not burst.success or burst.payload != payload:
+                print(f"  ✗ Burst scanner failed: burst at {burst.offset:.2f} s did not decode.")
+                return False
+            if not start - 1.0 < burst.offset <= start:
+                print(f"  ✗ Burst scanner failed: burst at {burst.offset:.2f} s, expected {start:.2f} s.")
+                return False
+
+        print("  ✓ Burst scanner passed!")
+        return True
+
+    except Exception as e:
+        print(f"  ✗ Burst scanner failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_pipeline_bench():
+    """Test one benchmark case and the baseline comparison"""
+    print("\nTesting pipeline benchmark...")
+    try:
+        from bench_pipeline import run_case, compare, format_case, parse_size
+
+        case = run_case(parse_size('1K'), 'gcm', 'default')
+        if not case['ok'] or set(case['stages']) != {'read', 'encrypt', 'modulate', 'demodulate', 'decrypt'}:
+            print("  ✗ Pipeline benchmark failed: round trip or stage timings missing.")
+            return False
+        rss = case['peak_rss_mb']  # None on Windows, which has no resource module
+        if case['audio_seconds_per_byte'] <= 0 or (rss is not None and rss <= 0):
+            print("  ✗ Pipeline benchmark failed: audio time or RSS not measured.")
+            return False
+        if not format_case(dict(case, peak_rss_mb=None)).endswith("n/a"):
+            print("  ✗ Pipeline benchmark failed: missing RSS (Windows) not shown as n/a.")
+            return False
+
+        baseline = dict(case, stages=dict(case['stages'], demodulate={'seconds': 0.1, 'bytes': 0}),
+                        total_seconds=100.0)
+        slower = dict(case, stages=dict(case['stages'], demodulate={'seconds': 0.2, 'bytes': 0}))
+        regressions = compare([slower], [baseline], tolerance=0.25)
+        if [stage for _, stage, _, _ in regressions] != ['demodulate']:
+            print(f"  ✗ Pipeline benchmark failed: expected one demodulate slowdown, got {regressions}.")
+            return False
+        if compare([baseline], [baseline]):
+            print("  ✗ Pipeline benchmark failed: identical runs flagged.")
+            return False
+
+        print("  ✓ Pipeline benchmark passed!")
+        return True
+
+    except Exception as e:
+        print(f"  ✗ Pipeline benchmark failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_stage_timer():
+    """Test per-stage timing and the profiling switch"""
+    print("\nTesting stage timer...")
+    try:
+        import io
+        import tempfile
+        import time
+        from stage_timer import StageTimer, profiled, format_timings, PROFILE_ENV
+        from data_encoder import DataEncoder
+
+        timer = StageTimer()
+        with timer.stage('encrypt') as stage:
+            reader = timer.reader(io.BytesIO(bytes(3000)))
+            stage.bytes = len(reader.read())
+            time.sleep(0.05)
+        DataEncoder().encode(bytes(3000), io.BytesIO(), timer=timer)
+
+        stages = {stage.name: stage for stage in timer.stages}
+        if list(stages) != ['encrypt', 'read', 'modulate', 'write']:
+            print(f"  ✗ Stage timer failed: unexpected stages {list(stages)}.")
+            return False
+        if stages['read'].bytes != 3000 or stages['modulate'].bytes == 0 or stages['write'].bytes == 0:
+            print("  ✗ Stage timer failed: byte counts missing.")
+            return False
+        if not 0.05 <= stages['encrypt'].seconds < 0.5:
+            print(f"  ✗ Stage timer failed: encrypt took {stages['encrypt'].seconds:.3f} s.")
+            return False
+        if abs(timer.as_dict()['total_seconds'] - timer.total) > 1e-3 or 'modulate' not in format_timings(timer.as_dict()):
+            print("  ✗ Stage timer failed: report does not match.")
+            return False
+
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ[PROFILE_ENV] = tmp
+            try:
+                with profiled('test') as path:
+                    sum(range(1000))
+            finally:
+                del os.environ[PROFILE_ENV]
+            if not path or not os.path.exists(path):
+                print("  ✗ Stage timer failed: no profile written.")
+                return False
+        with profiled('test') as path:
+            if path is not None:
+                print("  ✗ Stage timer failed: profiling ran without the switch.")
+                return False
+
+        print("  ✓ Stage timer passed!")
+        return True
+
+    except Exception as e:
+        print(f"  ✗ Stage timer failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_job_queue():
+    """Test background jobs, their states and admission control"""
+    print("\nTesting job queue...")
+    try:
+        import time
+        from jobs import JobQueue, QueueFull, DONE, FAILED
+        from transport import format_ranges
+
+        queue = JobQueue(workers=1, limit=2)
+        try:
+            slow = queue.submit('sleep', time.sleep, 0.5)
+            quick = queue.submit('ranges', format_ranges, [1, 2, 3, 7])
+            try:
+                queue.submit('sleep', time.sleep, 0)
+                print("  ✗ Job queue failed: a third job was admitted over the limit.")
+                return False
+            except QueueFull:
+                pass
+
+            states, version = [], None
+            while not states or states[-1] not in (DONE, FAILED):
+                status, version = queue.wait(quick.id, version, timeout=30)
+                states.append(status['state'])
+            if states[-1] != DONE or status['result'] != '1-3,7':
+                print(f"  ✗ Job queue failed: job ended as {status}.")
+                return False
+            if queue.get(slow.id).state != DONE or status['queued_seconds'] < 0.4:
+                print("  ✗ Job queue failed: jobs did not run in order on one worker.")
+                return False
+
+            failing = queue.submit('int', int, 'not a number')
+            status, _ = queue.wait(failing.id, None, timeout=30)
+            while status['state'] not in (DONE, FAILED):
+                status, _ = queue.wait(failing.id, queue.get(failing.id).version, timeout=30)
+            if status['state'] != FAILED or 'invalid literal' not in status['error']:
+                print(f"  ✗ Job queue failed: error not reported ({status}).")
+                return False
+
+            # A worker that dies fails its job, and the next jobs get a fresh pool
+            def finish(job):
+                status, version = queue.wait(job.id, None, timeout=30)
+                while status['state'] not in (DONE, FAILED):
+                    status, version = queue.wait(job.id, version, timeout=30)
+                return status
+
+            status = finish(queue.submit('exit', os._exit, 3))
+            if status['state'] != FAILED or 'died' not in status['error']:
+                print(f"  ✗ Job queue failed: dead worker not reported ({status}).")
+                return False
+            for _ in range(3):
+                status = finish(queue.submit('ranges', format_ranges, [4]))
+                if status['state'] != DONE or status['result'] != '4':
+                    print(f"  ✗ Job queue failed: no recovery from a dead worker ({status}).")
+                    return False
+
+            # Work run outside the pool counts against the same limit
+            with queue.slot(), queue.slot():
+                try:
+                    queue.submit('sleep', time.sleep, 0)
+                    print("  ✗ Job queue failed: a job was admitted past inline slots.")
+                    return False
+                except QueueFull:
+                    pass
+            if queue.active():
+                print("  ✗ Job queue failed: slots or rejected jobs still counted.")
+                return False
+        finally:
+            queue.shutdown()
+
+        print("  ✓ Job queue passed!")
+        return True
+
+    except Exception as e:
+        print(f"  ✗ Job queue failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_in_memory_pipeline():
+    """Test encrypting, modulating and decoding without any files"""
+    print("\nTesting in-memory pipeline...")
+    try:
+        import io
+        from crypto_handler import CryptoHandler, MODE_GCM
+        from data_encoder import DataEncoder
+        from data_decoder import DataDecoder, map_samples
+
+        data = b"kept in memory " * 300
+        ciphertext = CryptoHandler("memory", mode=MODE_GCM).encrypt_reader(io.BytesIO(data))
+        audio = io.BytesIO()
+        DataEncoder().encode(ciphertext, output_path=audio)
+
+        decoder = DataDecoder()
+        info, profile, metadata = decoder.probe(audio)
+        if info.data_size != len(audio.getbuffer()) - info.data_offset or profile != metadata['profile']:
+            print("  ✗ In-memory pipeline failed: probe misread the WAV buffer.")
+            return False
+        if map_samples(audio, info)[1].flags.writeable:
+            print("  ✗ In-memory pipeline failed: mapped samples are writable.")
+            return False
+
+        decoded = io.BytesIO()
+        result = decoder.decode_to(audio, decoded)
+        decoded.seek(0)
+        plaintext = io.BytesIO()
+        CryptoHandler("memory").decrypt_stream(decoded, plaintext)
+        if not result.success or plaintext.getvalue() != data:
+            print("  ✗ In-memory pipeline failed: payload changed.")
+            return False
+
+        print("  ✓ In-memory pipeline passed!")
+        return True
+
+    except Exception as e:
+        print(f"  ✗ In-memory pipeline failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_decode_cache():
+    """Test the on-disk cache of demodulated payloads"""
+    print("\nTesting decode cache...")
+    try:
+        import io
+        import tempfile
+        import threading
+        import time
+        from data_decoder import DecodeResult
+        from decode_cache import DecodeCache, audio_digest
+
+        audio = io.BytesIO(b"RIFF" + bytes(range(256)) * 4)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "capture.wav")
+            with open(path, 'wb') as f:
+                f.write(audio.getvalue())
+            if audio_digest(path) != audio_digest(audio):
+                print("  ✗ Decode cache failed: file and buffer digests differ.")
+                return False
+
+            cache = DecodeCache(os.path.join(tmp, "cache"), max_bytes=2500)
+            if cache.get(audio_digest(audio)) is not None:
+                print("  ✗ Decode cache failed: hit in an empty cache.")
+                return False
+
+            payloads = {name: bytes([i]) * 1000 for i, name in enumerate(("a", "b", "c"))}
+            cache.put("a", payloads["a"], DecodeResult(True, bytes_out=1000, profile='fast'))
+            time.sleep(0.05)
+            cache.put("b", payloads["b"], DecodeResult(True, bytes_out=1000))
+            time.sleep(0.05)
+            payload, result = cache.get("a")  # a is now more recent than b
+            if payload != payloads["a"] or result.profile != 'fast' or not result.success:
+                print("  ✗ Decode cache failed: entry changed.")
+                return False
+
+            time.sleep(0.05)
+            cache.put("c", payloads["c"], DecodeResult(True, bytes_out=1000))
+            if cache.get("b") is not None or cache.get("a") is None or cache.get("c") is None:
+                print("  ✗ Decode cache failed: did not evict the least recently used entry.")
+                return False
+            usage = cache.usage()
+            if usage['entries'] != 2 or usage['bytes'] > 2500:
+                print(f"  ✗ Decode cache failed: over its limit ({usage}).")
+                return False
+
+            cache.put("d", bytes(5000), DecodeResult(True, bytes_out=5000))
+            if cache.get("d") is not None:
+                print("  ✗ Decode cache failed: stored a payload larger than the cache.")
+                return False
+
+            # Threads of one server storing the same recording at once
+            errors = []
+
+            def put():
+                try:
+                    if not cache.put("e", payloads["a"], DecodeResult(True, bytes_out=1000)):
+                        errors.append("not stored")
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=put) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            if errors or cache.get("e")[0] != payloads["a"]:
+                print(f"  ✗ Decode cache failed: concurrent puts failed ({errors}).")
+                return False
+
+            # A cache that cannot be written is skipped, not an error
+            unwritable = DecodeCache(path)  # a file, not a directory
+            if unwritable.put("a", payloads["a"], DecodeResult(True, bytes_out=1000)) \
+                    or unwritable.get("a") is not None:
+                print("  ✗ Decode cache failed: unwritable cache not skipped.")
+                return False
+
+        print("  ✓ Decode cache passed!")
+        return True
+
+    except Exception as e:
+        print(f"  ✗ Decode cache failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
 def main():
     """Run all tests"""
     print("="*60)
@@ -101,7 +1261,28 @@ def main():
 
     tests = [
         test_imports,
-        test_end_to_end
+        test_end_to_end,
+        test_streaming_encoder,
+        test_stream_roundtrip,
+        test_key_cache,
+        test_image_roundtrip,
+        test_modem_profiles,
+        test_multi_lane,
+        test_batch_cli,
+        test_fec,
+        test_compression,
+        test_transport,
+        test_live_stream,
+        test_transmit_stream,
+        test_carrier_detect,
+        test_format_normalization,
+        test_windowed_decode,
+        test_burst_scanner,
+        test_pipeline_bench,
+        test_stage_timer,
+        test_job_queue,
+        test_in_memory_pipeline,
+        test_decode_cache
     ]
 
     results = []
@@ -0,0 +1,318 @@
+"""
+Transport Framing Module
+Splits a payload into CRC-checked chunks that can be received over several
+recordings and reassembled from a local store
+
+Every chunk carries the transfer ID, its index and the chunk count, so
+chunks are self-describing: the receiver keeps whatever arrived intact,
+reports the missing indices, and the sender re-sends only those.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import zlib
+
+CHUNK_MAGIC = b'SXT1'
+
+# Payload bytes per chunk (about a third of a second at 48 kbps)
+CHUNK_SIZE = 2048
+
+# Chunks per transfer (128 MiB at the default chunk size). The CRC does
+# not authenticate the header, so received counts above this are refused
+# rather than trusted to size the store's bookkeeping.
+MAX_CHUNKS = 65536
+
+# magic, transfer ID, chunk index, chunk count, payload length, CRC32 of
+# the preceding header fields and the payload
+_CHUNK_HEADER = struct.Struct('>4sIIII')
+_CRC = struct.Struct('>I')
+CHUNK_OVERHEAD = _CHUNK_HEADER.size + _CRC.size
+
+# Received chunks, and copies of sent payloads kept for re-sends
+DEFAULT_STORE = 'transfers'
+DEFAULT_OUTBOX = 'outbox'
+
+
+def transfer_id_for(data):
+    """Transfer ID derived from the payload, so re-sends reuse it"""
+    return int.from_bytes(hashlib.sha256(data).digest()[:4], 'big')
+
+
+def frame_transfer(data, chunk_size=CHUNK_SIZE, transfer_id=None, indices=None):
+    """
+    Split data into framed chunks
+
+    Args:
+        data: Payload bytes (usually ciphertext)
+        chunk_size: Payload bytes per chunk
+        transfer_id: 32-bit ID (default: derived from data)
+        indices: Only frame these chunk indices (for re-sends)
+
+    Returns:
+        Tuple of (transfer ID, framed bytes)
+    """
+    if transfer_id is None:
+        transfer_id = transfer_id_for(data)
+    count = max(1, -(-len(data) // chunk_size))
+    if count > MAX_CHUNKS:
+        raise ValueError(f"Payload needs {count} chunks, at most {MAX_CHUNKS} are allowed")
+    if indices is None:
+        indices = range(count)
+
+    view = memoryview(data)
+    out = bytearray()
+    for index in indices:
+        if not 0 <= index < count:
+            raise ValueError(f"Chunk {index} out of range (transfer has {count} chunks)")
+        out += _pack_chunk(transfer_id, index, count, view[index * chunk_size:(index + 1) * chunk_size])
+    return transfer_id, bytes(out)
+
+
+def is_framed(data):
+    """Return True if data starts with a transport chunk"""
+    return bytes(data[:len(CHUNK_MAGIC)]) == CHUNK_MAGIC
+
+
+def iter_chunks(data):
+    """
+    Find the intact chunks in a received byte stream
+
+    Chunks that fail their CRC, are cut short or claim more than
+    MAX_CHUNKS chunks are skipped, and parsing resynchronises on the next
+    chunk magic.
+
+    Args:
+        data: Received bytes
+
+    Yields:
+        Tuples of (transfer ID, index, count, payload bytes)
+    """
+    data = bytes(data)
+    pos = 0
+    while True:
+        pos = data.find(CHUNK_MAGIC, pos)
+        if pos < 0 or pos + CHUNK_OVERHEAD > len(data):
+            return
+
+        _, transfer_id, index, count, length = _CHUNK_HEADER.unpack_from(data, pos)
+        end = pos + _CHUNK_HEADER.size + length
+        if index < count <= MAX_CHUNKS and end + _CRC.size <= len(data):
+            (crc,) = _CRC.unpack_from(data, end)
+            if zlib.crc32(data[pos:end]) == crc:
+                yield transfer_id, index, count, data[pos + _CHUNK_HEADER.size:end]
+                pos = end + _CRC.size
+                continue
+        pos += 1
+
+
+def format_ranges(indices):
+    """Format chunk indices compactly, e.g. [1, 2, 3, 7] -> '1-3,7'"""
+    parts = []
+    indices = sorted(indices)
+    i = 0
+    while i < len(indices):
+        j = i
+        while j + 1 < len(indices) and indices[j + 1] == indices[j] + 1:
+            j += 1
+        parts.append(str(indices[i]) if i == j else f"{indices[i]}-{indices[j]}")
+        i = j + 1
+    return ','.join(parts)
+
+
+def parse_ranges(text):
+    """Parse the output of format_ranges back into a sorted list"""
+    indices = set()
+    for part in text.replace(' ', '').split(','):
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        try:
+            first = int(first)
+            last = int(last) if last else first
+        except ValueError:
+            raise ValueError(f"Invalid chunk range: {part}")
+        if first < 0 or last < first:
+            raise ValueError(f"Invalid chunk range: {part}")
+        indices.update(range(first, last + 1))
+    return sorted(indices)
+
+
+class ChunkStore:
+    """On-disk store of received (and sent) chunks, one directory per transfer"""
+
+    def __init__(self, root=DEFAULT_STORE):
+        """
+        Args:
+            root: Directory holding the transfers
+        """
+        self.root = root
+
+    def add(self, data):
+        """
+        Persist every intact chunk found in received bytes
+
+        Args:
+            data: Bytes from the demodulator
+
+        Returns:
+            Dictionary of transfer ID -> number of new chunks stored
+        """
+        added = {}
+        for transfer_id, index, count, payload in iter_chunks(data):
+            if not self._ensure_transfer(transfer_id, count):
+                continue  # count disagrees with earlier chunks: ignore
+            added.setdefault(transfer_id, 0)
+            path = self._chunk_path(transfer_id, index)
+            if not os.path.exists(path):
+                write_atomic(path, payload)
+                added[transfer_id] += 1
+        return added
+
+    def save_outgoing(self, data, chunk_size=CHUNK_SIZE):
+        """
+        Keep a payload about to be sent, so missing chunks can be re-sent
+
+        Returns:
+            Transfer ID
+        """
+        transfer_id, framed = frame_transfer(data, chunk_size)
+        self.add(framed)
+        meta = self._read_meta(transfer_id)
+        meta['chunk_size'] = chunk_size
+        write_atomic(self._meta_path(transfer_id), json.dumps(meta).encode('utf-8'))
+        return transfer_id
+
+    def frame_resend(self, transfer_id, indices=None):
+        """
+        Frame stored chunks of a transfer again (for re-sending)
+
+        Args:
+            transfer_id: Transfer ID
+            indices: Chunk indices to send (default: all)
+
+        Returns:
+            Framed bytes
+        """
+        meta = self._read_meta(transfer_id)
+        if not meta:
+            raise ValueError(f"Unknown transfer {transfer_id:08x}")
+        count = meta['count']
+        out = bytearray()
+        for index in (range(count) if indices is None else indices):
+            if not 0 <= index < count:
+                raise ValueError(f"Chunk {index} out of range (transfer has {count} chunks)")
+            with open(self._chunk_path(transfer_id, index), 'rb') as f:
+                out += _pack_chunk(transfer_id, index, count, f.read())
+        return bytes(out)
+
+    def status(self, transfer_id):
+        """
+        Get the progress of a transfer
+
+        Returns:
+            Dictionary with count, received and missing (list of indices)
+        """
+        meta = self._read_meta(transfer_id)
+        if not meta:
+            raise ValueError(f"Unknown transfer {transfer_id:08x}")
+        missing = [i for i in range(meta['count'])
+                   if not os.path.exists(self._chunk_path(transfer_id, i))]
+        return {
+            'transfer_id': f"{transfer_id:08x}",
+            'count': meta['count'],
+            'received': meta['count'] - len(missing),
+            'missing': missing,
+        }
+
+    def missing(self, transfer_id):
+        """Indices of the chunks not received yet"""
+        return self.status(transfer_id)['missing']
+
+    def is_complete(self, transfer_id):
+        return not self.missing(transfer_id)
+
+    def assemble(self, transfer_id, dst):
+        """
+        Write the reassembled payload of a complete transfer to dst
+
+        The transfer ID is derived from the payload, so the result is
+        checked against it. This catches chunks of two payloads whose IDs
+        and chunk counts collide; dst already holds the bytes when that
+        ValueError is raised.
+
+        Returns:
+            Number of bytes written
+        """
+        missing = self.missing(transfer_id)
+        if missing:
+            raise ValueError(f"Transfer {transfer_id:08x} is missing chunks {format_ranges(missing)}")
+        written = 0
+        digest = hashlib.sha256()
+        for index in range(self._read_meta(transfer_id)['count']):
+            with open(self._chunk_path(transfer_id, index), 'rb') as f:
+                data = f.read()
+            dst.write(data)
+            digest.update(data)
+            written += len(data)
+        if int.from_bytes(digest.digest()[:4], 'big') != transfer_id:
+            raise ValueError(f"Transfer {transfer_id:08x} does not match its ID: "
+                             f"it holds chunks of more than one payload")
+        return written
+
+    def transfers(self):
+        """IDs of all stored transfers"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(int(name, 16) for name in os.listdir(self.root)
+                      if len(name) == 8 and os.path.exists(os.path.join(self.root, name, 'meta.json')))
+
+    def _transfer_dir(self, transfer_id):
+        return os.path.join(self.root, f"{transfer_id:08x}")
+
+    def _chunk_path(self, transfer_id, index):
+        return os.path.join(self._transfer_dir(transfer_id), f"{index:06d}.chunk")
+
+    def _meta_path(self, transfer_id):
+        return os.path.join(self._transfer_dir(transfer_id), 'meta.json')
+
+    def _read_meta(self, transfer_id):
+        try:
+            with open(self._meta_path(transfer_id), 'rb') as f:
+                return json.loads(f.read().decode('utf-8'))
+        except FileNotFoundError:
+            return {}
+
+    def _ensure_transfer(self, transfer_id, count):
+        """Create the transfer on first sight; False if count disagrees"""
+        meta = self._read_meta(transfer_id)
+        if meta:
+            return meta['count'] == count
+        os.makedirs(self._transfer_dir(transfer_id), exist_ok=True)
+        write_atomic(self._meta_path(transfer_id), json.dumps({'count': count}).encode('utf-8'))
+        return True
+
+
+def _pack_chunk(transfer_id, index, count, payload):
+    """Frame one chunk: header, payload, CRC32"""
+    header = _CHUNK_HEADER.pack(CHUNK_MAGIC, transfer_id, index, count, len(payload))
+    return header + bytes(payload) + _CRC.pack(zlib.crc32(payload, zlib.crc32(header)))
+
+
+def write_atomic(path, data):
+    """Write a file so readers never see it half written"""
+    # A unique temporary name: threads of one process may write the same path
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                               prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise